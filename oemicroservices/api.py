@@ -22,21 +22,136 @@
 from flask import Flask
 from flask.ext.restful import Api
 
-from oemicroservices.resources.depict.interaction import InteractionDepictor, FindLigandInteractionDepictor
-from oemicroservices.resources.convert.convert import MoleculeConvert
-from oemicroservices.resources.depict.molecule import MoleculeDepictor
+from oemicroservices.resources.depict.interaction import (
+    InteractionDepictor,
+    InteractionFrames,
+    FindLigandInteractionDepictor,
+    FindLigandInteractionFrames,
+    ReceptorList)
+from oemicroservices.resources.convert.convert import MoleculeConvert, MoleculeConvertBatch
+from oemicroservices.resources.depict.molecule import MoleculeDepictor, MoleculeDepictorBatch
+from oemicroservices.resources.depict.layout import MoleculeLayout
+from oemicroservices.resources.jobs.jobs import JobList, Job, JobResults, JobResult
+from oemicroservices.resources.compounds.compounds import CompoundList, CompoundSearch
+from oemicroservices.common.admission import AdmissionControl
+from oemicroservices.common.metrics import RequestMetrics
+from oemicroservices.common.profiling import RequestProfiling
+from oemicroservices.common.recorder import RequestRecorder
+from oemicroservices.common.spool import SlowRequestCapture
+from oemicroservices.common.pool import WorkerPools
+from oemicroservices.common.jobs import JobQueue
+from oemicroservices.common.compounds import CompoundLibrary
+from oemicroservices.common.receptors import ReceptorLibrary
+from oemicroservices.common.cache import NEGATIVE_CACHE, ERROR_IMAGE_CACHE, LAYOUT_CACHE, SCAFFOLD_CACHE
+from oemicroservices.common.compression import ResponseCompression
+from oemicroservices.common.warmup import warm_up
 
 app = Flask(__name__)
+# Load the default configuration, then any overrides
+app.config.from_object('oemicroservices.settings')
+app.config.from_envvar('OEMICROSERVICES_SETTINGS', silent=True)
 api = Api(app)
 
+###############################################################################
+# Request metrics                                                             #
+###############################################################################
+# Measure every request (including shed requests) and serve /metrics
+if app.config['METRICS']:
+    RequestMetrics(app)
+# Profile requests with profile=true for administrators
+if app.config['PROFILE_TOKEN']:
+    RequestProfiling(app)
+# Record requests for replay
+if app.config['RECORD_REQUESTS']:
+    RequestRecorder(app)
+# Capture slow requests for offline reproduction
+if app.config['SLOW_REQUESTS']:
+    SlowRequestCapture(app)
+
+###############################################################################
+# Response compression                                                        #
+###############################################################################
+# Compress responses for clients that accept gzip (registered after the metrics
+# so that compression is included in the request latency)
+if app.config['COMPRESSION']:
+    ResponseCompression(app)
+
+###############################################################################
+# Request admission                                                           #
+###############################################################################
+# Shed load with a 503 when an endpoint is at capacity
+if app.config['ADMISSION_CONTROL']:
+    AdmissionControl(app)
+# Isolate small molecule work from receptor-sized work
+if app.config['WORKER_POOLS']:
+    WorkerPools(app)
+
+###############################################################################
+# Caches                                                                      #
+###############################################################################
+# Fail known unreadable inputs, and serve their error images and repeated layouts, without rendering
+NEGATIVE_CACHE.resize(app.config['NEGATIVE_CACHE_SIZE'])
+ERROR_IMAGE_CACHE.resize(app.config['ERROR_IMAGE_CACHE_SIZE'])
+LAYOUT_CACHE.resize(app.config['LAYOUT_CACHE_SIZE'])
+SCAFFOLD_CACHE.resize(app.config['SCAFFOLD_CACHE_SIZE'])
+
+###############################################################################
+# Toolkit warm-up                                                             #
+###############################################################################
+# Pay the toolkit start-up costs before workers are forked from this process
+if app.config['WARM_UP']:
+    for step, error in warm_up()[1].items():
+        app.logger.warning("Warm-up step {0} failed: {1}".format(step, error))
+
+###############################################################################
+# Receptor library                                                            #
+###############################################################################
+# Parse the receptors once, before workers are forked from this process
+if app.config['RECEPTOR_DIR']:
+    ReceptorLibrary(app)
+    # List the receptors that interaction depictions can reference by name
+    api.add_resource(ReceptorList, '/v1/depict/interaction/receptors')
+
 ###############################################################################
 # Molecule depiction resources                                                #
 ###############################################################################
 # Depict a small molecule
 api.add_resource(MoleculeDepictor, '/v1/depict/structure/<string:fmt>')
+# Depict a batch of small molecules
+api.add_resource(MoleculeDepictorBatch, '/v1/depict/structures')
+# Lay out a small molecule in 2D for rendering by the client
+api.add_resource(MoleculeLayout, '/v1/depict/layout/<string:fmt>')
 # Depict a receptor-ligand complex
 api.add_resource(InteractionDepictor, '/v1/depict/interaction')
 # Depict a receptor-ligand complex by first searching for the ligand in the raw file
 api.add_resource(FindLigandInteractionDepictor, '/v1/depict/interaction/search/<string:fmt>')
+# Depict the interactions of each frame of a trajectory
+api.add_resource(InteractionFrames, '/v1/depict/interaction/frames')
+api.add_resource(FindLigandInteractionFrames, '/v1/depict/interaction/search/<string:fmt>/frames')
 # Convert between molecule formats
 api.add_resource(MoleculeConvert, '/v1/convert/molecule')
+# Convert a batch of molecules
+api.add_resource(MoleculeConvertBatch, '/v1/convert/molecules')
+
+###############################################################################
+# Asynchronous job resources                                                  #
+###############################################################################
+if app.config['JOBS']:
+    JobQueue(app)
+    # Submit a batch job
+    api.add_resource(JobList, '/v1/jobs')
+    # Get the progress of a job, or cancel it
+    api.add_resource(Job, '/v1/jobs/<string:job_id>')
+    # Download the results of a job
+    api.add_resource(JobResults, '/v1/jobs/<string:job_id>/results')
+    api.add_resource(JobResult, '/v1/jobs/<string:job_id>/results/<int:index>')
+
+###############################################################################
+# Compound search resources                                                   #
+###############################################################################
+if app.config['COMPOUNDS']:
+    CompoundLibrary(app)
+    # Count or upload the searchable compounds
+    api.add_resource(CompoundList, '/v1/compounds')
+    # Substructure search with a fingerprint screen
+    api.add_resource(CompoundSearch, '/v1/compounds/search')
@@ -0,0 +1,443 @@
+# Command line batch processing for oemicroservices
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# Depict, depict interactions and convert whole files and directories with the library functions, without HTTP:
+#
+#   oemicroservices-batch depict compounds.sdf.gz --output images/ --format svg -O width=300 -O height=300
+#   oemicroservices-batch interaction poses.sdf --receptor receptor.pdb --output maps/
+#   oemicroservices-batch convert compounds.smi --output compounds.sdf.gz
+#
+# Records are read as a stream and processed in chunks by a pool of processes. Results are written in input order and
+# the throughput is reported when done. SMILES, SDF and MOL2 files are split into records as text; any other file
+# (e.g. PDB) is one record. Files ending in .gz are read and written compressed.
+
+import argparse
+import gzip
+import multiprocessing
+import os
+import sys
+from collections import deque
+from timeit import default_timer
+
+from oemicroservices.common.warmup import preload
+from oemicroservices.library import DEPICT_OPTIONS, INTERACTION_OPTIONS
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Record Input                                                       #
+#                                                                                                                      #
+########################################################################################################################
+
+# Line-based formats
+SMILES_FORMATS = ('smi', 'smiles', 'ism', 'isosmi', 'can', 'usm')
+
+# Formats with records that end with a $$$$ line
+SDF_FORMATS = ('sdf', 'sd', 'mdl', 'mol')
+
+# Formats searched for in directories
+INPUT_FORMATS = SMILES_FORMATS + SDF_FORMATS + ('mol2', 'pdb', 'ent')
+
+
+def get_format(path):
+    """
+    Get the molecule format of a file from its extension, ignoring a .gz extension
+    :param path: The file path
+    :type path: str
+    :return: The format
+    :rtype: str
+    """
+    if path.endswith('.gz'):
+        path = path[:-3]
+    return os.path.splitext(path)[1][1:].lower()
+
+
+def find_inputs(paths):
+    """
+    Expand directories to the molecule files they contain
+    :param paths: The files and directories
+    :type paths: list
+    :return: The files, in order
+    :rtype: list
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names) if get_format(name) in INPUT_FORMATS)
+        else:
+            files.append(path)
+    return files
+
+
+def read_records(path):
+    """
+    Read the molecule records of a file as text
+    :param path: The file path
+    :type path: str
+    :return: The records with their format, as (format, record) tuples
+    """
+    fmt = get_format(path)
+    f = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+    try:
+        lines = (line.decode('utf-8') for line in f)
+        if fmt in SMILES_FORMATS:
+            for line in lines:
+                if line.strip():
+                    yield fmt, line.rstrip('\r\n')
+        elif fmt in SDF_FORMATS:
+            record = []
+            for line in lines:
+                record.append(line)
+                if line.rstrip() == '$$$$':
+                    yield fmt, ''.join(record)
+                    record = []
+            if ''.join(record).strip():
+                yield fmt, ''.join(record)
+        elif fmt == 'mol2':
+            record = []
+            for line in lines:
+                if line.startswith('@<TRIPOS>MOLECULE') and ''.join(record).strip():
+                    yield fmt, ''.join(record)
+                    record = []
+                record.append(line)
+            if ''.join(record).strip():
+                yield fmt, ''.join(record)
+        else:
+            yield fmt, ''.join(lines)
+    finally:
+        f.close()
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  Worker Processes                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+# The task of this worker process (see _init_worker)
+_task = {}
+
+
+def _init_worker(command, options, receptor=None):
+    """
+    Set the task of a worker process
+    :param command: The command (depict, interaction or convert)
+    :type command: str
+    :param options: The library function options
+    :type options: dict
+    :param receptor: For interactions, the receptor format and string, which is read once per process
+    :type receptor: tuple
+    """
+    _task.clear()
+    _task['command'] = command
+    _task['options'] = options
+    if receptor is not None:
+        from oemicroservices.common.util import read_molecule_from_string
+        _task['receptor'] = read_molecule_from_string(receptor[1], receptor[0], False, options.get('reparse', False))
+
+
+def _run_one(fmt, record):
+    """
+    Process one record
+    :param fmt: The record format
+    :type fmt: str
+    :param record: The record
+    :type record: str
+    :return: The image or molecule string
+    """
+    from oemicroservices import library
+    command, options = _task['command'], _task['options']
+    if command == 'depict':
+        return library.depict(record, fmt, **options)
+    if command == 'interaction':
+        return library.depict_interaction(_task['receptor'], record, ligand_format=fmt, debug=True, **options)
+    return library.convert(record, fmt=fmt, **options)
+
+
+def _run_chunk(chunk):
+    """
+    Process a chunk of records
+    :param chunk: The records, as (format, record) tuples
+    :type chunk: list
+    :return: The result and error message of each record, as (result, error) tuples
+    :rtype: list
+    """
+    results = []
+    for fmt, record in chunk:
+        try:
+            results.append((_run_one(fmt, record), None))
+        except Exception as ex:
+            results.append((None, str(ex)))
+    return results
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Batch Runner                                                       #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def chunk_records(paths, size):
+    """
+    Group the records of files into chunks
+    :param paths: The files
+    :type paths: list
+    :param size: The number of records per chunk
+    :type size: int
+    :return: The chunks, as lists of (path, index, format, record) tuples with 1-based indexes within each file
+    """
+    chunk = []
+    for path in paths:
+        for index, (fmt, record) in enumerate(read_records(path)):
+            chunk.append((path, index + 1, fmt, record))
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def ordered_map(pool, chunks, window):
+    """
+    Process chunks in a process pool, with at most window chunks in flight so that large inputs stream
+    :param pool: The process pool, or None to process the chunks in this process
+    :type pool: multiprocessing.Pool
+    :param chunks: The chunks (see chunk_records)
+    :param window: The maximum number of chunks in flight
+    :type window: int
+    :return: The chunks and their results, in order
+    """
+    pending = deque()
+    for chunk in chunks:
+        work = [(fmt, record) for path, index, fmt, record in chunk]
+        if pool is None:
+            yield chunk, _run_chunk(work)
+            continue
+        pending.append((chunk, pool.apply_async(_run_chunk, (work,))))
+        if len(pending) >= window:
+            chunk, result = pending.popleft()
+            yield chunk, result.get()
+    while pending:
+        chunk, result = pending.popleft()
+        yield chunk, result.get()
+
+
+def run_batch(command, paths, options, write, processes=None, chunksize=64, receptor=None, err=None):
+    """
+    Run a batch
+    :param command: The command (depict, interaction or convert)
+    :type command: str
+    :param paths: The input files
+    :type paths: list
+    :param options: The library function options
+    :type options: dict
+    :param write: Called with the input path, the 1-based record index in it and the result of each record, in order
+    :param processes: The number of worker processes (defaults to the number of CPUs, 1 to work in this process)
+    :type processes: int
+    :param chunksize: The number of records sent to a worker at a time
+    :type chunksize: int
+    :param receptor: For interactions, the receptor format and string
+    :type receptor: tuple
+    :param err: Where to report the records that failed (e.g. sys.stderr)
+    :return: The number of records and errors, the duration and the throughput
+    :rtype: dict
+    """
+    processes = processes or multiprocessing.cpu_count()
+    # Load the toolkits once, before the workers are forked
+    preload()
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, _init_worker, (command, options, receptor))
+    else:
+        _init_worker(command, options, receptor)
+    records = 0
+    errors = 0
+    start = default_timer()
+    try:
+        for chunk, results in ordered_map(pool, chunk_records(paths, chunksize), processes * 4):
+            for (path, index, fmt, record), (result, error) in zip(chunk, results):
+                records += 1
+                if error is None:
+                    write(path, index, result)
+                else:
+                    errors += 1
+                    if err is not None:
+                        err.write('{0}:{1}: {2}\n'.format(path, index, error))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    duration = default_timer() - start
+    return {
+        'records': records,
+        'errors': errors,
+        'duration_s': round(duration, 3),
+        'records_per_s': round(records / duration, 3) if duration > 0 else None
+    }
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  Command Line                                                        #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def parse_options(values, defaults):
+    """
+    Parse key=value library options, converting each value to the type of its default
+    :param values: The key=value strings
+    :type values: list
+    :param defaults: The option defaults (e.g. DEPICT_OPTIONS)
+    :type defaults: dict
+    :return: The options
+    :rtype: dict
+    """
+    options = {}
+    for value in values or []:
+        key, sep, value = value.partition('=')
+        if not sep or key not in defaults:
+            raise Exception("Invalid option: {0}".format(key))
+        default = defaults[key]
+        if isinstance(default, bool):
+            options[key] = value.lower() in ('1', 'true', 'yes')
+        elif isinstance(default, int):
+            options[key] = int(value)
+        elif default is None:
+            # Options without a default (e.g. highlight) can be repeated
+            options.setdefault(key, []).append(value)
+        else:
+            options[key] = value
+    return options
+
+
+class ImageWriter(object):
+    """
+    Write images to a directory, named after the input file and the record index
+    """
+
+    def __init__(self, directory, image_format):
+        """
+        Default constructor
+        :param directory: The output directory
+        :type directory: str
+        :param image_format: The image format (and file extension)
+        :type image_format: str
+        """
+        self.directory = directory
+        self.image_format = image_format
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __call__(self, path, index, image):
+        name = os.path.basename(path)
+        if name.endswith('.gz'):
+            name = name[:-3]
+        name = '{0}-{1:06d}.{2}'.format(os.path.splitext(name)[0], index, self.image_format)
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(image)
+
+
+class FileWriter(object):
+    """
+    Write molecule strings to one file, compressed if its name ends with .gz
+    """
+
+    def __init__(self, path):
+        """
+        Default constructor
+        :param path: The output file
+        :type path: str
+        """
+        self.file = gzip.open(path, 'wb') if path.endswith('.gz') else open(path, 'wb')
+
+    def __call__(self, path, index, output):
+        if not output.endswith('\n'):
+            output += '\n'
+        self.file.write(output.encode('utf-8'))
+
+    def close(self):
+        self.file.close()
+
+
+def main(argv=None):
+    """
+    Batch command line entry point
+    :param argv: The command line arguments (defaults to sys.argv)
+    :type argv: list
+    :return: The exit status (1 if any record failed)
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description='Depict and convert molecule files with the OpenEye toolkits')
+    commands = parser.add_subparsers(dest='command')
+    depict = commands.add_parser('depict', help='Depict each molecule as an image')
+    interaction = commands.add_parser('interaction', help='Depict the interactions of each ligand with a receptor')
+    interaction.add_argument('--receptor', required=True, help='The receptor file')
+    convert = commands.add_parser('convert', help='Convert the molecules to one file')
+    convert.add_argument('--to', help='The output format (default: from the output file extension)')
+    for command in (depict, interaction):
+        command.add_argument('--format', default='png', help='The image format (png, svg, pdf or ps)')
+        command.add_argument('-O', '--option', action='append', help='A depiction option as key=value (repeatable)')
+    for command in (depict, interaction, convert):
+        command.add_argument('inputs', nargs='+', help='Molecule files or directories')
+        command.add_argument('--output', '-o', required=True,
+                             help='The output directory (depict, interaction) or file (convert)')
+        command.add_argument('--reparse', action='store_true', help='Reparse connectivity, bond orders, etc.')
+        command.add_argument('--processes', '-j', type=int, help='Worker processes (default: number of CPUs)')
+        command.add_argument('--chunksize', type=int, default=64, help='Records sent to a worker at a time')
+    options = parser.parse_args(argv)
+    if options.command is None:
+        parser.error('No command given')
+
+    paths = find_inputs(options.inputs)
+    receptor = None
+    writer = None
+    if options.command == 'convert':
+        output_format = options.to or get_format(options.output)
+        library_options = {'output_format': output_format, 'reparse': options.reparse}
+        writer = FileWriter(options.output)
+        write = writer
+    else:
+        defaults = DEPICT_OPTIONS if options.command == 'depict' else INTERACTION_OPTIONS
+        library_options = parse_options(options.option, defaults)
+        library_options['format'] = options.format
+        library_options['reparse'] = options.reparse
+        write = ImageWriter(options.output, options.format)
+        if options.command == 'interaction':
+            with (gzip.open if options.receptor.endswith('.gz') else open)(options.receptor, 'rb') as f:
+                receptor = (get_format(options.receptor), f.read().decode('utf-8'))
+
+    try:
+        stats = run_batch(options.command, paths, library_options, write, options.processes, options.chunksize,
+                          receptor, sys.stderr)
+    finally:
+        if writer is not None:
+            writer.close()
+    sys.stderr.write('{records} records, {errors} errors in {duration_s} s ({records_per_s} records/s)\n'.format(
+        **stats))
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,536 @@
+# Benchmark harness for oemicroservices
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# Drive every endpoint with a corpus of small molecules, macrocycles and protein-ligand complexes and report latency
+# percentiles, throughput and peak memory for each endpoint and option combination. Results are saved as JSON so that
+# runs can be compared:
+#
+#   python -m oemicroservices.benchmark --output before.json
+#   python -m oemicroservices.benchmark --output after.json --compare before.json
+#
+# By default requests are made in-process through the Flask test client. Use --url to benchmark a running server.
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import threading
+import time
+from timeit import default_timer
+
+try:
+    # Python 3.x
+    from urllib.parse import quote
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    # Python 2.x
+    from urllib import quote
+    from urllib2 import Request, urlopen, HTTPError
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                       Corpus                                                         #
+#                                                                                                                      #
+########################################################################################################################
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), 'test', 'assets')
+
+# Small molecules
+SMALL_MOLECULES = {
+    'benzene': 'c1ccccc1',
+    'aspirin': 'CC(=O)Oc1ccccc1C(=O)O',
+    'caffeine': 'Cn1cnc2c1c(=O)n(C)c(=O)n2C',
+    'januvia': 'Fc1cc(c(F)cc1F)C[C@@H](N)CC(=O)N3Cc2nnc(n2CC3)C(F)(F)F'
+}
+
+# Macrocycles, which are the slowest small molecules to lay out
+MACROCYCLES = {
+    'erythromycin': 'CC[C@@H]1[C@@]([C@@H]([C@H](C(=O)[C@@H](C[C@@]([C@@H]([C@H]([C@@H]([C@H](C(=O)O1)C)O[C@H]2C[C@@]'
+                    '([C@H]([C@@H](O2)C)O)(C)OC)C)O[C@H]3[C@@H]([C@H](C[C@H](O3)C)N(C)C)O)(C)O)C)C)O)(C)O',
+    'cyclosporin': 'CC[C@H]1C(=O)N(CC(=O)N([C@H](C(=O)N[C@H](C(=O)N([C@H](C(=O)N[C@H](C(=O)N[C@@H](C(=O)N([C@H](C(=O)'
+                   'N([C@H](C(=O)N([C@H](C(=O)N([C@H](C(=O)N1)[C@@H]([C@H](C)C/C=C/C)O)C)C(C)C)C)CC(C)C)C)CC(C)C)C)C)C)'
+                   'CC(C)C)C)C(C)C)CC(C)C)C)C'
+}
+
+
+def _read_asset(name):
+    """
+    Read a molecule file from the test assets
+    :param name: The file name
+    :type name: str
+    :return: The file contents
+    :rtype: str
+    """
+    with open(os.path.join(ASSETS_DIR, name), 'r') as f:
+        return f.read()
+
+
+def build_scenarios():
+    """
+    Build the benchmark scenarios: one per endpoint and option combination
+    :return: The scenarios as dictionaries with name, endpoint, method, path, body and content_type keys
+    :rtype: list
+    """
+    scenarios = []
+
+    def add(name, endpoint, method, path, body=None, content_type=None):
+        scenarios.append({
+            'name': name,
+            'endpoint': endpoint,
+            'method': method,
+            'path': path,
+            'body': body,
+            'content_type': content_type
+        })
+
+    # Small molecule depiction (GET), by molecule and option combination
+    for label, smiles in sorted(list(SMALL_MOLECULES.items()) + list(MACROCYCLES.items())):
+        base = '/v1/depict/structure/smiles?debug=true&val={0}'.format(quote(smiles))
+        add('depict/{0}/png'.format(label), 'moleculedepictor', 'GET', base)
+        add('depict/{0}/svg'.format(label), 'moleculedepictor', 'GET', base + '&format=svg')
+    januvia = '/v1/depict/structure/smiles?debug=true&val={0}'.format(quote(SMALL_MOLECULES['januvia']))
+    add('depict/januvia/png/highlight', 'moleculedepictor', 'GET', januvia + '&highlight=C1CNCcn1&highlightstyle=stick')
+    add('depict/januvia/png/large', 'moleculedepictor', 'GET', januvia + '&width=1600&height=1600&scalebonds=true')
+    add('depict/januvia/pdf', 'moleculedepictor', 'GET', januvia + '&format=pdf&title=Januvia')
+
+    # Small molecule depiction (POST)
+    ligand = _read_asset('suv.pdb')
+    add('depict/suv/pdb/png', 'moleculedepictor', 'POST', '/v1/depict/structure/pdb?debug=true', ligand, 'text/plain')
+    add('depict/suv/pdb/png/reparse', 'moleculedepictor', 'POST', '/v1/depict/structure/pdb?debug=true&reparse=true',
+        ligand, 'text/plain')
+
+    # Interaction depiction
+    interaction = json.dumps({
+        'ligand': {'value': ligand, 'format': 'pdb'},
+        'receptor': {'value': _read_asset('receptor.pdb'), 'format': 'pdb'}
+    })
+    add('interaction/suv/png', 'interactiondepictor', 'POST', '/v1/depict/interaction?debug=true', interaction,
+        'application/json')
+    add('interaction/suv/svg/nolegend', 'interactiondepictor', 'POST',
+        '/v1/depict/interaction?debug=true&format=svg&legend=', interaction, 'application/json')
+    complex_pdb = _read_asset('4s0v.pdb')
+    add('interaction/search/4s0v/png', 'findligandinteractiondepictor', 'POST',
+        '/v1/depict/interaction/search/pdb?debug=true&resn=SUV', complex_pdb, 'text/plain')
+
+    # Conversion
+    for label, molecule, input_format, output_format, reparse in (
+            ('smiles-sdf', SMALL_MOLECULES['januvia'], 'smiles', 'sdf', False),
+            ('suv-sdf', ligand, 'pdb', 'sdf', False),
+            ('suv-sdf/reparse', ligand, 'pdb', 'sdf', True),
+            ('receptor-sdf', _read_asset('receptor.pdb'), 'pdb', 'sdf', False)):
+        add('convert/{0}'.format(label), 'moleculeconvert', 'POST', '/v1/convert/molecule', json.dumps({
+            'molecule': {
+                'value': molecule,
+                'input': {'format': input_format, 'reparse': reparse},
+                'output': {'format': output_format}
+            }
+        }), 'application/json')
+    return scenarios
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      Clients                                                         #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def request_headers(scenario):
+    """
+    Get the headers of the request for a scenario
+    :param scenario: The scenario, with optional accept and accept_encoding keys (e.g. from a request log)
+    :type scenario: dict
+    :return: The Content-Type, Accept and Accept-Encoding headers that the scenario sets
+    :rtype: dict
+    """
+    headers = {}
+    for name, key in (('Content-Type', 'content_type'), ('Accept', 'accept'), ('Accept-Encoding', 'accept_encoding')):
+        if scenario.get(key):
+            headers[name] = scenario[key]
+    return headers
+
+
+class InProcessClient(object):
+    """
+    Make requests in-process through the Flask test client
+    """
+
+    def __init__(self):
+        # Imported here so that benchmarking a remote server does not need the toolkits
+        from oemicroservices.api import app
+        app.config['TESTING'] = True
+        self.app = app
+        self.__local = threading.local()
+
+    def request(self, scenario):
+        """
+        Make the request for a scenario
+        :param scenario: The scenario
+        :type scenario: dict
+        :return: The HTTP status code
+        :rtype: int
+        """
+        client = getattr(self.__local, 'client', None)
+        if client is None:
+            client = self.__local.client = self.app.test_client()
+        response = client.open(scenario['path'], method=scenario['method'], data=scenario['body'],
+                               headers=request_headers(scenario))
+        return response.status_code
+
+    def fetch(self, path):
+        """
+        Get a resource, e.g. the metrics
+        :param path: The resource path
+        :type path: str
+        :return: The HTTP status code and the response body
+        :rtype: tuple
+        """
+        response = self.app.test_client().get(path)
+        return response.status_code, response.data.decode('utf-8')
+
+    def rss_kb(self):
+        """
+        Current resident set size in KB of the server, i.e. this process and its live worker processes
+        :return: The resident set size (None if not available on this platform)
+        :rtype: int
+        """
+        import multiprocessing
+        sizes = [rss_kb(pid) for pid in [os.getpid()] + [child.pid for child in multiprocessing.active_children()]]
+        sizes = [size for size in sizes if size is not None]
+        return sum(sizes) if sizes else None
+
+
+class HttpClient(object):
+    """
+    Make requests to a running server
+    """
+
+    def __init__(self, url):
+        """
+        Default constructor
+        :param url: The server base URL, e.g. http://127.0.0.1:5000
+        :type url: str
+        """
+        self.url = url.rstrip('/')
+
+    def request(self, scenario):
+        """
+        Make the request for a scenario
+        :param scenario: The scenario
+        :type scenario: dict
+        :return: The HTTP status code
+        :rtype: int
+        """
+        body = scenario['body']
+        if body is not None and not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        req = Request(self.url + scenario['path'], data=body)
+        req.get_method = lambda: scenario['method']
+        for name, value in request_headers(scenario).items():
+            req.add_header(name, value)
+        try:
+            response = urlopen(req)
+            response.read()
+            return response.getcode()
+        except HTTPError as ex:
+            return ex.code
+
+    def fetch(self, path):
+        """
+        Get a resource, e.g. the metrics
+        :param path: The resource path
+        :type path: str
+        :return: The HTTP status code and the response body
+        :rtype: tuple
+        """
+        try:
+            response = urlopen(self.url + path)
+            return response.getcode(), response.read().decode('utf-8')
+        except HTTPError as ex:
+            return ex.code, ''
+
+    def rss_kb(self):
+        """
+        The memory of a remote server cannot be measured from the client
+        :return: None
+        """
+        return None
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      Runner                                                          #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile
+    :param values: The values, sorted in increasing order
+    :type values: list
+    :param p: The percentile (0-100)
+    :type p: float
+    :return: The percentile value (None if there are no values)
+    :rtype: float
+    """
+    if not values:
+        return None
+    rank = int(math.ceil(p / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def rss_kb(pid):
+    """
+    Current resident set size in KB of a process
+    :param pid: The process ID
+    :type pid: int
+    :return: The resident set size (None if not available on this platform)
+    :rtype: int
+    """
+    try:
+        with open('/proc/{0}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def attempt(client, scenario):
+    """
+    Make the request for a scenario, treating a failure to get any response (e.g. a refused connection) as an error
+    :param client: The client (InProcessClient or HttpClient)
+    :param scenario: The scenario
+    :type scenario: dict
+    :return: The HTTP status code (None if the request failed)
+    :rtype: int
+    """
+    try:
+        return client.request(scenario)
+    except Exception:
+        return None
+
+
+def run_scenario(client, scenario, requests, concurrency, warmup):
+    """
+    Run one scenario
+    :param client: The client (InProcessClient or HttpClient)
+    :param scenario: The scenario
+    :type scenario: dict
+    :param requests: The number of measured requests
+    :type requests: int
+    :param concurrency: The number of concurrent clients
+    :type concurrency: int
+    :param warmup: The number of unmeasured requests made first
+    :type warmup: int
+    :return: The scenario results
+    :rtype: dict
+    """
+    for i in range(warmup):
+        attempt(client, scenario)
+    latencies = []
+    errors = [0]
+    remaining = [requests]
+    lock = threading.Lock()
+    # The server memory is sampled while the scenario runs, so that each scenario reports its own peak
+    done = threading.Event()
+    peak = [client.rss_kb()]
+
+    def sample():
+        while not done.wait(0.05):
+            size = client.rss_kb()
+            if size is not None:
+                peak[0] = max(peak[0], size)
+
+    def work():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = default_timer()
+            status = attempt(client, scenario)
+            elapsed = default_timer() - start
+            with lock:
+                latencies.append(elapsed)
+                if status is None or status >= 400:
+                    errors[0] += 1
+
+    sampler = threading.Thread(target=sample)
+    sampler.daemon = True
+    if peak[0] is not None:
+        sampler.start()
+    start = default_timer()
+    threads = [threading.Thread(target=work) for i in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = default_timer() - start
+    done.set()
+    if sampler.is_alive():
+        sampler.join()
+    latencies.sort()
+
+    def ms(value):
+        return None if value is None else round(value * 1000.0, 3)
+
+    return {
+        'scenario': scenario['name'],
+        'endpoint': scenario['endpoint'],
+        'requests': len(latencies),
+        'errors': errors[0],
+        'concurrency': concurrency,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+        'rps': round(len(latencies) / duration, 3) if duration > 0 else None,
+        'peak_rss_kb': peak[0]
+    }
+
+
+def run_benchmark(client, scenarios, requests=50, concurrency=1, warmup=2, out=None):
+    """
+    Run a set of scenarios
+    :param client: The client (InProcessClient or HttpClient)
+    :param scenarios: The scenarios
+    :type scenarios: list
+    :param requests: The number of measured requests per scenario
+    :type requests: int
+    :param concurrency: The number of concurrent clients
+    :type concurrency: int
+    :param warmup: The number of unmeasured requests per scenario
+    :type warmup: int
+    :param out: Stream for progress output (None for no output)
+    :return: The benchmark results
+    :rtype: dict
+    """
+    results = []
+    for scenario in scenarios:
+        result = run_scenario(client, scenario, requests, concurrency, warmup)
+        results.append(result)
+        if out is not None:
+            out.write(format_result(result) + '\n')
+            out.flush()
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'target': client.url if isinstance(client, HttpClient) else 'test_client',
+            'requests': requests,
+            'concurrency': concurrency
+        },
+        'results': results
+    }
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                     Reporting                                                        #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def format_result(result):
+    """
+    Format one scenario result as a line of the report
+    :param result: The scenario result
+    :type result: dict
+    :return: The report line
+    :rtype: str
+    """
+    return '{0:<40} p50 {1:>10} ms  p95 {2:>10} ms  p99 {3:>10} ms  {4:>9} req/s  {5:>4} err  {6:>9} KB'.format(
+        result['scenario'], result['p50_ms'], result['p95_ms'], result['p99_ms'], result['rps'], result['errors'],
+        result['peak_rss_kb'])
+
+
+def compare_results(baseline, current):
+    """
+    Compare two benchmark runs
+    :param baseline: The baseline results
+    :type baseline: dict
+    :param current: The current results
+    :type current: dict
+    :return: The comparison report lines (percent change relative to the baseline)
+    :rtype: list
+    """
+    def change(old, new):
+        if old in (None, 0) or new is None:
+            return '{0:>8}'.format('n/a')
+        return '{0:>+7.1f}%'.format((new - old) * 100.0 / old)
+
+    previous = dict((r['scenario'], r) for r in baseline['results'])
+    lines = ['{0:<40} {1:>8} {2:>8} {3:>8} {4:>8}'.format('scenario', 'p50', 'p95', 'p99', 'req/s')]
+    for result in current['results']:
+        old = previous.get(result['scenario'])
+        if old is None:
+            continue
+        lines.append('{0:<40} {1} {2} {3} {4}'.format(
+            result['scenario'],
+            change(old['p50_ms'], result['p50_ms']),
+            change(old['p95_ms'], result['p95_ms']),
+            change(old['p99_ms'], result['p99_ms']),
+            change(old['rps'], result['rps'])))
+    return lines
+
+
+def main(argv=None):
+    """
+    Benchmark command line entry point
+    :param argv: The command line arguments (defaults to sys.argv)
+    :type argv: list
+    :return: The exit status
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the oemicroservices endpoints')
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process Flask test client)')
+    parser.add_argument('--requests', type=int, default=50, help='Measured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='Concurrent clients')
+    parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per scenario')
+    parser.add_argument('--filter', default='', help='Only run scenarios whose name contains this string')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Compare with the results in this JSON file')
+    options = parser.parse_args(argv)
+
+    client = HttpClient(options.url) if options.url else InProcessClient()
+    scenarios = [s for s in build_scenarios() if options.filter in s['name']]
+    results = run_benchmark(client, scenarios, options.requests, options.concurrency, options.warmup, sys.stdout)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare, 'r') as f:
+            baseline = json.load(f)
+        sys.stdout.write('\n'.join(compare_results(baseline, results)) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
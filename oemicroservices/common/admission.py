@@ -0,0 +1,280 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import json
+import threading
+import time
+from collections import namedtuple
+
+from flask import Response, current_app, request, g
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  Cost estimation                                                     #
+#                                                                                                                      #
+########################################################################################################################
+
+# Approximate size in bytes of one atom in each file format. Used when we cannot cheaply count atom records.
+__bytes_per_atom = {
+    'smiles': 2,
+    'smi': 2,
+    'ism': 2,
+    'usm': 2,
+    'can': 2,
+    'sdf': 100,
+    'mol': 100,
+    'mdl': 100,
+    'mol2': 80,
+    'pdb': 81,
+    'ent': 81,
+    'xyz': 40,
+    'mmod': 80,
+    'oeb': 40,
+}
+
+# Default bytes per atom for unknown formats and JSON bodies (roughly one PDB or SDF atom line)
+__default_bytes_per_atom = 80
+
+# How many times larger a molecule file is than its gzipped and base64 encoded representation (a conservative guess)
+__gz_expansion = 4
+
+# The estimated cost of a request, computed before the molecule is parsed
+RequestCost = namedtuple('RequestCost', ['nbytes', 'fmt', 'atoms'])
+
+
+def estimate_cost(body, fmt=None, gz=False):
+    """
+    Estimate the cost of a request from cheap signals: the body size, the molecule format and the number of atom records
+    :param body: The raw molecule data (the request body or the val query parameter)
+    :type body: bytes
+    :param fmt: The molecule file format, if known (None for JSON bodies)
+    :type fmt: str
+    :param gz: If the molecule data is gzipped and base64 encoded
+    :type gz: bool
+    :return: The estimated request cost
+    :rtype: RequestCost
+    """
+    nbytes = len(body)
+    bytes_per_atom = __bytes_per_atom.get((fmt or '').lower(), __default_bytes_per_atom)
+    if gz:
+        atoms = (nbytes * __gz_expansion) // bytes_per_atom
+    else:
+        # PDB atom records can be counted without parsing, even when embedded in JSON
+        atoms = body.count(b'ATOM  ') + body.count(b'HETATM')
+        if atoms == 0:
+            atoms = nbytes // bytes_per_atom
+    return RequestCost(nbytes, fmt, max(1, atoms))
+
+
+def estimate_request_cost():
+    """
+    Estimate the cost of the current Flask request
+    :return: The estimated request cost
+    :rtype: RequestCost
+    """
+    fmt = (request.view_args or {}).get('fmt')
+    if request.method == 'GET':
+        body = request.args.get('val', '').encode('utf-8')
+    else:
+        body = request.get_data()
+    return estimate_cost(body, fmt, bool(request.args.get('gz')))
+
+
+def get_request_cost():
+    """
+    Get the estimated cost of the current Flask request, estimating it only once per request
+    :return: The estimated request cost
+    :rtype: RequestCost
+    """
+    cost = getattr(g, 'request_cost', None)
+    if cost is None:
+        cost = g.request_cost = estimate_request_cost()
+    return cost
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  AdmissionLimiter                                                    #
+#                                  Weighted concurrency limit with a bounded wait queue                                #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class ServiceOverloaded(Exception):
+    """
+    Raised when a request cannot be admitted because the endpoint is at capacity and the wait queue is full or the wait
+    timed out
+    """
+    pass
+
+
+def overloaded_response(ex):
+    """
+    Generate the response for a request that was shed
+    :param ex: The reason the request was shed
+    :type ex: ServiceOverloaded
+    :return: A 503 JSON error response with a Retry-After header
+    :rtype: Response
+    """
+    response = Response(json.dumps({"error": "Service overloaded: {0}".format(str(ex))}), status=503,
+                        mimetype='application/json')
+    response.headers['Retry-After'] = str(current_app.config.get('ADMISSION_RETRY_AFTER', 5))
+    return response
+
+
+class AdmissionLimiter(object):
+    """
+    Limit the cost units executing at once, with a bounded number of requests waiting for capacity
+    """
+
+    def __init__(self, capacity, queue=0, timeout=0.0):
+        """
+        Default constructor
+        :param capacity: The number of cost units that may execute at once
+        :type capacity: int
+        :param queue: The maximum number of requests waiting for capacity
+        :type queue: int
+        :param timeout: The maximum time (in seconds) a request may wait for capacity
+        :type timeout: float
+        """
+        self.capacity = max(1, int(capacity))
+        self.queue = max(0, int(queue))
+        self.timeout = float(timeout)
+        self.in_use = 0
+        self.waiting = 0
+        self.__condition = threading.Condition(threading.Lock())
+
+    def acquire(self, units=1):
+        """
+        Acquire capacity, waiting in the queue if necessary
+        :param units: The cost units requested (clamped to the capacity of the limiter)
+        :type units: int
+        :return: The number of units acquired, which must be passed to release
+        :rtype: int
+        """
+        units = min(max(1, int(units)), self.capacity)
+        with self.__condition:
+            # Admit immediately only if nobody is queued ahead of us
+            if self.waiting == 0 and self.in_use + units <= self.capacity:
+                self.in_use += units
+                return units
+            if self.waiting >= self.queue:
+                raise ServiceOverloaded("Too many queued requests")
+            self.waiting += 1
+            try:
+                deadline = time.time() + self.timeout
+                while self.in_use + units > self.capacity:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise ServiceOverloaded("Timed out waiting for capacity")
+                    self.__condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_use += units
+            return units
+
+    def release(self, units):
+        """
+        Release capacity acquired with acquire
+        :param units: The number of units returned by acquire
+        :type units: int
+        """
+        with self.__condition:
+            self.in_use -= units
+            self.__condition.notify_all()
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 AdmissionControl                                                     #
+#                                Flask hooks that admit or shed requests on every endpoint                             #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class AdmissionControl(object):
+    """
+    Per-endpoint admission control for a Flask application
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.limiters = {}
+        self.default_limit = None
+        self.atoms_per_unit = 2000
+        self.__lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure from the application configuration and register the request hooks
+        :param app: The Flask application
+        :type app: Flask
+        """
+        for endpoint, limit in app.config.get('ADMISSION_LIMITS', {}).items():
+            self.limiters[endpoint] = AdmissionLimiter(**limit)
+        self.default_limit = app.config.get('ADMISSION_DEFAULT_LIMIT')
+        self.atoms_per_unit = app.config.get('ADMISSION_ATOMS_PER_UNIT', self.atoms_per_unit)
+        app.extensions['admission'] = self
+        app.before_request(self.__before_request)
+        app.teardown_request(self.__teardown_request)
+
+    def get_limiter(self, endpoint):
+        """
+        Get the limiter for an endpoint
+        :param endpoint: The Flask endpoint name
+        :type endpoint: str
+        :return: The limiter or None if the endpoint is not limited
+        :rtype: AdmissionLimiter
+        """
+        limiter = self.limiters.get(endpoint)
+        if limiter is None and self.default_limit is not None:
+            with self.__lock:
+                limiter = self.limiters.setdefault(endpoint, AdmissionLimiter(**self.default_limit))
+        return limiter
+
+    def __before_request(self):
+        """
+        Estimate the request cost and acquire capacity on the endpoint, or shed the request with a 503
+        """
+        limiter = self.get_limiter(request.endpoint)
+        if limiter is None:
+            return None
+        try:
+            g.admission = (limiter, limiter.acquire(1 + get_request_cost().atoms // self.atoms_per_unit))
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+
+    # noinspection PyUnusedLocal
+    def __teardown_request(self, exc=None):
+        """
+        Release any capacity acquired for the request
+        """
+        admission = getattr(g, 'admission', None)
+        if admission is not None:
+            limiter, units = admission
+            limiter.release(units)
+            g.admission = None
@@ -0,0 +1,178 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from oemicroservices.library import InvalidMolecule
+from oemicroservices.common.metrics import record_cache
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      LRUCache                                                        #
+#                                   Thread-safe least recently used cache with hit metrics                             #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class LRUCache(object):
+    """
+    A bounded cache that evicts the least recently used entries
+    """
+
+    def __init__(self, name, max_size):
+        """
+        Default constructor
+        :param name: The cache name in the metrics
+        :type name: str
+        :param max_size: The maximum number of entries (0 disables the cache)
+        :type max_size: int
+        """
+        self.name = name
+        self.max_size = max_size
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key):
+        """
+        Look up an entry
+        :param key: The key
+        :return: The value, or None if the key is not in the cache
+        """
+        if not self.max_size:
+            return None
+        with self.__lock:
+            value = self.__entries.pop(key, None)
+            if value is not None:
+                self.__entries[key] = value
+        record_cache(self.name, value is not None)
+        return value
+
+    def put(self, key, value):
+        """
+        Add an entry, evicting the least recently used entries beyond the maximum size
+        :param key: The key
+        :param value: The value (not None)
+        """
+        if not self.max_size:
+            return
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = value
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def resize(self, max_size):
+        """
+        Change the maximum number of entries
+        :param max_size: The maximum number of entries (0 disables the cache)
+        :type max_size: int
+        """
+        with self.__lock:
+            self.max_size = max_size
+            while len(self.__entries) > max(max_size, 0):
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all entries
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Negative Cache                                                     #
+#                                 Remember inputs that cannot be read, and fail them without a worker                  #
+#                                                                                                                      #
+########################################################################################################################
+
+# Read errors by input hash (see settings.NEGATIVE_CACHE_SIZE)
+NEGATIVE_CACHE = LRUCache('negative', 10000)
+
+
+def input_key(*parts):
+    """
+    Hash request inputs (molecule strings, formats and flags) into a cache key
+    :param parts: The inputs
+    :return: The key
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = u'{0}'.format(part).encode('utf-8')
+        digest.update(part)
+        # Separate the parts so that ('ab', 'c') and ('a', 'bc') differ
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+@contextmanager
+def negative_cache(*parts):
+    """
+    Fail inputs known to be unreadable with their cached error, and cache new read errors
+    :param parts: The inputs that determine whether the molecules can be read (see input_key)
+    """
+    key = input_key(*parts)
+    message = NEGATIVE_CACHE.get(key)
+    if message is not None:
+        raise InvalidMolecule(message)
+    try:
+        yield
+    except InvalidMolecule as ex:
+        NEGATIVE_CACHE.put(key, str(ex))
+        raise
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Error Image Cache                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+# Encoded error images by (width, height, message) (see settings.ERROR_IMAGE_CACHE_SIZE)
+ERROR_IMAGE_CACHE = LRUCache('error_image', 1000)
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                     Layout Cache                                                     #
+#                                                                                                                      #
+########################################################################################################################
+
+# 2D layouts by input hash (see settings.LAYOUT_CACHE_SIZE)
+LAYOUT_CACHE = LRUCache('layout', 10000)
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                    Scaffold Cache                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+# Substructure searches for reference scaffolds laid out in 2D by SMILES, for aligned series depictions
+# (see settings.SCAFFOLD_CACHE_SIZE)
+SCAFFOLD_CACHE = LRUCache('scaffold', 100)
@@ -0,0 +1,312 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+import zlib
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   CompoundStore                                                      #
+#                         In-memory compound set with substructure screen fingerprints                                 #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class CompoundStore(object):
+    """
+    A set of compounds that can be searched by substructure. Each compound is kept as an isomeric SMILES string with a
+    precomputed substructure screen fingerprint. A search tests the fingerprint of the query against every compound
+    first, and only parses and matches the compounds that pass the screen. The toolkits are imported on first use.
+    """
+
+    def __init__(self):
+        # Parallel lists, by position
+        self.__ids = []
+        self.__smiles = []
+        self.__fingerprints = []
+        # Positions by compound ID
+        self.__positions = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def add(self, compound_id, mol):
+        """
+        Add a compound, or replace the compound with the same ID
+        :param compound_id: The compound ID
+        :type compound_id: str
+        :param mol: The compound
+        :type mol: OEMolBase
+        """
+        from openeye.oechem import OECreateIsoSmiString
+        from openeye.oegraphsim import OEFingerPrint, OEMakeSubSearchFP, OESubSearchScreenType_SMARTS
+        smiles = OECreateIsoSmiString(mol)
+        fingerprint = OEFingerPrint()
+        OEMakeSubSearchFP(fingerprint, mol, OESubSearchScreenType_SMARTS)
+        with self.__lock:
+            position = self.__positions.get(compound_id)
+            if position is None:
+                self.__positions[compound_id] = len(self.__ids)
+                self.__ids.append(compound_id)
+                self.__smiles.append(smiles)
+                self.__fingerprints.append(fingerprint)
+            else:
+                self.__smiles[position] = smiles
+                self.__fingerprints[position] = fingerprint
+
+    def add_smiles(self, compound_id, smiles):
+        """
+        Add a compound from its SMILES, or replace the compound with the same ID
+        :param compound_id: The compound ID
+        :type compound_id: str
+        :param smiles: The compound SMILES
+        :type smiles: str
+        """
+        from openeye.oechem import OEGraphMol, OESmilesToMol
+        mol = OEGraphMol()
+        if not OESmilesToMol(mol, str(smiles)):
+            raise Exception("Invalid compound SMILES: {0}".format(smiles))
+        self.add(compound_id, mol)
+
+    def read(self, source, fmt=None, id_tag=None, from_string=False):
+        """
+        Add the compounds of a molecule file. Compounds are identified by an SD tag, or else by their title, or else
+        by their position in the store.
+        :param source: The file path, or the file contents
+        :type source: str or bytes
+        :param fmt: The file format (by default the format of the file extension)
+        :type fmt: str
+        :param id_tag: The SD tag of the compound IDs
+        :type id_tag: str
+        :param from_string: Whether the source is the file contents rather than a path
+        :type from_string: bool
+        :return: The number of compounds added
+        :rtype: int
+        """
+        count = 0
+        for compound_id, mol in iter_compounds(source, fmt, id_tag, from_string):
+            self.add(str(len(self)) if compound_id is None else compound_id, mol)
+            count += 1
+        return count
+
+    def search(self, smarts, start=0, stats=None, max_screen=None, deadline=None):
+        """
+        Find the compounds that contain a substructure. The query is checked before the search starts, so an invalid
+        query raises immediately rather than on the first result. When the search stops after max_screen compounds or
+        at the deadline, the position to continue from is set as the next statistic (otherwise it is None).
+        :param smarts: The SMARTS pattern
+        :type smarts: str
+        :param start: The position in the store to start searching from
+        :type start: int
+        :param stats: A dictionary that counts the compounds screened and the candidates that passed the screen
+        :type stats: dict
+        :param max_screen: The maximum number of compounds to screen (None for the rest of the store)
+        :type max_screen: int
+        :param deadline: The time (as from time.time) at which to stop screening (None for no deadline)
+        :type deadline: float
+        :return: The matching compounds in store order, as (position, ID, SMILES, matched atoms) tuples, where the
+                 matched atoms are a list of atom indices (in SMILES order) for each unique match
+        """
+        from openeye.oechem import OEGraphMol, OEParseSmarts, OEQMol, OESmilesToMol, OESubSearch
+        from openeye.oegraphsim import (
+            OEFingerPrint,
+            OEIsFPSubset,
+            OEMakeSubSearchQueryFP,
+            OESubSearchScreenType_SMARTS)
+        query = OEQMol()
+        if not OEParseSmarts(query, str(smarts)):
+            raise Exception("Invalid SMARTS pattern: {0}".format(smarts))
+        subs = OESubSearch(query)
+        query_fingerprint = OEFingerPrint()
+        OEMakeSubSearchQueryFP(query_fingerprint, query, OESubSearchScreenType_SMARTS)
+        if stats is None:
+            stats = {}
+        stats.setdefault('screened', 0)
+        stats.setdefault('candidates', 0)
+        stats['next'] = None
+        # Compounds are only appended or replaced, so the first count compounds can be read without the lock
+        start = max(start, 0)
+        count = len(self.__ids)
+        if max_screen is not None and start + max_screen < count:
+            count = start + max_screen
+            stats['next'] = count
+
+        def matches():
+            mol = OEGraphMol()
+            for position in range(start, count):
+                if deadline is not None and time.time() >= deadline:
+                    stats['next'] = position
+                    return
+                stats['screened'] += 1
+                # Every screen bit of the query must be set for a compound that contains it
+                if not OEIsFPSubset(query_fingerprint, self.__fingerprints[position]):
+                    continue
+                stats['candidates'] += 1
+                mol.Clear()
+                OESmilesToMol(mol, self.__smiles[position])
+                atoms = [[atom.GetIdx() for atom in match.GetTargetAtoms()] for match in subs.Match(mol, True)]
+                if atoms:
+                    yield position, self.__ids[position], self.__smiles[position], atoms
+        return matches()
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                    Compound files                                                    #
+#                                          Read molecule files into compounds                                          #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def iter_compounds(source, fmt=None, id_tag=None, from_string=False):
+    """
+    Read the compounds of a molecule file
+    :param source: The file path, or the file contents
+    :type source: str or bytes
+    :param fmt: The file format (by default the format of the file extension)
+    :type fmt: str
+    :param id_tag: The SD tag of the compound IDs
+    :type id_tag: str
+    :param from_string: Whether the source is the file contents rather than a path
+    :type from_string: bool
+    :return: The compounds with atoms, as (ID, molecule) tuples, where the ID is the SD tag or else the title, or None
+             if the compound has neither. The molecule is reused between compounds.
+    """
+    from openeye.oechem import (
+        OEFormat_SMI,
+        OEFormat_UNDEFINED,
+        OEGetFileType,
+        OEGetSDData,
+        OEGraphMol,
+        OEHasSDData,
+        OEReadMolecule,
+        oemolistream)
+    ifs = oemolistream()
+    if fmt:
+        mol_format = OEFormat_SMI if fmt.lower() == 'smiles' else OEGetFileType(str(fmt))
+        if mol_format == OEFormat_UNDEFINED:
+            raise Exception("Invalid molecule format: {0}".format(fmt))
+        ifs.SetFormat(mol_format)
+    if not (ifs.openstring(source) if from_string else ifs.open(source)):
+        raise Exception("Error opening compounds")
+    try:
+        mol = OEGraphMol()
+        while OEReadMolecule(ifs, mol):
+            if mol.NumAtoms():
+                if id_tag and OEHasSDData(mol, id_tag):
+                    yield OEGetSDData(mol, id_tag), mol
+                else:
+                    yield mol.GetTitle() or None, mol
+            mol.Clear()
+    finally:
+        ifs.close()
+
+
+def parse_compounds(data, fmt, gz=False, id_tag=None, max_size=None):
+    """
+    Parse an uploaded molecule file. This runs on a worker pool, so it returns SMILES rather than molecules.
+    :param data: The file contents
+    :type data: bytes
+    :param fmt: The file format
+    :type fmt: str
+    :param gz: Whether the file contents are gzipped
+    :type gz: bool
+    :param id_tag: The SD tag of the compound IDs
+    :type id_tag: str
+    :param max_size: The maximum size of the file contents in bytes after decompression (None for no limit)
+    :type max_size: int
+    :return: The compounds, as (ID, isomeric SMILES) tuples (see iter_compounds)
+    :rtype: list
+    """
+    from openeye.oechem import OECreateIsoSmiString
+    if gz:
+        try:
+            inflater = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            data = inflater.decompress(data, max_size or 0)
+        except zlib.error as ex:
+            raise Exception("Invalid gzipped compounds: {0}".format(str(ex)))
+        if inflater.unconsumed_tail:
+            raise Exception("Uncompressed compounds are larger than {0} bytes".format(max_size))
+    return [(compound_id, OECreateIsoSmiString(mol))
+            for compound_id, mol in iter_compounds(data.decode('utf-8'), fmt, id_tag, from_string=True)]
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  CompoundLibrary                                                     #
+#                                  The compound store of a Flask application                                           #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class CompoundLibrary(object):
+    """
+    Substructure search over an in-memory compound set for a Flask application
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.store = CompoundStore()
+        self.id_tag = None
+        self.page_size = 100
+        self.max_page_size = 1000
+        self.max_screen = 100000
+        self.upload_token = None
+        self.max_upload = 16 * 1024 * 1024
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure from the application configuration and load the compound file, if there is one
+        :param app: The Flask application
+        :type app: Flask
+        """
+        self.id_tag = app.config.get('COMPOUND_ID_TAG', self.id_tag)
+        self.page_size = int(app.config.get('COMPOUND_PAGE_SIZE', self.page_size))
+        self.max_page_size = int(app.config.get('COMPOUND_MAX_PAGE_SIZE', self.max_page_size))
+        self.max_screen = int(app.config.get('COMPOUND_MAX_SCREEN', self.max_screen))
+        self.upload_token = app.config.get('COMPOUND_UPLOAD_TOKEN', self.upload_token)
+        self.max_upload = int(app.config.get('COMPOUND_MAX_UPLOAD', self.max_upload))
+        path = app.config.get('COMPOUND_FILE')
+        if path:
+            # Loaded before a pre-forking server forks, so that its processes share the store
+            count = self.store.read(path, id_tag=self.id_tag)
+            app.logger.info("Loaded {0} compounds from {1}".format(count, path))
+        app.extensions['compounds'] = self
+
+    def add(self, compounds):
+        """
+        Add parsed compounds to the store
+        :param compounds: The compounds, as (ID, SMILES) tuples (see parse_compounds)
+        :type compounds: list
+        :return: The number of compounds added
+        :rtype: int
+        """
+        for compound_id, smiles in compounds:
+            self.store.add_smiles(str(len(self.store)) if compound_id is None else compound_id, smiles)
+        return len(compounds)
@@ -0,0 +1,178 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import zlib
+
+from flask import request
+
+from oemicroservices.common.cache import LRUCache
+from oemicroservices.common.metrics import stage
+
+# MIME types that are worth compressing. PNG images are already compressed.
+COMPRESSIBLE_MIMETYPES = (
+    'application/json',
+    'application/postscript',
+    'application/pdf',
+    'image/svg+xml',
+    'text/plain',
+    'text/csv'
+)
+
+# Compressed response bodies by digest and level (see settings.COMPRESSION_CACHE_SIZE)
+COMPRESSED_CACHE = LRUCache('compressed', 1000)
+
+
+def gzip_bytes(data, level=6):
+    """
+    Compress bytes in the gzip format
+    :param data: The bytes to compress
+    :type data: bytes
+    :param level: The compression level (1-9)
+    :type level: int
+    :return: The compressed bytes
+    :rtype: bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress(data) + compressor.flush()
+
+
+def iter_gzip(chunks, level=6):
+    """
+    Compress a stream in the gzip format, one chunk at a time
+    :param chunks: The bytes to compress
+    :param level: The compression level (1-9)
+    :type level: int
+    :return: The compressed chunks
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    try:
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    finally:
+        # Close the stream (e.g. a spool file) even if the client goes away
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def gzip_cached(data, level=6, max_size=None):
+    """
+    Compress bytes in the gzip format, reusing the compressed bytes of identical data
+    :param data: The bytes to compress
+    :type data: bytes
+    :param level: The compression level (1-9)
+    :type level: int
+    :param max_size: Data larger than this (in bytes) is not cached (None for no limit)
+    :type max_size: int
+    :return: The compressed bytes
+    :rtype: bytes
+    """
+    if max_size is not None and len(data) > max_size:
+        return gzip_bytes(data, level)
+    # Hashing is much cheaper than compressing
+    key = (hashlib.sha1(data).digest(), level)
+    compressed = COMPRESSED_CACHE.get(key)
+    if compressed is None:
+        compressed = gzip_bytes(data, level)
+        COMPRESSED_CACHE.put(key, compressed)
+    return compressed
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                ResponseCompression                                                   #
+#                                   Compress responses for clients that accept gzip                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class ResponseCompression(object):
+    """
+    Content-Encoding negotiation for a Flask application
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.level = 6
+        self.min_size = 500
+        self.mimetypes = COMPRESSIBLE_MIMETYPES
+        self.cache_max_body = 256 * 1024
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure from the application configuration and register the response hook
+        :param app: The Flask application
+        :type app: Flask
+        """
+        self.level = int(app.config.get('COMPRESSION_LEVEL', self.level))
+        self.min_size = int(app.config.get('COMPRESSION_MIN_SIZE', self.min_size))
+        self.mimetypes = tuple(app.config.get('COMPRESSION_MIMETYPES', self.mimetypes))
+        self.cache_max_body = app.config.get('COMPRESSION_CACHE_MAX_BODY', self.cache_max_body)
+        COMPRESSED_CACHE.resize(app.config.get('COMPRESSION_CACHE_SIZE', COMPRESSED_CACHE.max_size))
+        app.extensions['compression'] = self
+        app.after_request(self.__after_request)
+
+    def should_compress(self, response):
+        """
+        Check whether a response should be compressed for the current request
+        :param response: The response
+        :type response: Response
+        :return: True if the response should be compressed
+        :rtype: bool
+        """
+        if response.status_code != 200 or response.direct_passthrough:
+            return False
+        if 'Content-Encoding' in response.headers or response.mimetype not in self.mimetypes:
+            return False
+        if response.content_length is not None and response.content_length < self.min_size:
+            return False
+        return request.accept_encodings['gzip'] > 0
+
+    def __after_request(self, response):
+        """
+        Compress the response if the client accepts gzip
+        """
+        response.vary.add('Accept-Encoding')
+        if not self.should_compress(response):
+            return response
+        if response.is_streamed:
+            # Compress streamed responses (e.g. spool files) chunk by chunk, without reading them into memory
+            response.response = iter_gzip(response.response, self.level)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = 'gzip'
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        with stage('encode'):
+            response.set_data(gzip_cached(data, self.level, self.cache_max_body))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
@@ -0,0 +1,112 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+# noinspection PyUnresolvedReferences
+import sys
+
+from openeye.oechem import *
+
+from oemicroservices.common.metrics import stage
+from oemicroservices.common.util import compress_string
+
+############################
+# Python 2/3 Compatibility #
+############################
+
+# To support unicode as UTF-8 in Python 2 and 3
+if sys.version_info < (3,):
+    def to_utf8(u):
+        return u.encode('utf-8')
+else:
+    def to_utf8(u):
+        return u
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Molecule Conversion                                                  #
+#                                  Convert between molecule file formats with OEChem                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def get_output_format(fmt):
+    """
+    Get the OEChem file format of an output file format name
+    :param fmt: The output file format (e.g. smiles, sdf, pdb)
+    :type fmt: str
+    :return: The OEChem file format
+    :rtype: int
+    """
+    if fmt == "smiles":
+        ofs_format = OEFormat_SMI
+    else:
+        ofs_format = OEGetFileType(to_utf8(fmt))
+    if ofs_format == OEFormat_UNDEFINED:
+        raise Exception("Unknown output file type: " + fmt)
+    return ofs_format
+
+
+def write_molecule_to_string(mol, fmt, gz=False):
+    """
+    Write a molecule to a molecule string
+    :param mol: The molecule
+    :type mol: OEMolBase
+    :param fmt: The output file format
+    :type fmt: str
+    :param gz: Whether to gzip and then base64 encode the molecule string
+    :type gz: bool
+    :return: The molecule string
+    :rtype: str
+    """
+    # Prepare the molecule for writing
+    ofs = oemolostream()
+    ofs.SetFormat(get_output_format(fmt))
+    ofs.openstring()
+    with stage('write'):
+        OEWriteMolecule(ofs, mol)
+
+    # Get molecule output stream
+    if gz:
+        with stage('compress'):
+            return compress_string(ofs.GetString().decode('utf-8'))
+    return ofs.GetString().decode('utf-8')
+
+
+def write_molecule_to_file(mol, fmt, filename):
+    """
+    Write a molecule to a file, so that large molecules are not held in memory as strings
+    :param mol: The molecule
+    :type mol: OEMolBase
+    :param fmt: The output file format
+    :type fmt: str
+    :param filename: The file
+    :type filename: str
+    """
+    ofs_format = get_output_format(fmt)
+    ofs = oemolostream()
+    if not ofs.open(to_utf8(filename)):
+        raise Exception("Error opening output file")
+    # The format is set after opening, which would otherwise guess it from the file extension
+    ofs.SetFormat(ofs_format)
+    ofs.Setgz(False)
+    with stage('write'):
+        OEWriteMolecule(ofs, mol)
+    ofs.close()
@@ -0,0 +1,120 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import base64
+import json
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Frame Documents                                                      #
+#                     Write the per-frame images and an interaction summary of a trajectory as JSON                    #
+#                                                                                                                      #
+# The document is written frame by frame, so that only one frame is held in memory:                                    #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   frames: [                                                                                                          #
+#     {frame: 0, image: The base64 encoded image, interactions: [{residue: e.g. TYR123:A, type: e.g. hbond}, ...]},    #
+#     {frame: 1, error: The reason the frame could not be depicted},                                                   #
+#     ...                                                                                                              #
+#   ],                                                                                                                 #
+#   summary: {                                                                                                         #
+#     frames:       The number of frames                                                                               #
+#     depicted:     The number of frames depicted                                                                      #
+#     truncated:    If frames beyond the maximum were not read                                                         #
+#     interactions: [{residue, type, frames, frequency}, ...], most frequent first, where frequency is the fraction    #
+#                   of the depicted frames with the interaction                                                        #
+#   }                                                                                                                  #
+# }                                                                                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class InteractionCounter(object):
+    """
+    Counts the frames with each receptor residue interaction
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.depicted = 0
+        self.counts = {}
+
+    def add(self, interactions):
+        """
+        Count the interactions of a frame
+        :param interactions: The interactions of the frame, as dictionaries with residue and type keys (None if the
+                             frame could not be depicted)
+        :type interactions: list
+        """
+        self.frames += 1
+        if interactions is None:
+            return
+        self.depicted += 1
+        # An interaction counts once per frame, however many atoms take part in it
+        for key in set((interaction['residue'], interaction['type']) for interaction in interactions):
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def summary(self):
+        """
+        Summarize the interactions
+        :return: The number of frames and the frequency of each interaction, most frequent first
+        :rtype: dict
+        """
+        interactions = [
+            {'residue': residue, 'type': kind, 'frames': count,
+             'frequency': round(float(count) / self.depicted, 4) if self.depicted else 0.0}
+            for (residue, kind), count in self.counts.items()
+        ]
+        interactions.sort(key=lambda item: (-item['frames'], item['residue'], item['type']))
+        return {'frames': self.frames, 'depicted': self.depicted, 'interactions': interactions}
+
+
+def write_frames(frames, filename, max_frames=None):
+    """
+    Write a frame document
+    :param frames: The frames, as (image, interactions, error) tuples, with the image and interactions None if the
+                   frame could not be depicted
+    :param filename: The file to write the document to
+    :type filename: str
+    :param max_frames: The maximum number of frames to read (None for no limit)
+    :type max_frames: int
+    :return: The summary
+    :rtype: dict
+    """
+    counter = InteractionCounter()
+    truncated = False
+    with open(filename, 'wb') as f:
+        f.write(b'{"frames": [')
+        for index, (image, interactions, error) in enumerate(frames):
+            if max_frames is not None and index >= max_frames:
+                truncated = True
+                break
+            if image is None:
+                frame = {'frame': index, 'error': error}
+            else:
+                frame = {'frame': index, 'image': base64.b64encode(image).decode('ascii'),
+                         'interactions': interactions}
+            counter.add(None if image is None else interactions)
+            f.write((b', ' if index else b'') + json.dumps(frame).encode('utf-8'))
+        summary = counter.summary()
+        summary['truncated'] = truncated
+        f.write(b'], "summary": ' + json.dumps(summary).encode('utf-8') + b'}')
+    return summary
@@ -52,6 +52,35 @@ class OEHasResidueName(OEUnaryAtomPred):
         return OEHasResidueName(self.resn).__disown__()
 
 
+class OEHasAtomIdxIn(OEUnaryAtomPred):
+    """
+    Predicate functor to get the atoms with any of a set of atom indices
+    """
+    def __init__(self, indices):
+        """
+        Default constructor
+        :param indices: The atom indices
+        :type indices: set
+        :return:
+        """
+        OEUnaryAtomPred.__init__(self)
+        self.indices = indices
+
+    def __call__(self, atom):
+        """
+        Automatically called on each atom in an OEMol
+        :param atom: The atom the functor is evaluating
+        :type atom: OEAtomBase
+        :return: True if the functor evaluates to true
+        """
+        return atom.GetIdx() in self.indices
+
+    def CreateCopy(self):
+        # __disown__ is required to allow C++ to take ownership of this
+        # object and its memory
+        return OEHasAtomIdxIn(self.indices).__disown__()
+
+
 def generate_ligand_functor(chain=None, resi=None, resn=None):
     """
     Generate the predicate functor to select the ligand atoms out of the
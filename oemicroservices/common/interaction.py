@@ -0,0 +1,193 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from openeye.oechem import *
+from openeye.oedepict import *
+from openeye.oegrapheme import *
+
+from openeye.oedocking import *
+
+from oemicroservices.common.metrics import stage
+from oemicroservices.common.functor import generate_ligand_functor
+from oemicroservices.library import get_image_mime_type
+from oemicroservices.common.util import (
+    write_image,
+    get_color_from_rgba,
+    get_title_location)
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                Interaction Depiction                                                 #
+#                                  Render receptor-ligand interactions with Grapheme                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def get_interactions(asite):
+    """
+    List the interactions of the receptor residues with the ligand
+    :param asite: The active site, with its interactions perceived
+    :type asite: OEFragmentNetwork
+    :return: The interactions, as dictionaries with the residue (e.g. TYR123:A) and interaction type
+    :rtype: list
+    """
+    interactions = []
+    for interaction in asite.GetInteractions():
+        fragment = interaction.GetFragment(OEProteinInteractionHintComponent())
+        if fragment is None:
+            continue
+        kind = interaction.GetInteractionType().GetName()
+        residues = set()
+        for atom in fragment.GetAtoms():
+            res = OEAtomGetResidue(atom)
+            residues.add("{0}{1}:{2}".format(res.GetName().strip(), res.GetResidueNumber(), res.GetChainID()))
+        interactions.extend({'residue': residue, 'type': kind} for residue in sorted(residues))
+    return interactions
+
+
+def render_interaction_image(receptor, ligand, args, filename=None, interactions=None):
+    """
+    Render a receptor-ligand interaction image
+    :param receptor: The receptor
+    :type receptor OEMolBase
+    :param ligand: The bound ligand
+    :type ligand: OEMolBase
+    :param args: The depiction options (see oemicroservices.library.INTERACTION_OPTIONS)
+    :type args: dict
+    :param filename: The file to write the image to, instead of returning it
+    :type filename: str
+    :param interactions: A list to add the perceived interactions to (see get_interactions)
+    :type interactions: list
+    :return: The rendered image (None if written to a file) and its MIME type
+    :rtype: tuple
+    """
+    # *********************************************************************
+    # *                      Parse Parameters                             *
+    # *********************************************************************
+    width = args['width']                                       # Image width
+    height = args['height']                                     # Image height
+    title = args['title']                                       # Image title
+    use_molecule_title = bool(args['keeptitle'])                # Use the molecule title in the molecule file
+    bond_scaling = bool(args['scalebonds'])                      # Bond width scales with size
+    image_format = args['format']                               # The output image format
+    image_mimetype = get_image_mime_type(image_format)          # MIME type corresponding to the image format
+    title_location = get_title_location(args['titleloc'])       # The OpenEye title location (if we have a title)
+    legend = bool(args['legend'])                               # Display a legend
+    background = get_color_from_rgba(args['background'])        # Background color
+
+    # Make sure we got valid inputs
+    if not image_mimetype:
+        raise Exception("Invalid MIME type")
+
+    if not title_location:
+        title_location = OETitleLocation_Top
+    # *********************************************************************
+    # *                      Create the Image                             *
+    # *********************************************************************
+    image = OEImage(width, height)
+    # Compute the image frame sizes
+    cwidth = width if legend == 0 else 0.80 * width
+    lwidth = width if legend == 0 else 0.20 * width
+    loffset = 0.0 if legend == 0 else 0.8 * width
+    cframe = OEImageFrame(image, cwidth, height, OE2DPoint(0.0, 0.0))
+    lframe = OEImageFrame(image, lwidth, height, OE2DPoint(loffset, 0.0))
+    # Prepare the depiction
+    opts = OE2DActiveSiteDisplayOptions(cframe.GetWidth(), cframe.GetHeight())
+
+    # Additional visualization options
+    opts.SetBondWidthScaling(bond_scaling)
+    opts.SetBackgroundColor(background)
+
+    # Perceive interactions
+    with stage('prepare'):
+        asite = OEFragmentNetwork(receptor, ligand)
+
+    if not asite.IsValid():
+        raise Exception("The active site is not valid")
+
+    # Add optional title
+    if title:
+        asite.SetTitle(title)
+        opts.SetTitleLocation(title_location)
+    elif use_molecule_title:
+        asite.SetTitle(ligand.GetTitle())
+        opts.SetTitleLocation(title_location)
+    else:
+        asite.SetTitle("")
+        opts.SetTitleLocation(OETitleLocation_Hidden)
+
+    # Add interactions
+    with stage('prepare'):
+        OEAddDockingInteractions(asite)
+        OEPrepareActiveSiteDepiction(asite)
+        if interactions is not None:
+            interactions.extend(get_interactions(asite))
+
+    with stage('render'):
+        # Render the active site
+        adisp = OE2DActiveSiteDisplay(asite, opts)
+        OERenderActiveSite(cframe, adisp)
+
+        # Render the legend
+        if args['legend'] != 0:
+            lopts = OE2DActiveSiteLegendDisplayOptions(10, 1)
+            OEDrawActiveSiteLegend(lframe, adisp, lopts)
+
+    # Return the image
+    with stage('write'):
+        img_content = write_image(image, image_format, filename)
+    return img_content, image_mimetype
+
+
+def split_complex(mol, chain=None, resi=None, resn=None):
+    """
+    Split the ligand out of a receptor-ligand complex
+    :param mol: The receptor-ligand complex (the ligand atoms are deleted from it)
+    :type mol: OEMolBase
+    :param chain: The chain ID of the ligand
+    :type chain: str
+    :param resi: The residue number of the ligand
+    :type resi: int
+    :param resn: The residue name of the ligand
+    :type resn: str
+    :return: The receptor and the ligand
+    :rtype: tuple
+    """
+    # Generate the ligand selection functor
+    functor = generate_ligand_functor(chain, resi, resn)
+
+    # Split the ligand from the complex
+    ligand = OEGraphMol()
+    OESubsetMol(ligand, mol, functor, False, False)
+
+    # Check the ligand
+    if not ligand or ligand.NumAtoms() == 0:
+        raise Exception("No atoms matched ligand selection")
+
+    # Delete the ligand from the complex
+    for atom in mol.GetAtoms(functor):
+        mol.DeleteAtom(atom)
+
+    # Error check receptor
+    if not mol or mol.NumAtoms() == 0:
+        raise Exception("No atoms in receptor")
+
+    return mol, ligand
@@ -0,0 +1,559 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from oemicroservices.common.admission import ServiceOverloaded
+from oemicroservices.common.pool import DeadlineExceeded, WorkerPool
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# Job types and the molecules they process
+JOB_TYPES = ('depict', 'interaction', 'convert')
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      JobStore                                                        #
+#                              Persistent job queue and results in a local SQLite database                             #
+#                                                                                                                      #
+########################################################################################################################
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        client TEXT,
+        type TEXT,
+        status TEXT,
+        request TEXT,
+        mimetype TEXT,
+        total INTEGER,
+        completed INTEGER DEFAULT 0,
+        errors INTEGER DEFAULT 0,
+        created REAL,
+        started REAL,
+        finished REAL,
+        updated REAL,
+        error TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)',
+    '''CREATE TABLE IF NOT EXISTS results (
+        job TEXT,
+        idx INTEGER,
+        value BLOB,
+        error TEXT,
+        PRIMARY KEY (job, idx)
+    )'''
+)
+
+# Job fields that are reported to clients
+JOB_FIELDS = ('id', 'type', 'status', 'total', 'completed', 'errors', 'created', 'started', 'finished', 'error')
+
+
+class TooManyJobs(Exception):
+    """
+    Raised when a client already has the maximum number of active jobs
+    """
+    pass
+
+
+class JobStore(object):
+    """
+    Jobs and their results in a SQLite database, which may be shared by several server processes
+    """
+
+    def __init__(self, path):
+        """
+        Default constructor
+        :param path: The database file
+        :type path: str
+        """
+        self.path = path
+        with self.__connect() as db:
+            for statement in _SCHEMA:
+                db.execute(statement)
+
+    def __connect(self):
+        """
+        Open a connection. Connections are not shared between threads, so each operation opens its own.
+        :return: The connection
+        :rtype: sqlite3.Connection
+        """
+        db = sqlite3.connect(self.path, timeout=30.0)
+        db.row_factory = sqlite3.Row
+        return db
+
+    # noinspection PyMethodMayBeStatic
+    def __job(self, row):
+        """
+        Convert a job row to a dictionary
+        :param row: The row
+        :type row: sqlite3.Row
+        :return: The job
+        :rtype: dict
+        """
+        if row is None:
+            return None
+        job = dict((key, row[key]) for key in JOB_FIELDS)
+        job['client'] = row['client']
+        job['mimetype'] = row['mimetype']
+        return job
+
+    def submit(self, client, job_type, request, total, mimetype, limit=None):
+        """
+        Queue a job
+        :param client: The client identifier
+        :type client: str
+        :param job_type: The job type (depict, interaction or convert)
+        :type job_type: str
+        :param request: The validated job request
+        :type request: dict
+        :param total: The number of molecules
+        :type total: int
+        :param mimetype: The MIME type of the results
+        :type mimetype: str
+        :param limit: The maximum number of queued and running jobs of the client
+        :type limit: int
+        :return: The job
+        :rtype: dict
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        db = self.__connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            if limit is not None:
+                active = db.execute('SELECT COUNT(*) FROM jobs WHERE client = ? AND status IN (?, ?)',
+                                    (client,) + ACTIVE_STATES).fetchone()[0]
+                if active >= limit:
+                    raise TooManyJobs("Client has {0} active jobs (limit {1})".format(active, limit))
+            db.execute('INSERT INTO jobs (id, client, type, status, request, mimetype, total, created, updated) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (job_id, client, job_type, QUEUED, json.dumps(request), mimetype, total, now, now))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """
+        Get a job
+        :param job_id: The job ID
+        :type job_id: str
+        :return: The job, or None if there is no such job
+        :rtype: dict
+        """
+        db = self.__connect()
+        try:
+            return self.__job(db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+        finally:
+            db.close()
+
+    def claim(self, running_per_client=None):
+        """
+        Start the oldest queued job of a client with fewer than running_per_client running jobs
+        :param running_per_client: The maximum number of running jobs per client
+        :type running_per_client: int
+        :return: The job with its request, or None if no job can start
+        :rtype: dict
+        """
+        now = time.time()
+        db = self.__connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            query = 'SELECT * FROM jobs AS j WHERE status = ?'
+            params = (QUEUED,)
+            if running_per_client is not None:
+                query += ' AND (SELECT COUNT(*) FROM jobs AS r WHERE r.client = j.client AND r.status = ?) < ?'
+                params += (RUNNING, running_per_client)
+            row = db.execute(query + ' ORDER BY created LIMIT 1', params).fetchone()
+            if row is None:
+                db.rollback()
+                return None
+            db.execute('UPDATE jobs SET status = ?, started = COALESCE(started, ?), updated = ? WHERE id = ?',
+                       (RUNNING, now, now, row['id']))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        job = self.__job(row)
+        job['status'] = RUNNING
+        job['request'] = json.loads(row['request'])
+        return job
+
+    def add_results(self, job_id, start, results):
+        """
+        Store the results of consecutive molecules and update the job progress
+        :param job_id: The job ID
+        :type job_id: str
+        :param start: The index of the first molecule
+        :type start: int
+        :param results: The result and error message of each molecule, as (bytes, str) tuples
+        :type results: list
+        """
+        errors = sum(1 for value, error in results if error is not None)
+        db = self.__connect()
+        try:
+            db.executemany('INSERT OR REPLACE INTO results (job, idx, value, error) VALUES (?, ?, ?, ?)', [
+                (job_id, start + i, None if value is None else sqlite3.Binary(value), error)
+                for i, (value, error) in enumerate(results)
+            ])
+            db.execute('UPDATE jobs SET completed = ?, errors = errors + ?, updated = ? WHERE id = ?',
+                       (start + len(results), errors, time.time(), job_id))
+            db.commit()
+        finally:
+            db.close()
+
+    def finish(self, job_id, status, error=None):
+        """
+        Finish a running job, unless it was cancelled
+        :param job_id: The job ID
+        :type job_id: str
+        :param status: The final status (done or failed)
+        :type status: str
+        :param error: The reason the job failed
+        :type error: str
+        """
+        now = time.time()
+        db = self.__connect()
+        try:
+            db.execute('UPDATE jobs SET status = ?, error = ?, finished = ?, updated = ? WHERE id = ? AND status = ?',
+                       (status, error, now, now, job_id, RUNNING))
+            db.commit()
+        finally:
+            db.close()
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job. A running job stops after its current chunk of molecules.
+        :param job_id: The job ID
+        :type job_id: str
+        :return: True if the job was active
+        :rtype: bool
+        """
+        now = time.time()
+        db = self.__connect()
+        try:
+            cursor = db.execute('UPDATE jobs SET status = ?, finished = ?, updated = ? '
+                                'WHERE id = ? AND status IN (?, ?)', (CANCELLED, now, now, job_id) + ACTIVE_STATES)
+            db.commit()
+            return cursor.rowcount > 0
+        finally:
+            db.close()
+
+    def delete(self, job_id):
+        """
+        Delete a job and its results
+        :param job_id: The job ID
+        :type job_id: str
+        """
+        db = self.__connect()
+        try:
+            db.execute('DELETE FROM results WHERE job = ?', (job_id,))
+            db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            db.commit()
+        finally:
+            db.close()
+
+    def status(self, job_id):
+        """
+        Get the status of a job
+        :param job_id: The job ID
+        :type job_id: str
+        :return: The status, or None if there is no such job
+        :rtype: str
+        """
+        db = self.__connect()
+        try:
+            row = db.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            return None if row is None else row[0]
+        finally:
+            db.close()
+
+    def results(self, job_id, offset=0, limit=100):
+        """
+        Get the results of a job
+        :param job_id: The job ID
+        :type job_id: str
+        :param offset: The index of the first result
+        :type offset: int
+        :param limit: The maximum number of results
+        :type limit: int
+        :return: The results, as (index, bytes, error) tuples
+        :rtype: list
+        """
+        db = self.__connect()
+        try:
+            rows = db.execute('SELECT idx, value, error FROM results WHERE job = ? AND idx >= ? ORDER BY idx LIMIT ?',
+                              (job_id, offset, limit)).fetchall()
+            return [(row[0], None if row[1] is None else bytes(row[1]), row[2]) for row in rows]
+        finally:
+            db.close()
+
+    def requeue_stale(self, age):
+        """
+        Requeue running jobs without progress for a while, e.g. because their server process died. They resume from
+        their last completed chunk.
+        :param age: The time in seconds without progress
+        :type age: float
+        :return: The number of jobs requeued
+        :rtype: int
+        """
+        db = self.__connect()
+        try:
+            cursor = db.execute('UPDATE jobs SET status = ? WHERE status = ? AND updated < ?',
+                                (QUEUED, RUNNING, time.time() - age))
+            db.commit()
+            return cursor.rowcount
+        finally:
+            db.close()
+
+    def cleanup(self, ttl):
+        """
+        Delete finished jobs and their results after their time to live
+        :param ttl: The time to live in seconds after a job finishes
+        :type ttl: float
+        :return: The number of jobs deleted
+        :rtype: int
+        """
+        db = self.__connect()
+        try:
+            expired = [row[0] for row in db.execute(
+                'SELECT id FROM jobs WHERE status NOT IN (?, ?) AND finished < ?',
+                ACTIVE_STATES + (time.time() - ttl,)).fetchall()]
+            for job_id in expired:
+                db.execute('DELETE FROM results WHERE job = ?', (job_id,))
+                db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            db.commit()
+            return len(expired)
+        finally:
+            db.close()
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                     Job Work                                                         #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def run_chunk(job_type, request, molecules):
+    """
+    Process a chunk of the molecules of a job with the library functions. Runs in a worker pool, so the arguments and
+    return value must be picklable.
+    :param job_type: The job type (depict, interaction or convert)
+    :type job_type: str
+    :param request: The job request
+    :type request: dict
+    :param molecules: The molecules, as dictionaries with value, format and optional gz keys
+    :type molecules: list
+    :return: The result and error message of each molecule, as (bytes, str) tuples. Gzipped output molecule strings are
+             raw gzip, and are base64 encoded only for JSON responses.
+    :rtype: list
+    """
+    from oemicroservices import library
+    from oemicroservices.common.util import compress
+    options = request.get('options', {})
+    reparse = bool(request.get('reparse', False))
+    receptor = None
+    if job_type == 'interaction':
+        # Read the receptor once for the chunk
+        from oemicroservices.common.util import read_molecule_from_string
+        receptor = read_molecule_from_string(request['receptor']['value'], request['receptor']['format'],
+                                             bool(request['receptor'].get('gz', False)), reparse)
+    results = []
+    for molecule in molecules:
+        try:
+            if job_type == 'depict':
+                value = library.depict(molecule['value'], molecule['format'], molecule.get('gz', False), reparse,
+                                       **options)
+            elif job_type == 'interaction':
+                value = library.depict_interaction(receptor, molecule['value'], ligand_format=molecule['format'],
+                                                   ligand_gz=molecule.get('gz', False), reparse=reparse, debug=True,
+                                                   **options)
+            else:
+                value = library.convert(molecule['value'], request['output']['format'], molecule['format'],
+                                        molecule.get('gz', False), reparse).encode('utf-8')
+                if request['output'].get('gz', False):
+                    value = compress(value)
+            results.append((value, None))
+        except Exception as ex:
+            results.append((None, str(ex)))
+    return results
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      JobQueue                                                        #
+#                                    Run queued jobs on background threads of a Flask application                      #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class JobQueue(object):
+    """
+    Asynchronous batch jobs for a Flask application
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.store = None
+        self.pool = None
+        self.workers = 2
+        self.chunk_size = 50
+        self.deadline = 300.0
+        self.max_molecules = 100000
+        self.per_client = 4
+        self.running_per_client = 1
+        self.ttl = 24 * 3600.0
+        self.stale_after = 900.0
+        self.poll_interval = 1.0
+        self.cleanup_interval = 60.0
+        self.__started = None
+        self.__last_cleanup = 0.0
+        self.__lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure from the application configuration and register the request hook that starts the runners
+        :param app: The Flask application
+        :type app: Flask
+        """
+        self.store = JobStore(app.config['JOBS_DATABASE'])
+        self.workers = int(app.config.get('JOBS_WORKERS', self.workers))
+        self.chunk_size = int(app.config.get('JOBS_CHUNK_SIZE', self.chunk_size))
+        self.deadline = app.config.get('JOBS_CHUNK_DEADLINE', self.deadline)
+        self.max_molecules = int(app.config.get('JOBS_MAX_MOLECULES', self.max_molecules))
+        self.per_client = app.config.get('JOBS_PER_CLIENT', self.per_client)
+        self.running_per_client = app.config.get('JOBS_RUNNING_PER_CLIENT', self.running_per_client)
+        self.ttl = float(app.config.get('JOBS_TTL', self.ttl))
+        self.stale_after = float(app.config.get('JOBS_STALE_AFTER', self.stale_after))
+        self.poll_interval = float(app.config.get('JOBS_POLL_INTERVAL', self.poll_interval))
+        self.pool = WorkerPool('jobs', self.workers, queue=self.workers,
+                               processes=app.config.get('JOBS_PROCESSES', True),
+                               memory_limit=app.config.get('JOBS_MEMORY_LIMIT'))
+        app.extensions['jobs'] = self
+        app.before_request(self.start)
+
+    def start(self):
+        """
+        Start the runner threads of this process. This is deferred until the first request so that the runners
+        survive a pre-forking server.
+        """
+        with self.__lock:
+            if self.__started == os.getpid():
+                return
+            self.__started = os.getpid()
+            for i in range(self.workers):
+                runner = threading.Thread(target=self.__run, name="jobs-runner-{0}".format(i))
+                runner.daemon = True
+                runner.start()
+
+    def submit(self, client, job_type, request, mimetype):
+        """
+        Queue a job
+        :param client: The client identifier
+        :type client: str
+        :param job_type: The job type (depict, interaction or convert)
+        :type job_type: str
+        :param request: The validated job request
+        :type request: dict
+        :param mimetype: The MIME type of the results
+        :type mimetype: str
+        :return: The job
+        :rtype: dict
+        """
+        return self.store.submit(client, job_type, request, len(request['molecules']), mimetype, self.per_client)
+
+    def process(self, job):
+        """
+        Run a claimed job, resuming after its completed molecules
+        :param job: The job with its request (see JobStore.claim)
+        :type job: dict
+        """
+        molecules = job['request']['molecules']
+        start = job['completed']
+        while start < len(molecules):
+            # Stop if the job was cancelled
+            if self.store.status(job['id']) != RUNNING:
+                return
+            chunk = molecules[start:start + self.chunk_size]
+            try:
+                results = self.pool.run(run_chunk, (job['type'], job['request'], chunk), self.deadline)
+            except ServiceOverloaded:
+                time.sleep(self.poll_interval)
+                continue
+            except DeadlineExceeded as ex:
+                results = [(None, str(ex))] * len(chunk)
+            self.store.add_results(job['id'], start, results)
+            start += len(chunk)
+        self.store.finish(job['id'], DONE)
+
+    def maintain(self):
+        """
+        Delete expired jobs and requeue stale ones, at most once per cleanup interval
+        """
+        with self.__lock:
+            if time.time() - self.__last_cleanup < self.cleanup_interval:
+                return
+            self.__last_cleanup = time.time()
+        self.store.cleanup(self.ttl)
+        self.store.requeue_stale(self.stale_after)
+
+    def __run(self):
+        """
+        Runner thread main loop
+        """
+        while True:
+            job = None
+            try:
+                self.maintain()
+                job = self.store.claim(self.running_per_client)
+                if job is None:
+                    time.sleep(self.poll_interval)
+                    continue
+                self.process(job)
+            except Exception as ex:
+                if job is not None:
+                    self.store.finish(job['id'], FAILED, str(ex))
+                time.sleep(self.poll_interval)
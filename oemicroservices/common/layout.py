@@ -0,0 +1,105 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from openeye.oechem import *
+from openeye.oedepict import *
+
+from oemicroservices.common.metrics import stage
+from oemicroservices.common.molecule import prepare_depiction
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Molecule Layout                                                    #
+#                               2D coordinates of small molecules for rendering by clients                             #
+#                                                                                                                      #
+########################################################################################################################
+
+# Wedge and hash bonds of the depiction, by MDL bond stereo
+BOND_STEREO = {
+    OEBondStereo_Wedge: 'wedge',
+    OEBondStereo_Hash: 'hash'
+}
+
+
+def molecule_layout(mol, highlight=None, scaffold=None, precision=3):
+    """
+    Lay out a small molecule in 2D. The atoms and bonds are returned as parallel lists (one entry per atom or bond), and
+    bonds refer to atoms by their position in the atom lists:
+
+    {
+      title: The molecule title
+      atoms: {element: [], x: [], y: [], charge: [], hydrogens: []}
+      bonds: {begin: [], end: [], order: [], aromatic: [], stereo: [] ('wedge', 'hash' or None)}
+      highlights: [{smarts: The SMARTS pattern, atoms: [], bonds: []}]
+    }
+
+    :param mol: The molecule (the depiction coordinates are changed)
+    :type mol: OEMolBase
+    :param highlight: SMARTS substructures to match
+    :type highlight: list
+    :param scaffold: A reference scaffold to align the layout to (see oemicroservices.common.molecule.get_scaffold)
+    :type scaffold: str or OEMolBase
+    :param precision: Number of decimals of the coordinates
+    :type precision: int
+    :return: The layout
+    :rtype: dict
+    """
+    prepare_depiction(mol, scaffold)
+    with stage('prepare'):
+        # Mark the wedge and hash bonds of the new coordinates
+        OEMDLPerceiveBondStereo(mol)
+
+    with stage('write'):
+        # Atoms and bonds are numbered by position, because suppressed hydrogens leave gaps in the indices
+        atom_positions = {}
+        atoms = {'element': [], 'x': [], 'y': [], 'charge': [], 'hydrogens': []}
+        for atom in mol.GetAtoms():
+            atom_positions[atom.GetIdx()] = len(atom_positions)
+            x, y, _ = mol.GetCoords(atom)
+            atoms['element'].append(OEGetAtomicSymbol(atom.GetAtomicNum()))
+            atoms['x'].append(round(x, precision))
+            atoms['y'].append(round(y, precision))
+            atoms['charge'].append(atom.GetFormalCharge())
+            atoms['hydrogens'].append(atom.GetImplicitHCount())
+
+        bond_positions = {}
+        bonds = {'begin': [], 'end': [], 'order': [], 'aromatic': [], 'stereo': []}
+        for bond in mol.GetBonds():
+            bond_positions[bond.GetIdx()] = len(bond_positions)
+            bonds['begin'].append(atom_positions[bond.GetBgnIdx()])
+            bonds['end'].append(atom_positions[bond.GetEndIdx()])
+            bonds['order'].append(bond.GetOrder())
+            bonds['aromatic'].append(bool(bond.IsAromatic()))
+            bonds['stereo'].append(BOND_STEREO.get(bond.GetIntType()))
+
+        highlights = []
+        for smarts in highlight or ():
+            subs = OESubSearch(smarts)
+            if not subs.IsValid():
+                raise Exception("Invalid SMARTS pattern: {0}".format(smarts))
+            matched_atoms = set()
+            matched_bonds = set()
+            for match in subs.Match(mol, True):
+                matched_atoms.update(atom_positions[atom.GetIdx()] for atom in match.GetTargetAtoms())
+                matched_bonds.update(bond_positions[bond.GetIdx()] for bond in match.GetTargetBonds())
+            highlights.append({'smarts': smarts, 'atoms': sorted(matched_atoms), 'bonds': sorted(matched_bonds)})
+
+    return {'title': mol.GetTitle(), 'atoms': atoms, 'bonds': bonds, 'highlights': highlights}
@@ -0,0 +1,484 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import bisect
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from flask import Response, request, g
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Metric primitives                                                    #
+#                                     Minimal counters and histograms in Prometheus style                              #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def _format_labels(labelnames, labels):
+    """
+    Format label names and values in the Prometheus text format
+    :param labelnames: The label names
+    :type labelnames: tuple
+    :param labels: The label values
+    :type labels: tuple
+    :return: The formatted labels, e.g. {endpoint="moleculedepictor"}
+    :rtype: str
+    """
+    if not labelnames:
+        return ''
+    values = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels)
+    return '{' + ','.join('{0}="{1}"'.format(n, v) for n, v in zip(labelnames, values)) + '}'
+
+
+def _format_value(value):
+    """
+    Format a sample value in the Prometheus text format
+    :param value: The value
+    :type value: float
+    :return: The formatted value
+    :rtype: str
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """
+    A monotonically increasing counter with labels
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Default constructor
+        :param name: The metric name
+        :type name: str
+        :param documentation: The metric help text
+        :type documentation: str
+        :param labelnames: The label names
+        :type labelnames: tuple
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.__lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        """
+        Increment the counter
+        :param labels: The label values, in the order of the label names
+        :type labels: tuple
+        :param amount: The amount to increment by
+        :type amount: int or float
+        """
+        with self.__lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        """
+        Render the counter in the Prometheus text format
+        :return: The lines of the exposition
+        :rtype: list
+        """
+        lines = ['# HELP {0} {1}'.format(self.name, self.documentation), '# TYPE {0} counter'.format(self.name)]
+        with self.__lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append('{0}{1} {2}'.format(self.name, _format_labels(self.labelnames, labels), value))
+        return lines
+
+
+class Histogram(object):
+    """
+    A histogram with fixed buckets and labels
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        """
+        Default constructor
+        :param name: The metric name
+        :type name: str
+        :param documentation: The metric help text
+        :type documentation: str
+        :param labelnames: The label names
+        :type labelnames: tuple
+        :param buckets: The bucket upper bounds, in increasing order (+Inf is added automatically)
+        :type buckets: tuple
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.values = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, labels, value):
+        """
+        Observe a value
+        :param labels: The label values, in the order of the label names
+        :type labels: tuple
+        :param value: The observed value
+        :type value: int or float
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self.__lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                # Bucket counts followed by the sum of observed values
+                counts = self.values[labels] = [0] * len(self.buckets) + [0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self):
+        """
+        Render the histogram in the Prometheus text format
+        :return: The lines of the exposition
+        :rtype: list
+        """
+        lines = ['# HELP {0} {1}'.format(self.name, self.documentation), '# TYPE {0} histogram'.format(self.name)]
+        labelnames = self.labelnames + ('le',)
+        with self.__lock:
+            for labels, counts in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append('{0}_bucket{1} {2}'.format(
+                        self.name, _format_labels(labelnames, labels + (_format_value(bound),)), cumulative))
+                formatted = _format_labels(self.labelnames, labels)
+                lines.append('{0}_sum{1} {2}'.format(self.name, formatted, _format_value(counts[-1])))
+                lines.append('{0}_count{1} {2}'.format(self.name, formatted, cumulative))
+        return lines
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Service metrics                                                      #
+#                                                                                                                      #
+########################################################################################################################
+
+# Buckets for latencies in seconds
+__latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Buckets for molecule sizes in atoms
+__atom_buckets = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+REQUEST_LATENCY = Histogram('oemicroservices_request_seconds', 'Request latency in seconds',
+                            ('endpoint',), __latency_buckets)
+STAGE_LATENCY = Histogram('oemicroservices_stage_seconds', 'Latency of each processing stage in seconds',
+                          ('endpoint', 'stage'), __latency_buckets)
+MOLECULE_ATOMS = Histogram('oemicroservices_molecule_atoms', 'Number of atoms in each molecule read',
+                           ('endpoint',), __atom_buckets)
+REQUESTS = Counter('oemicroservices_requests_total', 'Requests by endpoint and HTTP status', ('endpoint', 'status'))
+ERRORS = Counter('oemicroservices_errors_total', 'Failed requests by endpoint and reason', ('endpoint', 'reason'))
+INPUT_FORMATS = Counter('oemicroservices_input_format_total', 'Molecule input formats', ('endpoint', 'format'))
+OUTPUT_FORMATS = Counter('oemicroservices_output_format_total', 'Image and molecule output formats',
+                         ('endpoint', 'format'))
+CACHE_REQUESTS = Counter('oemicroservices_cache_requests_total', 'Cache lookups by cache and result',
+                         ('cache', 'result'))
+
+# Format labels: the molecule file extensions read by OEGetFileType and the image formats of OEDepict. Any other format
+# sent by a client is counted as other, so that clients cannot create an unbounded number of label sets.
+KNOWN_FORMATS = frozenset((
+    'can', 'cdx', 'cif', 'csv', 'ent', 'fasta', 'ism', 'isosmi', 'mdl', 'mf', 'mmcif', 'mmod', 'mol', 'mol2', 'mol2h',
+    'oeb', 'oez', 'pdb', 'sd', 'sdf', 'seq', 'skc', 'sln', 'smi', 'smiles', 'usm', 'xyz',
+    'png', 'svg', 'pdf', 'ps'))
+
+# All metrics in exposition order
+METRICS = (REQUEST_LATENCY, STAGE_LATENCY, MOLECULE_ATOMS, REQUESTS, ERRORS, INPUT_FORMATS, OUTPUT_FORMATS,
+           CACHE_REQUESTS)
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                    Measurements                                                      #
+#                           Stage timings collected on the thread or process that does the work                        #
+#                                                                                                                      #
+########################################################################################################################
+
+# The measurements being collected on the current thread
+_local = threading.local()
+
+
+class Measurements(object):
+    """
+    Stage timings and molecule sizes collected while processing a request. Picklable, so that measurements taken in
+    a worker process can be returned with the result.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.atoms = []
+        # Raw cProfile statistics, when the request is profiled
+        self.profiles = []
+
+    def extend(self, other):
+        """
+        Add the measurements collected elsewhere (e.g. in a worker)
+        :param other: The other measurements
+        :type other: Measurements
+        """
+        self.stages.extend(other.stages)
+        self.atoms.extend(other.atoms)
+        self.profiles.extend(other.profiles)
+
+    def stage_totals(self):
+        """
+        Get the total time spent in each stage, in the order the stages first ran
+        :return: The stage names and total durations in seconds
+        :rtype: OrderedDict
+        """
+        totals = OrderedDict()
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a processing stage. Does nothing unless measurements are being collected on this thread.
+    :param name: The stage name
+    :type name: str
+    """
+    start = default_timer()
+    try:
+        yield
+    finally:
+        measurements = getattr(_local, 'measurements', None)
+        if measurements is not None:
+            measurements.stages.append((name, default_timer() - start))
+
+
+def start_measurements():
+    """
+    Start collecting measurements for the current Flask request on this thread, if not already started
+    :return: The measurements of the current request
+    :rtype: Measurements
+    """
+    measurements = getattr(g, 'measurements', None)
+    if measurements is None:
+        g.request_start = default_timer()
+        measurements = g.measurements = Measurements()
+    _local.measurements = measurements
+    return measurements
+
+
+def stop_measurements():
+    """
+    Stop collecting measurements on this thread
+    """
+    _local.measurements = None
+
+
+def format_server_timing(measurements, total=None):
+    """
+    Format stage timings as a Server-Timing header value
+    :param measurements: The request measurements
+    :type measurements: Measurements
+    :param total: The total request duration in seconds
+    :type total: float
+    :return: The header value, e.g. read;dur=1.2, render;dur=8.5, total;dur=10.4 (durations in milliseconds)
+    :rtype: str
+    """
+    timings = list(measurements.stage_totals().items())
+    if total is not None:
+        timings.append(('total', total))
+    return ', '.join('{0};dur={1:.3f}'.format(name, seconds * 1000.0) for name, seconds in timings)
+
+
+def record_atoms(count):
+    """
+    Record the number of atoms in a molecule that was read
+    :param count: The number of atoms
+    :type count: int
+    """
+    measurements = getattr(_local, 'measurements', None)
+    if measurements is not None:
+        measurements.atoms.append(count)
+
+
+def call_instrumented(func, args):
+    """
+    Call a function while collecting its measurements. Defined at module level so that it can be sent to a worker
+    process.
+    :param func: The function to call
+    :param args: The function arguments
+    :type args: tuple
+    :return: The function return value and its measurements
+    :rtype: tuple
+    """
+    previous = getattr(_local, 'measurements', None)
+    _local.measurements = Measurements()
+    try:
+        return func(*args), _local.measurements
+    finally:
+        _local.measurements = previous
+
+
+def add_measurements(measurements):
+    """
+    Add measurements collected by a worker to those of the current request
+    :param measurements: The worker measurements
+    :type measurements: Measurements
+    """
+    current = getattr(_local, 'measurements', None)
+    if current is not None:
+        current.extend(measurements)
+
+
+def format_label(fmt):
+    """
+    Get the metric label of a format given by a client
+    :param fmt: The molecule or image format
+    :type fmt: str
+    :return: The lower case format, or other if the format is not known
+    :rtype: str
+    """
+    label = str(fmt).lower().lstrip('.')
+    if label.endswith('.gz'):
+        label = label[:-3]
+    return label if label in KNOWN_FORMATS else 'other'
+
+
+def record_formats(input_format=None, output_format=None):
+    """
+    Count the input and output formats of the current request
+    :param input_format: The molecule input format
+    :type input_format: str
+    :param output_format: The image or molecule output format
+    :type output_format: str
+    """
+    if input_format:
+        INPUT_FORMATS.inc((request.endpoint, format_label(input_format)))
+    if output_format:
+        OUTPUT_FORMATS.inc((request.endpoint, format_label(output_format)))
+
+
+def record_error(reason):
+    """
+    Count a failed request
+    :param reason: The failure reason (e.g. overloaded, deadline, error)
+    :type reason: str
+    """
+    ERRORS.inc((request.endpoint, reason))
+
+
+def record_cache(cache, hit):
+    """
+    Count a cache lookup
+    :param cache: The cache name
+    :type cache: str
+    :param hit: If the lookup was a hit
+    :type hit: bool
+    """
+    CACHE_REQUESTS.inc((cache, 'hit' if hit else 'miss'))
+
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format
+    :return: The exposition
+    :rtype: str
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  RequestMetrics                                                      #
+#                                  Flask hooks that measure every request and serve /metrics                           #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class RequestMetrics(object):
+    """
+    Request metrics for a Flask application
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.server_timing = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the request hooks and the metrics endpoint
+        :param app: The Flask application
+        :type app: Flask
+        """
+        self.server_timing = app.config.get('SERVER_TIMING', self.server_timing)
+        app.extensions['metrics'] = self
+        app.before_request(self.__before_request)
+        app.after_request(self.__after_request)
+        app.teardown_request(self.__teardown_request)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.__metrics)
+
+    # noinspection PyMethodMayBeStatic
+    def __metrics(self):
+        """
+        Serve the metrics in the Prometheus text format
+        """
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    # noinspection PyMethodMayBeStatic
+    def __before_request(self):
+        """
+        Start collecting measurements for the request
+        """
+        start_measurements()
+
+    def __after_request(self, response):
+        """
+        Record the request measurements and add the Server-Timing header
+        """
+        start = getattr(g, 'request_start', None)
+        measurements = getattr(g, 'measurements', None)
+        if start is None or request.endpoint in (None, 'metrics'):
+            return response
+        endpoint = request.endpoint
+        total = default_timer() - start
+        if self.server_timing:
+            response.headers['Server-Timing'] = format_server_timing(measurements, total)
+        REQUEST_LATENCY.observe((endpoint,), total)
+        REQUESTS.inc((endpoint, str(response.status_code)))
+        for name, seconds in measurements.stages:
+            STAGE_LATENCY.observe((endpoint, name), seconds)
+        for atoms in measurements.atoms:
+            MOLECULE_ATOMS.observe((endpoint,), atoms)
+        return response
+
+    # noinspection PyMethodMayBeStatic,PyUnusedLocal
+    def __teardown_request(self, exc=None):
+        """
+        Stop collecting measurements on this thread
+        """
+        stop_measurements()
@@ -0,0 +1,199 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from openeye.oechem import *
+from openeye.oedepict import *
+
+from oemicroservices.common.cache import SCAFFOLD_CACHE
+from oemicroservices.common.metrics import stage
+from oemicroservices.library import get_image_mime_type
+from oemicroservices.common.util import (
+    write_image,
+    get_color_from_rgba,
+    get_title_location,
+    get_highlight_style)
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  Molecule Depiction                                                  #
+#                                         Render small molecules with OEDepict                                         #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def get_scaffold(scaffold):
+    """
+    Get the substructure search for a reference scaffold laid out in 2D. Scaffold SMILES are laid out once per process
+    and their searches are cached. Scaffolds are SMILES only: SMARTS patterns have no layout to align to.
+    :param scaffold: The scaffold SMILES, or a scaffold molecule (whose 2D coordinates are kept if it has them)
+    :type scaffold: str or OEMolBase
+    :return: The substructure search, whose pattern carries the coordinates of the scaffold layout
+    :rtype: OESubSearch
+    """
+    if isinstance(scaffold, OEMolBase):
+        refmol = OEGraphMol(scaffold)
+        OEPrepareDepiction(refmol, False, True)
+        return OESubSearch(refmol, OEExprOpts_DefaultAtoms, OEExprOpts_DefaultBonds)
+    subs = SCAFFOLD_CACHE.get(scaffold)
+    if subs is None:
+        refmol = OEGraphMol()
+        if not OESmilesToMol(refmol, str(scaffold)):
+            raise Exception("Invalid scaffold SMILES (SMARTS is not supported): {0}".format(scaffold))
+        OEPrepareDepiction(refmol, True, True)
+        subs = OESubSearch(refmol, OEExprOpts_DefaultAtoms, OEExprOpts_DefaultBonds)
+        SCAFFOLD_CACHE.put(scaffold, subs)
+    return subs
+
+
+def prepare_depiction(mol, scaffold=None):
+    """
+    Prepare a molecule for depiction, optionally aligned to a reference scaffold so that the members of a series are
+    laid out consistently. Molecules that do not contain the scaffold keep their own layout.
+    :param mol: The molecule (the depiction coordinates are changed)
+    :type mol: OEMolBase
+    :param scaffold: The scaffold SMILES or molecule (see get_scaffold)
+    :type scaffold: str or OEMolBase
+    """
+    with stage('prepare'):
+        # Molecules that contain the scaffold are laid out only once, by the aligned depiction
+        if not scaffold or not OEPrepareAlignedDepiction(mol, get_scaffold(scaffold)).IsValid():
+            OEPrepareDepiction(mol, False, True)
+
+
+def _render_molecule(mol, args):
+    """
+    Lay out a small molecule and render it to an image, which can then be written in any image format
+    :param mol: The molecule (the title and depiction coordinates are changed)
+    :type mol: OEMolBase
+    :param args: The depiction options (see oemicroservices.library.DEPICT_OPTIONS)
+    :type args: dict
+    :return: The rendered image
+    :rtype: OEImage
+    """
+    # *********************************************************************
+    # *                      Parse Parameters                             *
+    # *********************************************************************
+    width = args['width']                                          # Image width
+    height = args['height']                                        # Image height
+    title = args['title']                                          # Image title
+    use_molecule_title = bool(args['keeptitle'])                   # Use the molecule title in the molecule file
+    bond_scaling = bool(args['scalebonds'])                        # Bond width scales with size
+    highlight_style = get_highlight_style(args['highlightstyle'])  # The substructure highlights style
+    title_location = get_title_location(args['titleloc'])          # The title location (if we have a title)
+    highlight = args['highlight']                                  # SMARTS substructures to highlight
+    background = get_color_from_rgba(args['background'])           # Background color
+    color = get_color_from_rgba(args['highlightcolor'])            # Highlight color
+
+    # Defaults for invalid inputs
+    if not highlight_style:
+        highlight_style = OEHighlightStyle_Default
+
+    if not title_location:
+        title_location = OETitleLocation_Top
+    # *********************************************************************
+    # *                      Create the Image                             *
+    # *********************************************************************
+    image = OEImage(width, height)
+    # Prepare the depiction
+    prepare_depiction(mol, args['scaffold'])
+    opts = OE2DMolDisplayOptions(image.GetWidth(), image.GetHeight(), OEScale_AutoScale)
+
+    # If we provided a title
+    if title:
+        mol.SetTitle(title)
+        opts.SetTitleLocation(title_location)
+    # Else hide if we didn't provide a title and we're *not* using the molecule title
+    elif not use_molecule_title:
+        mol.SetTitle("")
+        opts.SetTitleLocation(OETitleLocation_Hidden)
+
+    # Other configuration options
+    opts.SetBondWidthScaling(bond_scaling)
+    opts.SetBackgroundColor(background)
+
+    with stage('render'):
+        # Prepare the display
+        disp = OE2DMolDisplay(mol, opts)
+
+        # Do any substructure matching
+        if highlight:
+            for querySmiles in highlight:
+                subs = OESubSearch(querySmiles)
+                for match in subs.Match(mol, True):
+                    OEAddHighlighting(disp, color, highlight_style, match)
+
+        # Render the image
+        OERenderMolecule(image, disp)
+    return image
+
+
+def render_molecule_image(mol, args, filename=None):
+    """
+    Render a small molecule image
+    :param mol: The molecule (the title and depiction coordinates are changed)
+    :type mol: OEMolBase
+    :param args: The depiction options (see oemicroservices.library.DEPICT_OPTIONS)
+    :type args: dict
+    :param filename: The file to write the image to, instead of returning it
+    :type filename: str
+    :return: The rendered image (None if written to a file) and its MIME type
+    :rtype: tuple
+    """
+    image_format = args['format']                                  # The output image format
+    image_mimetype = get_image_mime_type(image_format)             # MIME type corresponding to the image format
+
+    # Make sure we got valid inputs
+    if not image_mimetype:
+        raise Exception("Invalid MIME type")
+
+    image = _render_molecule(mol, args)
+
+    # Return the image
+    with stage('write'):
+        img_content = write_image(image, image_format, filename)
+    return img_content, image_mimetype
+
+
+def render_molecule_images(mol, args, image_formats):
+    """
+    Render a small molecule in several image formats. The molecule is laid out and rendered once, and the same image
+    is then written in each format.
+    :param mol: The molecule (the title and depiction coordinates are changed)
+    :type mol: OEMolBase
+    :param args: The depiction options (see oemicroservices.library.DEPICT_OPTIONS, the format is ignored)
+    :type args: dict
+    :param image_formats: The image formats
+    :type image_formats: list
+    :return: The rendered images by image format
+    :rtype: dict
+    """
+    # Make sure we got valid inputs
+    for image_format in image_formats:
+        if not get_image_mime_type(image_format):
+            raise Exception("Invalid image format: {0}".format(image_format))
+
+    image = _render_molecule(mol, args)
+
+    images = {}
+    with stage('write'):
+        for image_format in image_formats:
+            images[image_format] = write_image(image, image_format)
+    return images
@@ -0,0 +1,222 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from collections import OrderedDict
+
+from openeye.oechem import *
+
+from oemicroservices.common.functor import OEHasAtomIdxIn
+
+########################################################################################################################
+#                                                                                                                      #
+#                                             CONSTANT DICTIONARIES                                                    #
+#                                                                                                                      #
+# The bonds of the standard amino acids as (atom name, atom name, bond order), with aromatic rings in a Kekule form.   #
+# Add residues here to bond them from templates instead of geometry.                                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+# Bonds of every amino acid
+__backbone = (('N', 'CA', 1), ('CA', 'C', 1), ('C', 'O', 2), ('C', 'OXT', 1))
+
+# Side chain bonds of the standard amino acids
+__side_chains = {
+    'ALA': (('CA', 'CB', 1),),
+    'ARG': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD', 1), ('CD', 'NE', 1), ('NE', 'CZ', 1), ('CZ', 'NH1', 2),
+            ('CZ', 'NH2', 1)),
+    'ASN': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'OD1', 2), ('CG', 'ND2', 1)),
+    'ASP': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'OD1', 2), ('CG', 'OD2', 1)),
+    'CYS': (('CA', 'CB', 1), ('CB', 'SG', 1)),
+    'GLN': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD', 1), ('CD', 'OE1', 2), ('CD', 'NE2', 1)),
+    'GLU': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD', 1), ('CD', 'OE1', 2), ('CD', 'OE2', 1)),
+    'GLY': (),
+    'HIS': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'ND1', 1), ('ND1', 'CE1', 1), ('CE1', 'NE2', 2),
+            ('NE2', 'CD2', 1), ('CD2', 'CG', 2)),
+    'ILE': (('CA', 'CB', 1), ('CB', 'CG1', 1), ('CG1', 'CD1', 1), ('CB', 'CG2', 1)),
+    'LEU': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD1', 1), ('CG', 'CD2', 1)),
+    'LYS': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD', 1), ('CD', 'CE', 1), ('CE', 'NZ', 1)),
+    'MET': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'SD', 1), ('SD', 'CE', 1)),
+    'MSE': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'SE', 1), ('SE', 'CE', 1)),
+    'PHE': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD1', 2), ('CD1', 'CE1', 1), ('CE1', 'CZ', 2), ('CZ', 'CE2', 1),
+            ('CE2', 'CD2', 2), ('CD2', 'CG', 1)),
+    'PRO': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD', 1), ('CD', 'N', 1)),
+    'SER': (('CA', 'CB', 1), ('CB', 'OG', 1)),
+    'THR': (('CA', 'CB', 1), ('CB', 'OG1', 1), ('CB', 'CG2', 1)),
+    'TRP': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD1', 2), ('CD1', 'NE1', 1), ('NE1', 'CE2', 1), ('CE2', 'CD2', 2),
+            ('CD2', 'CG', 1), ('CE2', 'CZ2', 1), ('CZ2', 'CH2', 2), ('CH2', 'CZ3', 1), ('CZ3', 'CE3', 2),
+            ('CE3', 'CD2', 1)),
+    'TYR': (('CA', 'CB', 1), ('CB', 'CG', 1), ('CG', 'CD1', 2), ('CD1', 'CE1', 1), ('CE1', 'CZ', 2), ('CZ', 'CE2', 1),
+            ('CE2', 'CD2', 2), ('CD2', 'CG', 1), ('CZ', 'OH', 1)),
+    'VAL': (('CA', 'CB', 1), ('CB', 'CG1', 1), ('CB', 'CG2', 1))
+}
+
+# Residue names of protonation states and other variants of the standard amino acids
+__aliases = {
+    'ASH': 'ASP', 'GLH': 'GLU', 'LYN': 'LYS', 'CYX': 'CYS', 'CYM': 'CYS',
+    'HID': 'HIS', 'HIE': 'HIS', 'HIP': 'HIS', 'HSD': 'HIS', 'HSE': 'HIS', 'HSP': 'HIS'
+}
+
+# The template bonds of each residue name
+RESIDUE_TEMPLATES = dict((name, __backbone + bonds) for name, bonds in __side_chains.items())
+RESIDUE_TEMPLATES.update((alias, RESIDUE_TEMPLATES[name]) for alias, name in __aliases.items())
+
+# Longest peptide, disulfide and hydrogen bonds in angstroms
+PEPTIDE_BOND_LENGTH = 2.0
+DISULFIDE_BOND_LENGTH = 2.5
+HYDROGEN_BOND_LENGTH = 1.3
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Perception                                                         #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def perceive_geometry(mol):
+    """
+    Perceive connectivity, bond orders, hydrogens and formal charges from the atom coordinates
+    :param mol: The molecule, which is changed
+    :type mol: OEMolBase
+    """
+    OEDetermineConnectivity(mol)
+    OEFindRingAtomsAndBonds(mol)
+    OEPerceiveBondOrders(mol)
+    OEAssignImplicitHydrogens(mol)
+    OEAssignFormalCharges(mol)
+
+
+def __distance2(mol, a, b):
+    """
+    Get the squared distance between two atoms
+    """
+    ax, ay, az = mol.GetCoords(a)
+    bx, by, bz = mol.GetCoords(b)
+    return (ax - bx) ** 2 + (ay - by) ** 2 + (az - bz) ** 2
+
+
+def __bond(mol, a, b, order):
+    """
+    Bond two atoms, unless they are already bonded
+    """
+    if a is not None and b is not None and a.GetBond(b) is None:
+        mol.NewBond(a, b, order)
+
+
+def __residues(mol):
+    """
+    Group the atoms of a molecule by residue, in file order
+    :return: The residue name, chain ID and atoms by name of each residue
+    :rtype: list
+    """
+    residues = OrderedDict()
+    for atom in mol.GetAtoms():
+        res = OEAtomGetResidue(atom)
+        key = (res.GetChainID(), res.GetResidueNumber(), res.GetInsertCode(), res.GetName().strip().upper())
+        residues.setdefault(key, []).append(atom)
+    return [(key[3], key[0], atoms) for key, atoms in residues.items()]
+
+
+def perceive_residue_templates(mol):
+    """
+    Bond the standard amino acids of a protein from residue templates, which is much faster than perceiving the bonds
+    of the whole protein from its geometry. Peptide bonds, disulfides and hydrogens are bonded by distance. The other
+    residues (waters, ions, cofactors and ligands) are perceived from their geometry.
+    :param mol: The protein
+    :type mol: OEMolBase
+    :return: The perceived protein (the residues of the templates first)
+    :rtype: OEGraphMol
+    """
+    templated = set(atom.GetIdx() for name, chain, atoms in __residues(mol) if name in RESIDUE_TEMPLATES
+                    for atom in atoms)
+    if not templated:
+        result = OEGraphMol(mol)
+        perceive_geometry(result)
+        return result
+    others = set(atom.GetIdx() for atom in mol.GetAtoms()) - templated
+
+    # Throw away any bonds read from the file, like the geometric perception would
+    protein = OEGraphMol()
+    OESubsetMol(protein, mol, OEHasAtomIdxIn(templated), False, False)
+    for bond in list(protein.GetBonds()):
+        protein.DeleteBond(bond)
+
+    previous = None
+    sulfurs = []
+    for name, chain, atoms in __residues(protein):
+        by_name = {}
+        hydrogens = []
+        for atom in atoms:
+            if atom.GetAtomicNum() == OEElemNo_H:
+                hydrogens.append(atom)
+            else:
+                by_name[atom.GetName().strip().upper()] = atom
+        for a, b, order in RESIDUE_TEMPLATES[name]:
+            __bond(protein, by_name.get(a), by_name.get(b), order)
+        # Hydrogens are bonded to the nearest heavy atom of their residue
+        for hydrogen in hydrogens:
+            distances = [(__distance2(protein, hydrogen, heavy), heavy) for heavy in by_name.values()]
+            if distances:
+                distance, nearest = min(distances, key=lambda pair: pair[0])
+                if distance <= HYDROGEN_BOND_LENGTH ** 2:
+                    __bond(protein, hydrogen, nearest, 1)
+        # Peptide bond to the previous residue of the chain
+        if previous is not None and previous[0] == chain and 'C' in previous[1] and 'N' in by_name:
+            if __distance2(protein, previous[1]['C'], by_name['N']) <= PEPTIDE_BOND_LENGTH ** 2:
+                __bond(protein, previous[1]['C'], by_name['N'], 1)
+        previous = (chain, by_name)
+        if 'SG' in by_name:
+            sulfurs.append(by_name['SG'])
+
+    # Disulfides
+    for i, a in enumerate(sulfurs):
+        for b in sulfurs[i + 1:]:
+            if __distance2(protein, a, b) <= DISULFIDE_BOND_LENGTH ** 2:
+                __bond(protein, a, b, 1)
+
+    OEFindRingAtomsAndBonds(protein)
+    OEAssignAromaticFlags(protein)
+    OEAssignImplicitHydrogens(protein)
+    OEAssignFormalCharges(protein)
+
+    if others:
+        rest = OEGraphMol()
+        OESubsetMol(rest, mol, OEHasAtomIdxIn(others), False, False)
+        perceive_geometry(rest)
+        OEAddMols(protein, rest)
+    protein.SetTitle(mol.GetTitle())
+    return protein
+
+
+def reparse_molecule(mol, mode):
+    """
+    Reparse connectivity, bond orders, hydrogens and formal charges
+    :param mol: The molecule, which may be changed
+    :type mol: OEMolBase
+    :param mode: The reparse mode (see oemicroservices.library.reparse_mode), or False to leave the molecule as it is
+    :type mode: str
+    :return: The reparsed molecule
+    :rtype: OEMolBase
+    """
+    if mode == 'template':
+        return perceive_residue_templates(mol)
+    if mode:
+        perceive_geometry(mol)
+    return mol
@@ -0,0 +1,390 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from functools import partial
+
+from flask import Response, current_app, request
+
+from oemicroservices.common.admission import ServiceOverloaded, get_request_cost
+from oemicroservices.common.metrics import add_measurements, call_instrumented, record_error
+from oemicroservices.common.profiling import call_profiled, is_profiling
+
+if sys.version_info < (3,):
+    import Queue as queue
+else:
+    import queue
+
+try:
+    import resource
+except ImportError:
+    # Memory limits are not supported on this platform
+    resource = None
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Worker processes                                                     #
+#                                 Supervised subprocesses that can be killed at a deadline                             #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when work does not finish before its deadline
+    """
+    pass
+
+
+def deadline_response(ex):
+    """
+    Generate the response for a request that did not finish before its deadline
+    :param ex: The reason the request timed out
+    :type ex: DeadlineExceeded
+    :return: A 504 JSON error response, so that clients can tell a server timeout from bad input
+    :rtype: Response
+    """
+    return Response(json.dumps({"error": "Deadline exceeded: {0}".format(str(ex))}), status=504,
+                    mimetype='application/json')
+
+
+def _process_main(conn, memory_limit):
+    """
+    Main loop of a worker process: receive work from the pipe, run it and send back the result
+    :param conn: The child end of the pipe to the supervising thread
+    :param memory_limit: The address space limit in MB (None for no limit)
+    :type memory_limit: int
+    """
+    # Do not inherit the signal handlers of the web server
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit and resource is not None:
+        limit = int(memory_limit) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = (True, func(*args))
+        except Exception as ex:
+            result = (False, ex)
+        try:
+            conn.send(result)
+        except Exception as ex:
+            # The result or exception could not be pickled
+            conn.send((False, Exception(str(ex))))
+
+
+class _ProcessWorker(object):
+    """
+    A worker subprocess owned by a single pool thread, replaced when it is killed or dies
+    """
+
+    def __init__(self, memory_limit=None):
+        """
+        Default constructor
+        :param memory_limit: The address space limit of the process in MB (None for no limit)
+        :type memory_limit: int
+        """
+        self.memory_limit = memory_limit
+        self.process = None
+        self.conn = None
+
+    def __start(self):
+        """
+        Start the worker process
+        """
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_process_main, args=(child, self.memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        """
+        Kill the worker process (SIGKILL because the toolkits cannot be interrupted)
+        """
+        if self.process is not None:
+            try:
+                os.kill(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            self.process.join()
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def call(self, func, args, timeout=None):
+        """
+        Run a function in the worker process
+        :param func: The function to run (must be picklable, i.e. defined at module level)
+        :param args: The function arguments (must be picklable)
+        :type args: tuple
+        :param timeout: Time in seconds after which the process is killed (None for no timeout)
+        :type timeout: float
+        :return: The function return value (exceptions raised by the function are re-raised)
+        """
+        if self.process is None or not self.process.is_alive():
+            self.kill()
+            self.__start()
+        self.conn.send((func, args))
+        if not self.conn.poll(timeout):
+            self.kill()
+            raise DeadlineExceeded("Request exceeded its deadline")
+        try:
+            ok, value = self.conn.recv()
+        except EOFError:
+            # The process died, most likely from running out of memory
+            self.kill()
+            raise Exception("Worker process exited unexpectedly")
+        if not ok:
+            raise value
+        return value
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                    WorkerPool                                                        #
+#                                Fixed-size pool of workers with a bounded queue                                       #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class _Task(object):
+    """
+    A unit of work submitted to a WorkerPool
+    """
+
+    def __init__(self, func, args, deadline):
+        self.func = func
+        self.args = args
+        self.deadline = deadline
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self, worker=None):
+        """
+        Run the task, in the worker process if one is given
+        :param worker: The worker process
+        :type worker: _ProcessWorker
+        """
+        try:
+            # Skip work that waited in the queue past its deadline
+            timeout = None
+            if self.deadline is not None:
+                timeout = self.deadline - time.time()
+                if timeout <= 0:
+                    raise DeadlineExceeded("Request exceeded its deadline")
+            if worker is None:
+                self.result = self.func(*self.args)
+            else:
+                self.result = worker.call(self.func, self.args, timeout)
+        except Exception as ex:
+            self.error = ex
+        self.done.set()
+
+
+class WorkerPool(object):
+    """
+    Execute work on a fixed number of workers, rejecting work when too much is outstanding. Each worker is a thread
+    that, in process mode, supervises its own subprocess so that work can be killed at its deadline.
+    """
+
+    def __init__(self, name, size, queue=0, processes=False, memory_limit=None):
+        """
+        Default constructor
+        :param name: The pool name
+        :type name: str
+        :param size: The number of workers
+        :type size: int
+        :param queue: The maximum number of tasks waiting for a worker
+        :type queue: int
+        :param processes: Run work in supervised subprocesses that are killed at the deadline
+        :type processes: bool
+        :param memory_limit: The address space limit of each worker process in MB (process mode only)
+        :type memory_limit: int
+        """
+        self.name = name
+        self.size = max(1, int(size))
+        self.queue = max(0, int(queue))
+        self.processes = bool(processes)
+        self.memory_limit = memory_limit
+        self.outstanding = 0
+        self.__tasks = None
+        self.__lock = threading.Lock()
+
+    def __start(self):
+        """
+        Start the worker threads. This is deferred until the first task so that pools survive a pre-forking server.
+        """
+        self.__tasks = queue.Queue()
+        for i in range(self.size):
+            worker = threading.Thread(target=self.__work, name="{0}-worker-{1}".format(self.name, i))
+            worker.daemon = True
+            worker.start()
+
+    def __work(self):
+        """
+        Worker thread main loop
+        """
+        worker = _ProcessWorker(self.memory_limit) if self.processes else None
+        while True:
+            task = self.__tasks.get()
+            try:
+                task.run(worker)
+            finally:
+                with self.__lock:
+                    self.outstanding -= 1
+
+    def run(self, func, args=(), deadline=None):
+        """
+        Run a function on the pool and wait for its result
+        :param func: The function to run (in process mode it must be picklable, i.e. defined at module level)
+        :param args: The function arguments
+        :type args: tuple
+        :param deadline: Maximum time in seconds to wait for the result, including time spent in the queue. In process
+                         mode the work is killed at the deadline, in thread mode it finishes in the background.
+        :type deadline: float
+        :return: The function return value (exceptions raised by the function are re-raised)
+        """
+        with self.__lock:
+            if self.outstanding >= self.size + self.queue:
+                raise ServiceOverloaded("Too many queued requests in the {0} pool".format(self.name))
+            if self.__tasks is None:
+                self.__start()
+            self.outstanding += 1
+        task = _Task(func, args, None if deadline is None else time.time() + deadline)
+        self.__tasks.put(task)
+        # Work still queued at the deadline is skipped, work still running is killed by its process worker
+        if not task.done.wait(deadline):
+            raise DeadlineExceeded("Request exceeded its deadline of {0} seconds".format(deadline))
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   WorkerPools                                                        #
+#                               Route requests to the light or heavy pool before parsing                               #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class WorkerPools(object):
+    """
+    Light and heavy worker pools for a Flask application
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.pools = {}
+        self.heavy_endpoints = ()
+        self.heavy_atoms = 1000
+        self.heavy_reparse_atoms = 200
+        self.deadlines = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure the pools from the application configuration
+        :param app: The Flask application
+        :type app: Flask
+        """
+        for name, limit in app.config.get('WORKER_POOL_LIMITS', {}).items():
+            self.pools[name] = WorkerPool(name, **limit)
+        self.heavy_endpoints = app.config.get('WORKER_POOL_HEAVY_ENDPOINTS', self.heavy_endpoints)
+        self.heavy_atoms = app.config.get('WORKER_POOL_HEAVY_ATOMS', self.heavy_atoms)
+        self.heavy_reparse_atoms = app.config.get('WORKER_POOL_HEAVY_REPARSE_ATOMS', self.heavy_reparse_atoms)
+        self.deadlines = app.config.get('WORKER_DEADLINES', self.deadlines)
+        app.extensions['pools'] = self
+
+    def route(self, endpoint, cost, reparse=False):
+        """
+        Choose the pool for a request from cheap signals, before any molecule is parsed
+        :param endpoint: The Flask endpoint name
+        :type endpoint: str
+        :param cost: The estimated request cost
+        :type cost: RequestCost
+        :param reparse: If the request will reparse the molecule
+        :type reparse: bool
+        :return: The pool name (light or heavy)
+        :rtype: str
+        """
+        if endpoint in self.heavy_endpoints:
+            return 'heavy'
+        if cost.atoms > (self.heavy_reparse_atoms if reparse else self.heavy_atoms):
+            return 'heavy'
+        return 'light'
+
+
+def run_in_pool(func, args=(), reparse=False, kwargs=None):
+    """
+    Run a function in the worker pool selected for the current Flask request, subject to the endpoint deadline. If
+    worker pools are disabled, the function is run on the request thread.
+    :param func: The function to run (must be defined at module level, with picklable arguments and return value)
+    :param args: The function arguments
+    :type args: tuple
+    :param reparse: If the request will reparse the molecule (routes smaller requests to the heavy pool)
+    :type reparse: bool
+    :param kwargs: The function keyword arguments
+    :type kwargs: dict
+    :return: The function return value
+    """
+    if kwargs:
+        # A partial of a module level function can be sent to a worker process
+        func = partial(func, **kwargs)
+    try:
+        pools = current_app.extensions.get('pools')
+        if pools is None:
+            result, measurements = call_instrumented(func, args)
+        else:
+            # Profiled requests are also run under cProfile in the worker
+            instrumented = call_profiled if is_profiling() else call_instrumented
+            name = pools.route(request.endpoint, get_request_cost(), reparse)
+            result, measurements = pools.pools[name].run(
+                instrumented, (func, args), pools.deadlines.get(request.endpoint))
+    except ServiceOverloaded:
+        record_error('overloaded')
+        raise
+    except DeadlineExceeded:
+        record_error('deadline')
+        raise
+    except Exception:
+        record_error('error')
+        raise
+    # Stage timings measured by the worker belong to this request
+    add_measurements(measurements)
+    return result
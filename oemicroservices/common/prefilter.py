@@ -0,0 +1,130 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from collections import OrderedDict
+
+from oemicroservices.common.receptors import SpatialIndex
+
+# Atom records of PDB files
+ATOM_RECORDS = ('ATOM  ', 'HETATM')
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Complex Pre-filter                                                   #
+#                              Cut the ligand environment out of the PDB text of a complex                             #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def atom_coordinates(line):
+    """
+    Get the coordinates of a PDB atom record
+    :param line: The ATOM or HETATM record
+    :type line: str
+    :return: The x, y and z coordinates
+    :rtype: tuple
+    """
+    return float(line[30:38]), float(line[38:46]), float(line[46:54])
+
+
+def _is_ligand(line, chain, resi, resn):
+    """
+    Check whether a PDB atom record is a ligand atom, like oemicroservices.common.functor.generate_ligand_functor. An
+    empty chain ID selects any chain, like None.
+    """
+    if chain and line[21:22] != chain[0]:
+        return False
+    if resi is not None and int(line[22:26]) != int(resi):
+        return False
+    if resn is not None and line[17:20].strip() != resn:
+        return False
+    return True
+
+
+def _serials(line):
+    """
+    Get the atom serial numbers of a PDB CONECT record (None if the record is malformed)
+    """
+    try:
+        return [int(line[i:i + 5]) for i in range(6, 31, 5) if line[i:i + 5].strip()]
+    except ValueError:
+        return None
+
+
+def prefilter_complex(pdb, radius, chain=None, resi=None, resn=None):
+    """
+    Cut a ligand and the residues with an atom within a distance of it out of the text of a PDB complex, so that the
+    toolkits only parse the part of the complex that is depicted. Only the first model is kept. Works on the text so
+    that it does not need the toolkits.
+    :param pdb: The PDB file string of the complex
+    :type pdb: str
+    :param radius: The distance in angstroms
+    :type radius: float
+    :param chain: The chain ID of the ligand
+    :type chain: str
+    :param resi: The residue number of the ligand
+    :type resi: int
+    :param resn: The residue name of the ligand
+    :type resn: str
+    :return: The PDB file string of the ligand and its environment, or None if the text cannot be filtered (e.g. no
+             atom matches the ligand selection), in which case the whole complex should be parsed
+    :rtype: str
+    """
+    ligand = []
+    residues = OrderedDict()
+    connections = []
+    try:
+        for line in pdb.splitlines():
+            if line.startswith(ATOM_RECORDS):
+                if _is_ligand(line, chain, resi, resn):
+                    ligand.append(line)
+                else:
+                    residues.setdefault(line[17:27], []).append(line)
+            elif line.startswith('CONECT'):
+                connections.append(line)
+            elif line.startswith('ENDMDL'):
+                break
+        if not ligand or not residues:
+            return None
+        # Index the atoms of the other residues, and look up the ligand atoms in the index
+        keys = []
+        coords = []
+        for key, lines in residues.items():
+            for line in lines:
+                keys.append(key)
+                coords.append(atom_coordinates(line))
+        near = set(keys[position] for position in
+                   SpatialIndex(coords).within([atom_coordinates(line) for line in ligand], radius))
+    except ValueError:
+        # Malformed records are left to the toolkits to report
+        return None
+    kept = [line for key, lines in residues.items() if key in near for line in lines] + ligand
+    # Keep the explicit bonds between the kept atoms
+    serials = set()
+    for line in kept:
+        serial = line[6:11].strip()
+        if serial.isdigit():
+            serials.add(int(serial))
+    for line in connections:
+        connected = _serials(line)
+        if connected and serials.issuperset(connected):
+            kept.append(line)
+    return '\n'.join(kept + ['END']) + '\n'
@@ -0,0 +1,187 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import cProfile
+import hmac
+import json
+import pstats
+
+from flask import Response, request, g
+
+from oemicroservices.common.metrics import call_instrumented, start_measurements, stop_measurements
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Profiling helpers                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class _RawStats(object):
+    """
+    Raw cProfile statistics received from a worker, in a form that pstats.Stats can load
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def call_profiled(func, args):
+    """
+    Call a function under cProfile while collecting its measurements. Defined at module level so that it can be sent
+    to a worker process.
+    :param func: The function to call
+    :param args: The function arguments
+    :type args: tuple
+    :return: The function return value and its measurements, including the raw profile statistics
+    :rtype: tuple
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result, measurements = call_instrumented(func, args)
+    finally:
+        profiler.disable()
+    profiler.create_stats()
+    measurements.profiles.append(profiler.stats)
+    return result, measurements
+
+
+def summarize_profile(stats, limit=25):
+    """
+    Summarize profile statistics as the functions with the most internal time
+    :param stats: The profile statistics
+    :type stats: pstats.Stats
+    :param limit: The maximum number of functions
+    :type limit: int
+    :return: The hot functions, hottest first
+    :rtype: list
+    """
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [
+        {
+            'function': pstats.func_std_string(func),
+            'calls': nc,
+            'primitive_calls': cc,
+            'tottime': tt,
+            'cumtime': ct
+        } for func, (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+def is_profiling():
+    """
+    Check if the current Flask request is being profiled
+    :return: True if the request is being profiled
+    :rtype: bool
+    """
+    return getattr(g, 'profiler', None) is not None
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 RequestProfiling                                                     #
+#                         Flask hooks that profile requests with profile=true for administrators                       #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class RequestProfiling(object):
+    """
+    Opt-in per-request profiling for a Flask application. A request with the profile=true query parameter and an
+    X-Profile-Token header matching PROFILE_TOKEN is run under cProfile, and the response is replaced by a JSON
+    summary of its stage timings and hottest functions. Work done while a response body streams, after the view has
+    returned, is not profiled.
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.token = None
+        self.limit = 25
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure from the application configuration and register the request hooks
+        :param app: The Flask application
+        :type app: Flask
+        """
+        self.token = app.config.get('PROFILE_TOKEN')
+        self.limit = app.config.get('PROFILE_FUNCTIONS', self.limit)
+        app.extensions['profiling'] = self
+        app.before_request(self.__before_request)
+        app.after_request(self.__after_request)
+
+    def __authorized(self):
+        """
+        Check the profiling token of the current request
+        :return: True if the request may be profiled
+        :rtype: bool
+        """
+        if not self.token:
+            return False
+        token = request.headers.get('X-Profile-Token', '')
+        return hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+
+    def __before_request(self):
+        """
+        Start profiling the request thread if profiling was requested
+        """
+        if request.args.get('profile', '').lower() not in ('1', 'true', 'yes'):
+            return None
+        if not self.__authorized():
+            return Response(json.dumps({"error": "Profiling is not allowed"}), status=403, mimetype='application/json')
+        start_measurements()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    def __after_request(self, response):
+        """
+        Replace the response with the profile summary
+        """
+        profiler = getattr(g, 'profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        g.profiler = None
+        measurements = start_measurements()
+        stop_measurements()
+        # Merge the request thread profile with the profiles of the workers
+        stats = pstats.Stats(profiler)
+        for worker_stats in measurements.profiles:
+            stats.add(_RawStats(worker_stats))
+        # The original response is never sent, so close it to run its cleanup (e.g. removing a streamed spool file)
+        response.close()
+        return Response(json.dumps({
+            'profile': {
+                'status': response.status_code,
+                'stages': measurements.stage_totals(),
+                'functions': summarize_profile(stats, self.limit)
+            }
+        }), status=200, mimetype='application/json')
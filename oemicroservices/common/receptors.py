@@ -0,0 +1,297 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import math
+import os
+import threading
+
+# Edge length in angstroms of the cells of the spatial index
+CELL_SIZE = 5.0
+
+# Receptor file extensions, with or without .gz
+RECEPTOR_EXTENSIONS = ('.oeb', '.pdb', '.ent', '.sdf', '.mol2', '.mmcif', '.cif')
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   SpatialIndex                                                       #
+#                                      Uniform grid of atom coordinates                                                #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class SpatialIndex(object):
+    """
+    Finds the points near other points by hashing them into a uniform grid of cubic cells, so that a lookup only visits
+    the cells within reach instead of every point
+    """
+
+    def __init__(self, coords, cell_size=CELL_SIZE):
+        """
+        Default constructor
+        :param coords: The (x, y, z) coordinates of the points
+        :type coords: list
+        :param cell_size: The edge length of the cells
+        :type cell_size: float
+        """
+        self.coords = list(coords)
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        for position, point in enumerate(self.coords):
+            self.cells.setdefault(self.__cell(point), []).append(position)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __cell(self, point):
+        """
+        Get the cell of a point
+        :param point: The (x, y, z) coordinates
+        :return: The cell
+        :rtype: tuple
+        """
+        return tuple(int(math.floor(value / self.cell_size)) for value in point[:3])
+
+    def within(self, points, radius):
+        """
+        Find the indexed points within a distance of any of the given points
+        :param points: The (x, y, z) coordinates of the query points
+        :param radius: The distance
+        :type radius: float
+        :return: The positions of the indexed points
+        :rtype: set
+        """
+        found = set()
+        squared = radius * radius
+        reach = int(math.ceil(radius / self.cell_size))
+        offsets = range(-reach, reach + 1)
+        for point in points:
+            x, y, z = point[:3]
+            cx, cy, cz = self.__cell(point)
+            for dx in offsets:
+                for dy in offsets:
+                    for dz in offsets:
+                        for position in self.cells.get((cx + dx, cy + dy, cz + dz), ()):
+                            if position in found:
+                                continue
+                            px, py, pz = self.coords[position][:3]
+                            if (px - x) ** 2 + (py - y) ** 2 + (pz - z) ** 2 <= squared:
+                                found.add(position)
+        return found
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                     Receptor                                                         #
+#                                     A parsed receptor with a spatial index                                           #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class Receptor(object):
+    """
+    A receptor of the receptor library. The molecule is parsed once, and the binding pocket around any ligand is cut
+    out of it by looking up the ligand atoms in the spatial index.
+    """
+
+    def __init__(self, name, mol):
+        """
+        Default constructor
+        :param name: The receptor name
+        :type name: str
+        :param mol: The receptor (kept, not copied)
+        :type mol: OEMolBase
+        """
+        from openeye.oechem import OEAtomGetResidue
+        self.name = name
+        self.mol = mol
+        indices = []
+        coords = []
+        # Atom indices of each residue, so that pockets are cut along residues
+        self.residues = {}
+        self.atom_residues = []
+        for atom in mol.GetAtoms():
+            res = OEAtomGetResidue(atom)
+            key = (res.GetChainID(), res.GetResidueNumber(), res.GetInsertCode(), res.GetName())
+            indices.append(atom.GetIdx())
+            coords.append(tuple(mol.GetCoords(atom)))
+            self.atom_residues.append(key)
+            self.residues.setdefault(key, []).append(atom.GetIdx())
+        self.indices = indices
+        self.index = SpatialIndex(coords)
+
+    def pocket(self, ligand, radius):
+        """
+        Cut out the residues with an atom within a distance of the ligand
+        :param ligand: The ligand, posed in the receptor
+        :type ligand: OEMolBase
+        :param radius: The distance in angstroms
+        :type radius: float
+        :return: The pocket
+        :rtype: OEGraphMol
+        """
+        from openeye.oechem import OEGraphMol, OESubsetMol
+        from oemicroservices.common.functor import OEHasAtomIdxIn
+        near = self.index.within([ligand.GetCoords(atom) for atom in ligand.GetAtoms()], radius)
+        if not near:
+            raise Exception("The ligand is not near receptor {0}".format(self.name))
+        atoms = set()
+        for key in set(self.atom_residues[position] for position in near):
+            atoms.update(self.residues[key])
+        pocket = OEGraphMol()
+        OESubsetMol(pocket, self.mol, OEHasAtomIdxIn(atoms), False, False)
+        pocket.SetTitle(self.mol.GetTitle())
+        return pocket
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   ReceptorStore                                                      #
+#                                         Receptors by name, read once per process                                     #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def receptor_name(filename):
+    """
+    Get the name of a receptor from its file name, without the file extensions
+    :param filename: The file name
+    :type filename: str
+    :return: The receptor name, or None if the file is not a receptor file
+    :rtype: str
+    """
+    name = os.path.basename(filename)
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    base, ext = os.path.splitext(name)
+    if ext.lower() not in RECEPTOR_EXTENSIONS or not base:
+        return None
+    return base
+
+
+class ReceptorStore(object):
+    """
+    The receptor library of a process
+    """
+
+    def __init__(self):
+        self.pocket_radius = 10.0
+        self.__receptors = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__receptors)
+
+    def add(self, name, mol):
+        """
+        Add a receptor, replacing any receptor with the same name
+        :param name: The receptor name
+        :type name: str
+        :param mol: The receptor (kept, not copied)
+        :type mol: OEMolBase
+        """
+        receptor = Receptor(name, mol)
+        with self.__lock:
+            self.__receptors[name] = receptor
+
+    def get(self, name):
+        """
+        Get a receptor
+        :param name: The receptor name
+        :type name: str
+        :return: The receptor, or None if there is no receptor with the name
+        :rtype: Receptor
+        """
+        return self.__receptors.get(name)
+
+    def names(self):
+        """
+        Get the receptor names
+        :return: The receptor names, sorted
+        :rtype: list
+        """
+        return sorted(self.__receptors)
+
+    def load(self, directory):
+        """
+        Read the receptor files of a directory. Receptors are named after their files, without the file extensions.
+        :param directory: The directory
+        :type directory: str
+        :return: The names of the receptors that could not be read
+        :rtype: list
+        """
+        from openeye.oechem import OEGraphMol, OEReadMolecule, oemolistream
+        failed = []
+        for filename in sorted(os.listdir(directory)):
+            name = receptor_name(filename)
+            if name is None:
+                continue
+            mol = OEGraphMol()
+            ifs = oemolistream()
+            try:
+                ok = ifs.open(os.path.join(directory, filename)) and OEReadMolecule(ifs, mol) and mol.NumAtoms()
+            finally:
+                ifs.close()
+            if not ok:
+                failed.append(name)
+                continue
+            self.add(name, mol)
+        return failed
+
+
+# The receptor library of this process (worker processes forked from it share the receptors)
+RECEPTORS = ReceptorStore()
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  ReceptorLibrary                                                     #
+#                                  Load the receptor library of a Flask application                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class ReceptorLibrary(object):
+    """
+    Receptors read at startup, which interaction depictions can reference by name
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.store = RECEPTORS
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Load the receptors of the configured directory
+        :param app: The Flask application
+        :type app: Flask
+        """
+        self.store.pocket_radius = float(app.config.get('RECEPTOR_POCKET_RADIUS', self.store.pocket_radius))
+        # Loaded before the worker processes are forked, so that they share the parsed receptors
+        failed = self.store.load(app.config['RECEPTOR_DIR'])
+        for name in failed:
+            app.logger.warning("Could not read receptor {0}".format(name))
+        app.logger.info("Loaded {0} receptors from {1}".format(len(self.store), app.config['RECEPTOR_DIR']))
+        app.extensions['receptors'] = self
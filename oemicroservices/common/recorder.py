@@ -0,0 +1,267 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from flask import request
+
+from oemicroservices.common.cache import LRUCache
+
+if sys.version_info < (3,):
+    import Queue as queue
+else:
+    import queue
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  RequestRecorder                                                     #
+#                               Record requests to a compact log that can be replayed later                            #
+#                                                                                                                      #
+# The log is JSON lines with two kinds of record. Each distinct body is written once, the first time it is seen:       #
+#                                                                                                                      #
+#   {"type": "body", "hash": SHA-1 of the body, "data": the body, "encoding": "utf-8" or "base64"}                     #
+#                                                                                                                      #
+# And each request refers to its body by hash (null when bodies are not recorded):                                     #
+#                                                                                                                      #
+#   {"type": "request", "time": UNIX time, "method": "POST", "path": "/v1/...", "query": "format=svg",                 #
+#    "content_type": "application/json", "accept": "application/msgpack", "accept_encoding": "gzip",                   #
+#    "hash": SHA-1 of the body, "size": body size, "status": 200}                                                      #
+#                                                                                                                      #
+# Records are written by a background thread, so requests never wait for the disk. When the log reaches its maximum    #
+# size it is renamed with a .1 suffix (replacing the previous one) and a new log is started, which writes its bodies   #
+# again.                                                                                                               #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def encode_body(body):
+    """
+    Encode a request body for the log
+    :param body: The request body
+    :type body: bytes
+    :return: The encoded body and its encoding (utf-8 or base64)
+    :rtype: tuple
+    """
+    try:
+        return body.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        return base64.b64encode(body).decode('ascii'), 'base64'
+
+
+def decode_body(data, encoding):
+    """
+    Decode a request body from the log
+    :param data: The encoded body
+    :type data: str
+    :param encoding: The encoding (utf-8 or base64)
+    :type encoding: str
+    :return: The request body
+    :rtype: bytes
+    """
+    if encoding == 'base64':
+        return base64.b64decode(data.encode('ascii'))
+    return data.encode('utf-8')
+
+
+def read_log(path):
+    """
+    Read a request log
+    :param path: The log file
+    :type path: str
+    :return: The requests, in order, with the body (bytes or None if it was not recorded) in the body key
+    :rtype: list
+    """
+    bodies = {}
+    requests = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record['type'] == 'body':
+                bodies[record['hash']] = decode_body(record['data'], record.get('encoding', 'utf-8'))
+            elif record['type'] == 'request':
+                record['body'] = bodies.get(record['hash']) if record['size'] else b''
+                requests.append(record)
+    return requests
+
+
+class RequestRecorder(object):
+    """
+    Record a sample of the requests to a Flask application
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.path = None
+        self.sample = 1.0
+        self.bodies = True
+        self.max_bytes = 100 * 1024 * 1024
+        self.max_pending = 1000
+        # Digests of the bodies written to the current log
+        self.__seen = LRUCache('recorded_bodies', 10000)
+        self.__writer = None
+        self.__lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure from the application configuration and register the request hook
+        :param app: The Flask application
+        :type app: Flask
+        """
+        self.path = app.config.get('RECORD_PATH', 'requests-{pid}.log')
+        self.sample = float(app.config.get('RECORD_SAMPLE', self.sample))
+        self.bodies = bool(app.config.get('RECORD_BODIES', self.bodies))
+        self.max_bytes = app.config.get('RECORD_MAX_BYTES', self.max_bytes)
+        self.max_pending = int(app.config.get('RECORD_MAX_PENDING', self.max_pending))
+        self.__seen.resize(int(app.config.get('RECORD_SEEN_BODIES', self.__seen.max_size)))
+        app.extensions['recorder'] = self
+        app.after_request(self.__after_request)
+
+    def __pending(self):
+        """
+        Get the queue of records of this process, starting its writer thread on first use so that each pre-forked
+        worker writes its own log
+        :return: The queue of records
+        :rtype: queue.Queue
+        """
+        pid = os.getpid()
+        with self.__lock:
+            if self.__writer is None or self.__writer[0] != pid:
+                self.__seen.clear()
+                pending = queue.Queue(self.max_pending)
+                writer = threading.Thread(target=self.__write, args=(pending, self.path.format(pid=pid)),
+                                          name='request-recorder')
+                writer.daemon = True
+                writer.start()
+                self.__writer = (pid, pending)
+            return self.__writer[1]
+
+    def __write(self, pending, path):
+        """
+        Writer thread main loop: append records to the log, rotating it at the maximum size
+        :param pending: The queue of records, as (request body, request record) tuples
+        :type pending: queue.Queue
+        :param path: The log file
+        :type path: str
+        """
+        log = open(path, 'a')
+        while True:
+            body, record = pending.get()
+            try:
+                if self.max_bytes and log.tell() >= self.max_bytes:
+                    log.close()
+                    os.rename(path, path + '.1')
+                    log = open(path, 'a')
+                    # The bodies written to the rotated log must be written again
+                    self.__seen.clear()
+                lines = []
+                if body and self.__seen.get(record['hash']) is None:
+                    self.__seen.put(record['hash'], True)
+                    data, encoding = encode_body(body)
+                    lines.append(json.dumps({'type': 'body', 'hash': record['hash'], 'data': data,
+                                             'encoding': encoding}))
+                lines.append(json.dumps(record))
+                log.write('\n'.join(lines) + '\n')
+                # Flush when caught up, rather than after every record
+                if pending.empty():
+                    log.flush()
+            finally:
+                pending.task_done()
+
+    def flush(self):
+        """
+        Wait until the records of this process have been written to the log
+        """
+        self.__pending().join()
+
+    def record(self, method, path, query, content_type, body, status, accept=None, accept_encoding=None):
+        """
+        Queue a request to be appended to the log. Requests are dropped rather than waiting when the writer is behind.
+        :param method: The HTTP method
+        :type method: str
+        :param path: The request path
+        :type path: str
+        :param query: The query string
+        :type query: str
+        :param content_type: The request content type
+        :type content_type: str
+        :param body: The request body
+        :type body: bytes
+        :param status: The response status code
+        :type status: int
+        :param accept: The Accept header, which selects the response transport
+        :type accept: str
+        :param accept_encoding: The Accept-Encoding header, which selects response compression
+        :type accept_encoding: str
+        """
+        # The body is encoded by the writer thread, only if it is not already in the log
+        digest = hashlib.sha1(body).hexdigest() if self.bodies else None
+        try:
+            self.__pending().put_nowait((body if self.bodies else None, {
+                'type': 'request',
+                'time': round(time.time(), 6),
+                'method': method,
+                'path': path,
+                'query': query,
+                'content_type': content_type,
+                'accept': accept,
+                'accept_encoding': accept_encoding,
+                'hash': digest,
+                'size': len(body),
+                'status': status
+            }))
+        except queue.Full:
+            pass
+
+    def __after_request(self, response):
+        """
+        Record a sample of the requests to the resources
+        """
+        if request.endpoint in (None, 'static', 'metrics'):
+            return response
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return response
+        self.record(
+            request.method,
+            request.path,
+            request.query_string.decode('utf-8') if isinstance(request.query_string, bytes) else request.query_string,
+            request.headers.get('Content-Type'),
+            request.get_data(),
+            response.status_code,
+            request.headers.get('Accept'),
+            request.headers.get('Accept-Encoding')
+        )
+        return response
@@ -0,0 +1,194 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import sys
+from collections import namedtuple
+
+from flask import request
+from flask.ext.restful import abort
+
+from oemicroservices.common.transport import decode_body
+# noinspection PyUnresolvedReferences
+from oemicroservices.common.transport import loads
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                    QuerySchema                                                       #
+#                                     Declarative URL query string arguments                                           #
+#                                                                                                                      #
+########################################################################################################################
+
+# A query string argument: its name, the type its value is converted with, its default and whether it may be repeated
+# (giving a list of values)
+Arg = namedtuple('Arg', ['name', 'type', 'default', 'multiple'])
+Arg.__new__.__defaults__ = (str, None, False)
+
+
+def _identity(value):
+    return value
+
+
+class QuerySchema(object):
+    """
+    Parses the query string of a request into a dictionary of converted arguments. A drop-in for a reqparse parser:
+    missing arguments take their default, repeated arguments take their first value (or a list of values if they may
+    be repeated) and conversion errors abort with the same 400 response.
+    """
+
+    def __init__(self, *args):
+        """
+        Default constructor
+        :param args: The arguments
+        :type args: Arg
+        """
+        self.args = tuple(args)
+        # Compile the converters once. Strings need no conversion in Python 3.
+        self.__fields = tuple(
+            (arg.name, _identity if arg.type is str and sys.version_info >= (3,) else arg.type, arg.default,
+             arg.multiple)
+            for arg in self.args
+        )
+
+    def extend(self, *args):
+        """
+        Create a schema with additional arguments, which replace any arguments of the same name
+        :param args: The additional arguments
+        :type args: Arg
+        :return: The new schema
+        :rtype: QuerySchema
+        """
+        names = set(arg.name for arg in args)
+        return QuerySchema(*([arg for arg in self.args if arg.name not in names] + list(args)))
+
+    def parse(self, args=None):
+        """
+        Parse a query string
+        :param args: The query string arguments (the arguments of the current request by default)
+        :type args: MultiDict
+        :return: The converted arguments
+        :rtype: dict
+        """
+        if args is None:
+            args = request.args
+        parsed = {}
+        for name, convert, default, multiple in self.__fields:
+            if name not in args:
+                parsed[name] = default
+                continue
+            try:
+                if multiple:
+                    parsed[name] = [convert(value) for value in args.getlist(name)]
+                else:
+                    parsed[name] = convert(args[name])
+            except Exception as ex:
+                abort(400, message={name: str(ex)})
+        return parsed
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                     BodySchema                                                       #
+#                                         Declarative required fields of JSON bodies                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+# A required field of a JSON body: its dotted path (e.g. ligand.value), the error message if it is missing and
+# optionally the types it must have
+Field = namedtuple('Field', ['path', 'message', 'types'])
+Field.__new__.__defaults__ = (None,)
+
+
+class BodySchema(object):
+    """
+    Decodes a JSON (or MessagePack or CBOR) request body and checks its required fields
+    """
+
+    def __init__(self, *fields):
+        """
+        Default constructor
+        :param fields: The required fields, parents before their children
+        :type fields: Field
+        """
+        self.fields = tuple(fields)
+        # Compile the paths once
+        self.__fields = tuple((tuple(field.path.split('.')), field.message, field.types) for field in self.fields)
+
+    def validate(self, obj):
+        """
+        Check a decoded JSON body
+        :param obj: The decoded JSON body
+        :raises Exception: If the body or one of its required fields is missing
+        """
+        if not obj:
+            raise Exception("No POST data received")
+        if not isinstance(obj, dict):
+            raise Exception("Unexpected POST data received")
+        for path, message, types in self.__fields:
+            node = obj
+            for key in path[:-1]:
+                node = node[key]
+            if not isinstance(node, dict) or path[-1] not in node:
+                raise Exception(message)
+            if types is not None and not isinstance(node[path[-1]], types):
+                raise Exception(message)
+
+    def parse(self, data=None):
+        """
+        Decode and check a JSON body
+        :param data: The JSON body (the body of the current request, decoded by its MIME type, by default)
+        :type data: bytes or str
+        :return: The decoded JSON body
+        :rtype: dict
+        """
+        obj = decode_body(request.data, request.mimetype) if data is None else loads(data)
+        self.validate(obj)
+        return obj
+
+
+def validate_molecule(obj, name):
+    """
+    Check a molecule of a request body (a dictionary with value, format and optional gz keys)
+    :param obj: The molecule
+    :param name: The name of the molecule for error messages
+    :type name: str
+    """
+    if not isinstance(obj, dict):
+        raise Exception("Unexpected {0} data received".format(name))
+    if 'value' not in obj:
+        raise Exception("No {0} file provided".format(name))
+    if 'format' not in obj:
+        raise Exception("No {0} format provided".format(name))
+
+
+def validate_molecules(molecules, max_molecules):
+    """
+    Check the molecules of a batch request body
+    :param molecules: The molecules
+    :type molecules: list
+    :param max_molecules: The maximum number of molecules
+    :type max_molecules: int
+    """
+    if not isinstance(molecules, list) or not molecules:
+        raise Exception("No molecules provided")
+    if len(molecules) > max_molecules:
+        raise Exception("Too many molecules (maximum {0})".format(max_molecules))
+    for i, molecule in enumerate(molecules):
+        validate_molecule(molecule, "molecule {0}".format(i))
@@ -0,0 +1,180 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from timeit import default_timer
+
+from flask import request, g
+
+from oemicroservices.common.recorder import encode_body, decode_body
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                SlowRequestCapture                                                    #
+#                    Save the full inputs of slow requests to a bounded spool directory for reproduction               #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def read_capture(path):
+    """
+    Read a captured request
+    :param path: The capture file
+    :type path: str
+    :return: The capture, with the decoded body (bytes, or None if it was too large to capture) in the body key
+    :rtype: dict
+    """
+    with open(path, 'r') as f:
+        capture = json.load(f)
+    if capture.get('body') is not None:
+        capture['body'] = decode_body(capture['body'], capture['encoding'])
+    return capture
+
+
+class SlowRequestCapture(object):
+    """
+    Capture requests that exceed a latency threshold for a Flask application
+    """
+
+    def __init__(self, app=None):
+        """
+        Default constructor
+        :param app: The Flask application (optional, see init_app)
+        :type app: Flask
+        """
+        self.directory = None
+        self.threshold = 5.0
+        self.sample = 1.0
+        self.max_files = 100
+        self.max_bytes = 100 * 1024 * 1024
+        self.max_body = 10 * 1024 * 1024
+        self.__lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure from the application configuration and register the request hooks
+        :param app: The Flask application
+        :type app: Flask
+        """
+        self.directory = app.config['SLOW_REQUEST_DIR']
+        self.threshold = float(app.config.get('SLOW_REQUEST_THRESHOLD', self.threshold))
+        self.sample = float(app.config.get('SLOW_REQUEST_SAMPLE', self.sample))
+        self.max_files = int(app.config.get('SLOW_REQUEST_MAX_FILES', self.max_files))
+        self.max_bytes = int(app.config.get('SLOW_REQUEST_MAX_BYTES', self.max_bytes))
+        self.max_body = int(app.config.get('SLOW_REQUEST_MAX_BODY', self.max_body))
+        app.extensions['slow_requests'] = self
+        app.before_request(self.__before_request)
+        app.after_request(self.__after_request)
+
+    def capture(self, capture):
+        """
+        Write a capture to the spool directory, then remove the oldest captures beyond the file and size limits
+        :param capture: The capture
+        :type capture: dict
+        :return: The capture file
+        :rtype: str
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        name = '{0}-{1}-{2}.json'.format(time.strftime('%Y%m%dT%H%M%S'), capture['endpoint'], uuid.uuid4().hex[:8])
+        path = os.path.join(self.directory, name)
+        # Write to a temporary file first so that readers never see a partial capture
+        with open(path + '.tmp', 'w') as f:
+            json.dump(capture, f)
+        os.rename(path + '.tmp', path)
+        self.__trim()
+        return path
+
+    def __trim(self):
+        """
+        Remove the oldest captures beyond the file and size limits
+        """
+        with self.__lock:
+            files = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    path = os.path.join(self.directory, name)
+                    try:
+                        files.append((os.path.getmtime(path), os.path.getsize(path), path))
+                    except OSError:
+                        pass
+            files.sort()
+            total = sum(size for mtime, size, path in files)
+            while files and (len(files) > self.max_files or total > self.max_bytes):
+                mtime, size, path = files.pop(0)
+                total -= size
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # noinspection PyMethodMayBeStatic
+    def __before_request(self):
+        """
+        Note the request start time
+        """
+        g.capture_start = default_timer()
+
+    def __after_request(self, response):
+        """
+        Capture the request if it was slow
+        """
+        start = getattr(g, 'capture_start', None)
+        if start is None or request.endpoint in (None, 'static', 'metrics'):
+            return response
+        duration = default_timer() - start
+        if duration < self.threshold or (self.sample < 1.0 and random.random() >= self.sample):
+            return response
+        body = request.get_data()
+        capture = {
+            'time': time.time(),
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'args': request.args.to_dict(flat=False),
+            'view_args': request.view_args,
+            'content_type': request.headers.get('Content-Type'),
+            'status': response.status_code,
+            'duration': duration,
+            'stages': None,
+            'size': len(body),
+            'body': None,
+            'encoding': None
+        }
+        measurements = getattr(g, 'measurements', None)
+        if measurements is not None:
+            capture['stages'] = measurements.stage_totals()
+        # Bodies above the size cap are not kept, but the rest of the capture still is
+        if len(body) <= self.max_body:
+            capture['body'], capture['encoding'] = encode_body(body)
+        try:
+            self.capture(capture)
+        except (IOError, OSError):
+            # Never fail a request because the spool directory is unavailable
+            pass
+        return response
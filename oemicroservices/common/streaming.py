@@ -0,0 +1,173 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import base64
+import codecs
+import json
+import os
+import tempfile
+import zlib
+
+from flask import Response, current_app
+
+# Bytes read from a spool file at a time
+CHUNK_SIZE = 64 * 1024
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Spool Files                                                        #
+#                     Outputs are written to a file by the worker and streamed from it in chunks                       #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def spool_file(directory=None):
+    """
+    Create an empty spool file for an output
+    :param directory: The spool directory (None for the system temporary directory)
+    :type directory: str
+    :return: The file path
+    :rtype: str
+    """
+    fd, path = tempfile.mkstemp(prefix='oemicroservices-', dir=directory)
+    os.close(fd)
+    return path
+
+
+def remove_file(path):
+    """
+    Remove a spool file if it still exists
+    :param path: The file path
+    :type path: str
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def iter_file(path, chunk_size=CHUNK_SIZE):
+    """
+    Read a file in chunks
+    :param path: The file path
+    :type path: str
+    :param chunk_size: The chunk size in bytes
+    :type chunk_size: int
+    :return: The chunks
+    """
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_base64_gzip(chunks, level=9):
+    """
+    Gzip and then base64 encode a stream, as compress_string does for a string
+    :param chunks: The bytes to encode
+    :param level: The gzip level
+    :type level: int
+    :return: The encoded chunks
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    pending = b''
+    for chunk in chunks:
+        pending += compressor.compress(chunk)
+        # Encode whole groups of 3 bytes so that no padding appears mid-stream
+        n = len(pending) - len(pending) % 3
+        if n:
+            yield base64.b64encode(pending[:n])
+            pending = pending[n:]
+    yield base64.b64encode(pending + compressor.flush())
+
+
+def iter_json_string(chunks):
+    """
+    Encode a UTF-8 stream as a JSON string, including the quotes
+    :param chunks: The UTF-8 bytes
+    :return: The encoded chunks
+    """
+    # An incremental decoder keeps characters split between chunks intact
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    yield b'"'
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield json.dumps(text)[1:-1].encode('utf-8')
+    text = decoder.decode(b'', True)
+    if text:
+        yield json.dumps(text)[1:-1].encode('utf-8')
+    yield b'"'
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                Streamed Responses                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def stream_images(image_format):
+    """
+    Check whether images of a format are written to a spool file and streamed, per the application configuration
+    :param image_format: The image format (e.g. png, pdf)
+    :type image_format: str
+    :return: True to stream the images
+    :rtype: bool
+    """
+    config = current_app.config
+    return config.get('STREAM_OUTPUTS', False) and image_format.lower() in config.get('STREAM_IMAGE_FORMATS', ())
+
+
+def stream_response(path, chunks, mimetype, content_length=None):
+    """
+    Respond with chunks of a spool file, which is removed when the response is closed
+    :param path: The spool file path
+    :type path: str
+    :param chunks: The response chunks
+    :param mimetype: The response MIME type
+    :type mimetype: str
+    :param content_length: The response length in bytes, if known
+    :type content_length: int
+    :return: The streamed response
+    :rtype: Response
+    """
+    response = Response(chunks, mimetype=mimetype)
+    if content_length is not None:
+        response.headers['Content-Length'] = str(content_length)
+    response.call_on_close(lambda: remove_file(path))
+    return response
+
+
+def file_response(path, mimetype):
+    """
+    Stream a spool file as the response, which is removed when the response is closed
+    :param path: The spool file path
+    :type path: str
+    :param mimetype: The response MIME type
+    :type mimetype: str
+    :return: The streamed response
+    :rtype: Response
+    """
+    chunk_size = current_app.config.get('STREAM_CHUNK_SIZE', CHUNK_SIZE)
+    return stream_response(path, iter_file(path, chunk_size), mimetype, os.path.getsize(path))
@@ -0,0 +1,177 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import base64
+import json
+import sys
+
+from flask import Response, request
+
+# Optional binary codecs for high-volume clients
+try:
+    # noinspection PyUnresolvedReferences
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    # noinspection PyUnresolvedReferences
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+CBOR_MIMETYPE = 'application/cbor'
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      Decoding                                                        #
+#                                                                                                                      #
+########################################################################################################################
+
+# Use a faster JSON decoder if one is installed. orjson decodes the request body bytes directly.
+try:
+    # noinspection PyUnresolvedReferences
+    import orjson
+
+    def loads(data):
+        """
+        Decode a JSON document
+        :param data: The document
+        :type data: bytes or str
+        :return: The decoded document
+        """
+        return orjson.loads(data)
+except ImportError:
+    def loads(data):
+        """
+        Decode a JSON document
+        :param data: The document
+        :type data: bytes or str
+        :return: The decoded document
+        """
+        if sys.version_info >= (3,) and isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+def is_binary(mimetype):
+    """
+    Check whether a MIME type is one of the binary transports
+    :param mimetype: The MIME type
+    :type mimetype: str
+    :return: True for MessagePack and CBOR
+    :rtype: bool
+    """
+    return mimetype in MSGPACK_MIMETYPES or mimetype == CBOR_MIMETYPE
+
+
+def decode_body(data, mimetype=None):
+    """
+    Decode a request body by its MIME type: MessagePack, CBOR or else JSON. Binary fields of MessagePack and CBOR
+    bodies are decoded as bytes.
+    :param data: The request body
+    :type data: bytes
+    :param mimetype: The request MIME type
+    :type mimetype: str
+    :return: The decoded body
+    """
+    if mimetype in MSGPACK_MIMETYPES:
+        if msgpack is None:
+            raise Exception("MessagePack request bodies are not supported (msgpack is not installed)")
+        return msgpack.unpackb(data, raw=False)
+    if mimetype == CBOR_MIMETYPE:
+        if cbor2 is None:
+            raise Exception("CBOR request bodies are not supported (cbor2 is not installed)")
+        return cbor2.loads(data)
+    return loads(data)
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      Encoding                                                        #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def response_mimetype():
+    """
+    Choose the response MIME type of the current request from its Accept header. JSON is the default; the binary
+    transports are only offered when their codec is installed.
+    :return: The response MIME type
+    :rtype: str
+    """
+    offers = [JSON_MIMETYPE]
+    if msgpack is not None:
+        offers.extend(MSGPACK_MIMETYPES)
+    if cbor2 is not None:
+        offers.append(CBOR_MIMETYPE)
+    return request.accept_mimetypes.best_match(offers, JSON_MIMETYPE)
+
+
+def encode_response(obj, status=200, mimetype=None):
+    """
+    Encode an object as a response
+    :param obj: The object. Bytes values are sent as binary fields by MessagePack and CBOR, and must already be text
+                for JSON.
+    :param status: The HTTP status
+    :type status: int
+    :param mimetype: The response MIME type (negotiated from the Accept header by default)
+    :type mimetype: str
+    :return: The response
+    :rtype: Response
+    """
+    if mimetype is None:
+        mimetype = response_mimetype()
+    if mimetype in MSGPACK_MIMETYPES:
+        data = msgpack.packb(obj, use_bin_type=True)
+    elif mimetype == CBOR_MIMETYPE:
+        data = cbor2.dumps(obj)
+    else:
+        data = json.dumps(obj)
+    return Response(data, status=status, mimetype=mimetype)
+
+
+def encode_results(results, text=False, gz=False, mimetype=None):
+    """
+    Encode the results of a batch request as a response: {"results": [{"value": ..., "error": ...}, ...]}. MessagePack
+    and CBOR responses carry each value as raw bytes. JSON responses carry text values as strings and other values
+    (images and gzipped text) base64 encoded, which is only done here so that binary responses never pay for it.
+    :param results: The result and error message of each molecule, as (bytes, str) tuples
+    :type results: list
+    :param text: Whether the values are text (molecule strings) rather than images
+    :type text: bool
+    :param gz: Whether the text values are raw gzip
+    :type gz: bool
+    :param mimetype: The response MIME type (negotiated from the Accept header by default)
+    :type mimetype: str
+    :return: The response
+    :rtype: Response
+    """
+    if mimetype is None:
+        mimetype = response_mimetype()
+    binary = is_binary(mimetype)
+    encoded = []
+    for value, error in results:
+        if value is not None and not binary:
+            value = value.decode('utf-8') if text and not gz else base64.b64encode(value).decode('ascii')
+        encoded.append({'value': value, 'error': error})
+    return encode_response({'results': encoded}, 200, mimetype)
@@ -19,8 +19,6 @@
 # specific language governing permissions and limitations
 # under the License.
 
-from flask import Response
-
 import base64
 import zlib
 # noinspection PyUnresolvedReferences
@@ -29,6 +27,10 @@ import sys
 from openeye.oechem import *
 from openeye.oedepict import *
 
+from oemicroservices.common.metrics import stage, record_atoms
+from oemicroservices.common.perception import reparse_molecule
+from oemicroservices.library import InvalidMolecule
+
 ############################
 # Python 2/3 Compatibility #
 ############################
@@ -65,14 +67,6 @@ else:
 #                                                                                                                      #
 ########################################################################################################################
 
-# Dictionary of supported image MIME types
-__mime_types = {
-    'svg': 'image/svg+xml',
-    'png': 'image/png',
-    'pdf': 'application/pdf',
-    'ps': 'application/postscript'
-}
-
 # Dictionary of OpenEye title locations
 __title_locations = {
     'top': OETitleLocation_Top,
@@ -119,15 +113,6 @@ def get_title_location(location):
     return __title_locations.get(location.lower())
 
 
-def get_image_mime_type(ext):
-    """
-    Returns an image MIME type from common image extensions
-    :param ext: The image extension
-    :return: The image MIME type or None if the image extension is not known
-    """
-    return __mime_types.get(ext.replace('.', '').lower())
-
-
 def get_highlight_style(style):
     """
     Returns an OEHighlightStyle corresponding to a text style name
@@ -147,14 +132,36 @@ def render_error_image(width, height, message="Error depicting molecule"):
     :type height: int or float
     :param message: The error text to put on the image (WARNING: does not wrap)
     :type message: str
-    :return: An HTTP response with the error image
+    :return: The PNG image
+    :rtype: bytes
     """
     image = OEImage(width, height)
     font = OEFont(OEFontFamily_Helvetica, OEFontStyle_Default, 20, OEAlignment_Center, OERed)
     image.DrawText(OE2DPoint(image.GetWidth()/2.0, image.GetHeight()/2.0), message, font, image.GetWidth())
     # Render the image
-    img_content = OEWriteImageToString('png', image)
-    return Response(img_content, mimetype='image/png')
+    return OEWriteImageToString('png', image)
+
+
+def write_image(image, image_format, filename=None):
+    """
+    Write an image to a string or, so that large images are not held in memory, to a file
+    :param image: The image
+    :type image: OEImageBase
+    :param image_format: The image format (e.g. png, svg, pdf)
+    :type image_format: str
+    :param filename: The file to write the image to (None to return the image)
+    :type filename: str
+    :return: The image, or None if it was written to a file
+    :rtype: bytes
+    """
+    if filename is None:
+        return OEWriteImageToString(image_format, image)
+    ofs = oeofstream()
+    if not ofs.open(to_utf8(filename)):
+        raise Exception("Error opening output file")
+    OEWriteImage(ofs, image_format, image)
+    ofs.close()
+    return None
 
 
 def compress_string(s):
@@ -175,8 +182,53 @@ def inflate_string(s):
     :type s: str
     :return: The inflated string
     :rtype: str
+    :raises InvalidMolecule: If the string is not valid base64 encoded gzip data, so that the error can be cached
+    """
+    try:
+        return zlib.decompress(base64.b64decode(s.encode('utf-8')), zlib.MAX_WBITS | 16).decode('utf-8')
+    # binascii.Error and UnicodeDecodeError are ValueErrors (b64decode raises TypeError on Python 2)
+    except (zlib.error, TypeError, ValueError) as ex:
+        raise InvalidMolecule("Invalid gzipped molecule: {0}".format(str(ex)))
+
+
+def iter_frames_from_string(mol_string, extension, gz=False):
     """
-    return zlib.decompress(base64.b64decode(s.encode('utf-8')), zlib.MAX_WBITS | 16).decode('utf-8')
+    Read the frames of a molecule string one at a time: the models of a multi-model PDB file, or the conformers of each
+    molecule of other file formats (e.g. a multi-conformer OEB file)
+    :param mol_string: The molecule file represented as a string
+    :type mol_string: str
+    :param extension: The file extension indicating the file format of mol_string
+    :type extension: str
+    :param gz: Whether mol_string is a base64-encoded gzip
+    :type gz: bool
+    :return: The frames, as OEGraphMols
+    """
+    if extension.lower() == "smiles":
+        mol_format = OEFormat_SMI
+    else:
+        mol_format = OEGetFileType(to_utf8(extension))
+    if mol_format == OEFormat_UNDEFINED:
+        raise InvalidMolecule("Invalid molecule format: " + extension)
+    if gz:
+        with stage('inflate'):
+            mol_string = inflate_string(mol_string)
+    ifs = oemolistream()
+    ifs.SetFormat(mol_format)
+    # End each molecule at the end of its model, instead of reading all models into one molecule
+    ifs.SetFlavor(OEFormat_PDB, OEIFlavor_PDB_Default | OEIFlavor_PDB_ENDM)
+    if not ifs.openstring(mol_string):
+        raise InvalidMolecule("Error opening molecule")
+    mol = OEMol()
+    while True:
+        with stage('read'):
+            ok = OEReadMolecule(ifs, mol)
+        if not ok:
+            break
+        for conf in mol.GetConfs():
+            frame = OEGraphMol(conf)
+            record_atoms(frame.NumAtoms())
+            yield frame
+        mol.Clear()
 
 
 def read_molecule_from_string(mol_string, extension, gz=False, reparse=False):
@@ -188,8 +240,9 @@ def read_molecule_from_string(mol_string, extension, gz=False, reparse=False):
         :type extension: str
         :param gz: Whether mol_string is a base64-encoded gzip
         :type gz: bool
-        :param reparse: Whether we should reparse connectivity, bond orders, stereo, etc.,
-        :type reparse: bool
+        :param reparse: Whether we should reparse connectivity, bond orders, stereo, etc., or the reparse mode (see
+                        oemicroservices.library.reparse_mode)
+        :type reparse: bool or str
         :return: The OEGraphMol representation of the molecule
         :rtype: OEGraphMol
         """
@@ -203,32 +256,32 @@ def read_molecule_from_string(mol_string, extension, gz=False, reparse=False):
         else:
             mol_format = OEGetFileType(to_utf8(extension))
         if mol_format == OEFormat_UNDEFINED:
-            raise Exception("Invalid molecule format: " + extension)
+            raise InvalidMolecule("Invalid molecule format: " + extension)
 
         ifs.SetFormat(mol_format)
 
         # Open stream to the molecule string
         if gz:
-            ok = ifs.openstring(inflate_string(mol_string))
-        else:
+            with stage('inflate'):
+                mol_string = inflate_string(mol_string)
+
+        with stage('read'):
             ok = ifs.openstring(mol_string)
 
-        # If opening the molecule string was not OK
-        if not ok:
-            raise Exception("Error opening molecule")
+            # If opening the molecule string was not OK
+            if not ok:
+                raise InvalidMolecule("Error opening molecule")
 
-        # If we opened the stream then read the molecule
-        ok = OEReadMolecule(ifs, mol)
+            # If we opened the stream then read the molecule
+            ok = OEReadMolecule(ifs, mol)
 
         # If reading the molecule was not OK
         if not ok:
-            raise Exception("Invalid molecule")
+            raise InvalidMolecule("Invalid molecule")
+        record_atoms(mol.NumAtoms())
 
         # If we are reparsing the molecule
         if reparse:
-            OEDetermineConnectivity(mol)
-            OEFindRingAtomsAndBonds(mol)
-            OEPerceiveBondOrders(mol)
-            OEAssignImplicitHydrogens(mol)
-            OEAssignFormalCharges(mol)
+            with stage('reparse'):
+                mol = reparse_molecule(mol, reparse)
         return mol
@@ -0,0 +1,102 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import os
+from collections import OrderedDict
+from importlib import import_module
+from timeit import default_timer
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Toolkit Warm-up                                                      #
+#                     Load the toolkits and pay the first-request costs before the application is forked               #
+#                                                                                                                      #
+########################################################################################################################
+
+# Canned complex for the interaction warm-up, shipped with the package: a ligand and the residues of its receptor with
+# an atom within 6 Angstroms of it, so that the warm-up does not parse a whole receptor
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+WARM_UP_LIGAND = 'warmup_ligand.pdb'
+WARM_UP_POCKET = 'warmup_pocket.pdb'
+
+# Canned small molecule with a highlight, which exercises layout, substructure search and rendering
+WARM_UP_MOLECULE = 'CC(=O)Oc1ccccc1C(=O)O'
+WARM_UP_HIGHLIGHT = 'c1ccccc1'
+
+
+def read_data(name):
+    """
+    Read a molecule file from the package data
+    :param name: The file name
+    :type name: str
+    :return: The file contents
+    :rtype: str
+    """
+    with open(os.path.join(DATA_DIR, name), 'r') as f:
+        return f.read()
+
+
+def preload():
+    """
+    Import the toolkits and the modules that use them
+    """
+    for module in ('molecule', 'interaction', 'convert'):
+        import_module('oemicroservices.common.{0}'.format(module))
+
+
+def warm_up():
+    """
+    Load the toolkits, then render a canned molecule and interaction and convert a canned molecule, so that the
+    license checks, font loading and first-call initialization happen once in the parent process instead of on the
+    first request of every worker
+    :return: The time taken by each step in seconds, and the errors of steps that failed
+    :rtype: tuple
+    """
+    timings = OrderedDict()
+    errors = OrderedDict()
+
+    def step(name, func, *args, **kwargs):
+        start = default_timer()
+        try:
+            func(*args, **kwargs)
+        except Exception as ex:
+            errors[name] = str(ex)
+        timings[name] = default_timer() - start
+
+    step('import', preload)
+    if 'import' in errors:
+        return timings, errors
+
+    from oemicroservices.library import depict, depict_interaction, convert
+    from oemicroservices.common.util import render_error_image
+
+    # Each image format has its own writer
+    for image_format in ('png', 'svg'):
+        step('depict_' + image_format, depict, WARM_UP_MOLECULE, 'smiles', format=image_format,
+             highlight=[WARM_UP_HIGHLIGHT])
+    step('error_image', render_error_image, 400, 400, 'Warm-up')
+
+    def interaction():
+        depict_interaction(read_data(WARM_UP_POCKET), read_data(WARM_UP_LIGAND), 'pdb', 'pdb')
+    step('interaction', interaction)
+
+    step('convert', convert, WARM_UP_MOLECULE, 'sdf', 'smiles')
+    return timings, errors
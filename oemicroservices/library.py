@@ -0,0 +1,749 @@
+# Library API for oemicroservices
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# Depict and convert molecules in-process, without Flask or HTTP:
+#
+#   from oemicroservices.library import depict, depict_formats, iter_depict, depict_interaction, convert, layout
+#
+#   png = depict('c1ccccc1', 'smiles', width=300, height=300)
+#   images = depict_formats('c1ccccc1', ['png', 'svg', 'pdf'], 'smiles')
+#   coords = layout('c1ccccc1O', 'smiles', highlight=['c1ccccc1'])
+#   svgs = list(iter_depict(mols, format='svg', highlight=['c1ccccc1']))
+#   series = list(iter_depict(analogs, format='svg', scaffold='c1ccc2ccccc2c1'))
+#   summary = depict_complex_frames(nmr_ensemble, 'frames.json', fmt='pdb', resn='SUV')
+#   sdf = convert(mol, 'sdf')
+#
+# Molecules are OEMols (which are copied, not changed) or molecule strings in a given file format. The options are the
+# query parameters of the corresponding REST endpoints. The toolkits are imported on first use.
+
+import base64
+import itertools
+import zlib
+
+############################
+# Python 2/3 Compatibility #
+############################
+
+try:
+    # Python 2, where text may be str or unicode
+    string_types = (str, unicode)
+except NameError:
+    # Python 3, where molecule strings may also be bytes
+    string_types = (str, bytes)
+
+
+class InvalidMolecule(Exception):
+    """
+    Raised when a molecule string cannot be read. The same input always fails, so these errors may be cached.
+    """
+    pass
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      Options                                                         #
+#                                                                                                                      #
+########################################################################################################################
+
+# Supported image MIME types
+IMAGE_MIME_TYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'pdf': 'application/pdf',
+    'ps': 'application/postscript'
+}
+
+# Small molecule depiction options and their defaults
+DEPICT_OPTIONS = {
+    'width': 400,                   # The image width
+    'height': 400,                  # The image height
+    'format': 'png',                # The image format (png, svg, pdf or ps)
+    'title': '',                    # The image title
+    'keeptitle': False,             # Use the molecule title if no title is given
+    'titleloc': 'top',              # The title location (top or bottom)
+    'scalebonds': False,            # Bond width scales with the size of the image
+    'background': '#ffffff00',      # The background color (RRGGBBAA)
+    'highlight': None,              # SMARTS substructures to highlight
+    'highlightcolor': '#7070FF',    # The substructure highlight color
+    'highlightstyle': 'default',    # The substructure highlight style
+    'scaffold': ''                  # Reference scaffold SMILES to align the depiction to (for series)
+}
+
+# Receptor-ligand interaction depiction options and their defaults
+INTERACTION_OPTIONS = {
+    'width': 800,                   # The image width
+    'height': 600,                  # The image height
+    'format': 'png',                # The image format (png, svg, pdf or ps)
+    'title': '',                    # The image title
+    'keeptitle': False,             # Use the ligand title if no title is given
+    'titleloc': 'top',              # The title location (top or bottom)
+    'scalebonds': False,            # Bond width scales with the size of the image
+    'background': '#ffffff00',      # The background color (RRGGBBAA)
+    'legend': True                  # Include a legend with the image
+}
+
+# Reparse modes: perceive connectivity and bond orders from the geometry, or (for proteins) bond the standard amino
+# acids from residue templates and perceive only the other residues from the geometry
+REPARSE_MODES = ('geometry', 'template')
+
+
+def reparse_mode(value):
+    """
+    Get the reparse mode of a reparse option
+    :param value: True or False, a reparse mode, or a query string or JSON value of one of these
+    :type value: bool or str
+    :return: The reparse mode, or False to not reparse
+    :rtype: str
+    """
+    if isinstance(value, string_types):
+        value = value.strip().lower()
+        if value in REPARSE_MODES:
+            return value
+        if value in ('true', '1', 'yes'):
+            return 'geometry'
+        if value in ('', 'false', '0', 'no'):
+            return False
+        raise Exception("Invalid reparse mode: {0}".format(value))
+    return 'geometry' if value else False
+
+
+def get_image_mime_type(ext):
+    """
+    Returns an image MIME type from common image extensions
+    :param ext: The image extension
+    :return: The image MIME type or None if the image extension is not known
+    """
+    return IMAGE_MIME_TYPES.get(ext.replace('.', '').lower())
+
+
+def _options(defaults, options):
+    """
+    Fill in the default options
+    :param defaults: The option defaults
+    :type defaults: dict
+    :param options: The options given
+    :type options: dict
+    :return: The complete options
+    :rtype: dict
+    """
+    for key in options:
+        if key not in defaults:
+            raise Exception("Unknown option: {0}".format(key))
+    merged = dict(defaults)
+    merged.update(options)
+    return merged
+
+
+def _text(mol, gz=False):
+    """
+    Get the text of a molecule string
+    :param mol: The molecule string
+    :type mol: str or bytes
+    :param gz: Whether the molecule string is gzipped and base64 encoded (or, for bytes on Python 3, raw gzip)
+    :type gz: bool
+    :return: The text
+    :rtype: str
+    """
+    try:
+        if isinstance(mol, bytes) and not isinstance(mol, str):
+            # Binary request bodies (MessagePack or CBOR) carry gzipped molecules as raw gzip rather than base64
+            if gz:
+                mol = zlib.decompress(mol, zlib.MAX_WBITS | 16)
+            return mol.decode('utf-8')
+        if gz:
+            return zlib.decompress(base64.b64decode(mol.encode('utf-8')), zlib.MAX_WBITS | 16).decode('utf-8')
+    # Corrupt gzip or base64 data (binascii.Error is a ValueError) is as invalid as a molecule that cannot be read
+    except (zlib.error, TypeError, ValueError) as ex:
+        raise InvalidMolecule("Invalid gzipped molecule: {0}".format(str(ex)))
+    return mol
+
+
+def _read(mol, fmt=None, gz=False, reparse=False):
+    """
+    Get a molecule to work on
+    :param mol: A molecule, which is copied, or a molecule string
+    :type mol: OEMolBase or str or bytes
+    :param fmt: The file format of a molecule string
+    :type fmt: str
+    :param gz: Whether a molecule string is gzipped and base64 encoded (or, for bytes on Python 3, raw gzip)
+    :type gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of a molecule string, or the reparse mode
+    :type reparse: bool or str
+    :return: The molecule
+    :rtype: OEGraphMol
+    """
+    if isinstance(mol, string_types):
+        from oemicroservices.common.util import read_molecule_from_string
+        if not fmt:
+            raise InvalidMolecule("No molecule format given")
+        if isinstance(mol, bytes) and not isinstance(mol, str):
+            mol, gz = _text(mol, gz), False
+        return read_molecule_from_string(mol, fmt, bool(gz), reparse_mode(reparse))
+    from openeye.oechem import OEGraphMol, OEMolBase
+    if not isinstance(mol, OEMolBase):
+        raise Exception("Expected a molecule or a molecule string")
+    # Depiction changes the title and coordinates, so never work on the caller's molecule
+    return OEGraphMol(mol)
+
+
+def _iterate(func, items, errors):
+    """
+    Apply a function to each item in turn
+    :param func: The function
+    :param items: The items
+    :param errors: On error, 'raise' the exception or 'ignore' it and yield None
+    :type errors: str
+    :return: The function results, in order
+    """
+    if errors not in ('raise', 'ignore'):
+        raise Exception("Unknown error handling: {0}".format(errors))
+    for item in items:
+        try:
+            yield func(item)
+        except Exception:
+            if errors == 'raise':
+                raise
+            yield None
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Molecule Depiction                                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def depict(mol, fmt=None, gz=False, reparse=False, filename=None, **options):
+    """
+    Render a small molecule
+    :param mol: The molecule or molecule string
+    :type mol: OEMolBase or str or bytes
+    :param fmt: The file format of a molecule string (e.g. smiles, sdf, pdb)
+    :type fmt: str
+    :param gz: Whether a molecule string is gzipped and base64 encoded
+    :type gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of a molecule string
+    :type reparse: bool
+    :param filename: Write the image to this file instead of returning it, so that large images are not held in memory
+    :type filename: str
+    :param options: The depiction options (see DEPICT_OPTIONS)
+    :return: The image (None if written to a file)
+    :rtype: bytes
+    """
+    from oemicroservices.common.molecule import render_molecule_image
+    return render_molecule_image(_read(mol, fmt, gz, reparse), _options(DEPICT_OPTIONS, options), filename)[0]
+
+
+def depict_formats(mol, formats, fmt=None, gz=False, reparse=False, **options):
+    """
+    Render a small molecule in several image formats, laying it out and rendering it only once
+    :param mol: The molecule or molecule string
+    :type mol: OEMolBase or str or bytes
+    :param formats: The image formats (png, svg, pdf or ps)
+    :type formats: list
+    :param fmt: The file format of a molecule string (e.g. smiles, sdf, pdb)
+    :type fmt: str
+    :param gz: Whether a molecule string is gzipped and base64 encoded
+    :type gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of a molecule string
+    :type reparse: bool
+    :param options: The depiction options (see DEPICT_OPTIONS, except format)
+    :return: The images by image format
+    :rtype: dict
+    """
+    from oemicroservices.common.molecule import render_molecule_images
+    if 'format' in options:
+        raise Exception("Give the image formats as a list of formats")
+    return render_molecule_images(_read(mol, fmt, gz, reparse), _options(DEPICT_OPTIONS, options), list(formats))
+
+
+def iter_depict(mols, fmt=None, gz=False, reparse=False, errors='raise', **options):
+    """
+    Render small molecules
+    :param mols: The molecules or molecule strings
+    :param fmt: The file format of the molecule strings
+    :type fmt: str
+    :param gz: Whether the molecule strings are gzipped and base64 encoded
+    :type gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of the molecule strings
+    :type reparse: bool
+    :param errors: On error, 'raise' the exception or 'ignore' it and yield None for the molecule
+    :type errors: str
+    :param options: The depiction options (see DEPICT_OPTIONS)
+    :return: The images, in order
+    """
+    from oemicroservices.common.molecule import render_molecule_image
+    options = _options(DEPICT_OPTIONS, options)
+
+    def render(mol):
+        return render_molecule_image(_read(mol, fmt, gz, reparse), options)[0]
+    return _iterate(render, mols, errors)
+
+
+def layout(mol, fmt=None, gz=False, reparse=False, highlight=None, scaffold=None):
+    """
+    Lay out a small molecule in 2D, for clients that render molecules themselves
+    :param mol: The molecule or molecule string
+    :type mol: OEMolBase or str or bytes
+    :param fmt: The file format of a molecule string (e.g. smiles, sdf, pdb)
+    :type fmt: str
+    :param gz: Whether a molecule string is gzipped and base64 encoded
+    :type gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of a molecule string
+    :type reparse: bool
+    :param highlight: SMARTS substructures to match
+    :type highlight: list
+    :param scaffold: A reference scaffold SMILES or molecule to align the layout to
+    :type scaffold: str or OEMolBase
+    :return: The atom coordinates, elements and charges, the bond orders and wedges, and the matched substructures
+             (see oemicroservices.common.layout.molecule_layout)
+    :rtype: dict
+    """
+    from oemicroservices.common.layout import molecule_layout
+    return molecule_layout(_read(mol, fmt, gz, reparse), highlight, scaffold)
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                               Interaction Depiction                                                  #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def _either(reparse, default):
+    """
+    Get the reparse option of one molecule of an interaction depiction
+    :param reparse: The reparse option of the molecule, or None if it was not given
+    :param default: The reparse option of both molecules
+    :return: The reparse option
+    """
+    return default if reparse is None else reparse
+
+
+def _read_part(name, mol, fmt, gz, reparse, debug):
+    """
+    Get the receptor or ligand of an interaction depiction
+    :param name: The part name for error messages (receptor or ligand)
+    :type name: str
+    :param debug: Whether to include the reason in error messages
+    :type debug: bool
+    :return: The molecule
+    :rtype: OEGraphMol
+    """
+    try:
+        return _read(mol, fmt, gz, reparse)
+    except Exception as ex:
+        message = "Error reading {0}".format(name)
+        if debug:
+            message += ": {0}".format(str(ex))
+        if isinstance(ex, InvalidMolecule):
+            raise InvalidMolecule(message)
+        raise Exception(message)
+
+
+def depict_interaction(receptor, ligand, receptor_format=None, ligand_format=None, receptor_gz=False, ligand_gz=False,
+                       reparse=False, debug=False, filename=None, receptor_reparse=None, ligand_reparse=None,
+                       **options):
+    """
+    Render the interactions of a receptor and a bound ligand
+    :param receptor: The receptor or receptor string
+    :type receptor: OEMolBase or str or bytes
+    :param ligand: The ligand or ligand string
+    :type ligand: OEMolBase or str or bytes
+    :param receptor_format: The file format of a receptor string
+    :type receptor_format: str
+    :param ligand_format: The file format of a ligand string
+    :type ligand_format: str
+    :param receptor_gz: Whether a receptor string is gzipped and base64 encoded
+    :type receptor_gz: bool
+    :param ligand_gz: Whether a ligand string is gzipped and base64 encoded
+    :type ligand_gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of molecule strings
+    :type reparse: bool
+    :param debug: Whether to include the reason in errors reading the molecules
+    :type debug: bool
+    :param filename: Write the image to this file instead of returning it, so that large images are not held in memory
+    :type filename: str
+    :param receptor_reparse: The reparse mode of a receptor string (see reparse_mode), instead of reparse. Bonding the
+                             residues from templates is much faster than perceiving the whole receptor.
+    :type receptor_reparse: bool or str
+    :param ligand_reparse: The reparse mode of a ligand string, instead of reparse
+    :type ligand_reparse: bool or str
+    :param options: The depiction options (see INTERACTION_OPTIONS)
+    :return: The image (None if written to a file)
+    :rtype: bytes
+    """
+    from oemicroservices.common.interaction import render_interaction_image
+    options = _options(INTERACTION_OPTIONS, options)
+    ligand = _read_part('ligand', ligand, ligand_format, ligand_gz, _either(ligand_reparse, reparse), debug)
+    receptor = _read_part('receptor', receptor, receptor_format, receptor_gz, _either(receptor_reparse, reparse),
+                          debug)
+    return render_interaction_image(receptor, ligand, options, filename)[0]
+
+
+def depict_target_interaction(name, ligand, ligand_format=None, ligand_gz=False, reparse=False, debug=False,
+                              filename=None, **options):
+    """
+    Render the interactions of a ligand with a receptor of the receptor library (see RECEPTOR_DIR). Only the pocket
+    around the ligand is depicted, so the receptor is neither transferred nor read.
+    :param name: The receptor name
+    :type name: str
+    :param ligand: The ligand or ligand string, posed in the receptor
+    :type ligand: OEMolBase or str or bytes
+    :param ligand_format: The file format of a ligand string
+    :type ligand_format: str
+    :param ligand_gz: Whether a ligand string is gzipped and base64 encoded
+    :type ligand_gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of a ligand string
+    :type reparse: bool
+    :param debug: Whether to include the reason in errors reading the ligand
+    :type debug: bool
+    :param filename: Write the image to this file instead of returning it, so that large images are not held in memory
+    :type filename: str
+    :param options: The depiction options (see INTERACTION_OPTIONS)
+    :return: The image (None if written to a file)
+    :rtype: bytes
+    """
+    from oemicroservices.common.interaction import render_interaction_image
+    from oemicroservices.common.metrics import stage
+    from oemicroservices.common.receptors import RECEPTORS
+    options = _options(INTERACTION_OPTIONS, options)
+    receptor = RECEPTORS.get(name)
+    if receptor is None:
+        raise InvalidMolecule("Unknown receptor: {0}".format(name))
+    ligand = _read_part('ligand', ligand, ligand_format, ligand_gz, reparse, debug)
+    with stage('pocket'):
+        pocket = receptor.pocket(ligand, RECEPTORS.pocket_radius)
+    return render_interaction_image(pocket, ligand, options, filename)[0]
+
+
+def iter_depict_interaction(receptor, ligands, receptor_format=None, ligand_format=None, receptor_gz=False,
+                            ligand_gz=False, reparse=False, debug=False, errors='raise', receptor_reparse=None,
+                            ligand_reparse=None, **options):
+    """
+    Render the interactions of a receptor with each of several bound ligands (e.g. docked poses). The receptor is read
+    once.
+    :param receptor: The receptor or receptor string
+    :type receptor: OEMolBase or str or bytes
+    :param ligands: The ligands or ligand strings
+    :param errors: On error, 'raise' the exception or 'ignore' it and yield None for the ligand
+    :type errors: str
+    :param receptor_reparse: The reparse mode of a receptor string, instead of reparse (see depict_interaction)
+    :param ligand_reparse: The reparse mode of the ligand strings, instead of reparse
+    :return: The images, in order
+    """
+    from oemicroservices.common.interaction import render_interaction_image
+    options = _options(INTERACTION_OPTIONS, options)
+    receptor = _read_part('receptor', receptor, receptor_format, receptor_gz, _either(receptor_reparse, reparse),
+                          debug)
+
+    def render(ligand):
+        ligand = _read_part('ligand', ligand, ligand_format, ligand_gz, _either(ligand_reparse, reparse), debug)
+        return render_interaction_image(receptor, ligand, options)[0]
+    return _iterate(render, ligands, errors)
+
+
+def depict_complex(mol, fmt=None, gz=False, reparse=False, chain=None, resi=None, resn=None, debug=False,
+                   filename=None, receptor_reparse=None, ligand_reparse=None, prefilter=None, **options):
+    """
+    Render the interactions of a receptor-ligand complex, selecting the ligand by chain, residue number and/or residue
+    name
+    :param mol: The complex or complex string
+    :type mol: OEMolBase or str or bytes
+    :param fmt: The file format of a complex string
+    :type fmt: str
+    :param gz: Whether a complex string is gzipped and base64 encoded
+    :type gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of a complex string
+    :type reparse: bool
+    :param chain: The chain ID of the ligand
+    :type chain: str
+    :param resi: The residue number of the ligand
+    :type resi: int
+    :param resn: The residue name of the ligand
+    :type resn: str
+    :param debug: Whether to include the reason in errors reading the complex
+    :type debug: bool
+    :param filename: Write the image to this file instead of returning it, so that large images are not held in memory
+    :type filename: str
+    :param receptor_reparse: The reparse mode of the receptor, instead of reparse (see depict_interaction). The
+                             receptor and ligand are reparsed after they are split.
+    :type receptor_reparse: bool or str
+    :param ligand_reparse: The reparse mode of the ligand, instead of reparse
+    :type ligand_reparse: bool or str
+    :param prefilter: For a PDB complex string, only read the residues within this distance in angstroms of the
+                      ligand, which are cut out of the text before it is parsed (None to read the whole complex)
+    :type prefilter: float
+    :param options: The depiction options (see INTERACTION_OPTIONS)
+    :return: The image (None if written to a file)
+    :rtype: bytes
+    """
+    from oemicroservices.common.interaction import render_interaction_image, split_complex
+    options = _options(INTERACTION_OPTIONS, options)
+    if not (chain or resi or resn):
+        raise Exception("No ligand selection options given")
+    if prefilter and isinstance(mol, string_types) and (fmt or '').lower() in ('pdb', 'ent'):
+        from oemicroservices.common.metrics import stage
+        from oemicroservices.common.prefilter import prefilter_complex
+        with stage('prefilter'):
+            try:
+                filtered = prefilter_complex(_text(mol, gz), prefilter, chain, resi, resn)
+            except Exception:
+                # Unreadable input is reported by the toolkits
+                filtered = None
+        if filtered is not None:
+            mol, gz = filtered, False
+    if receptor_reparse is None and ligand_reparse is None:
+        mol = _read_part('molecule file', mol, fmt, gz, reparse, debug)
+        receptor, ligand = split_complex(mol, chain, resi, resn)
+    else:
+        from oemicroservices.common.metrics import stage
+        from oemicroservices.common.perception import reparse_molecule
+        mol = _read_part('molecule file', mol, fmt, gz, False, debug)
+        receptor, ligand = split_complex(mol, chain, resi, resn)
+        with stage('reparse'):
+            receptor = reparse_molecule(receptor, reparse_mode(_either(receptor_reparse, reparse)))
+            ligand = reparse_molecule(ligand, reparse_mode(_either(ligand_reparse, reparse)))
+    return render_interaction_image(receptor, ligand, options, filename)[0]
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Trajectory Depiction                                                 #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def _frames(mol, fmt, gz, mode):
+    """
+    Get the frames of a molecule to work on
+    :param mol: A multi-conformer molecule, or a molecule string with several models or conformers
+    :type mol: OEMolBase or str or bytes
+    :param fmt: The file format of a molecule string
+    :type fmt: str
+    :param gz: Whether a molecule string is gzipped and base64 encoded
+    :type gz: bool
+    :param mode: The reparse mode of the frames (see reparse_mode)
+    :type mode: str
+    :return: The frames, as OEGraphMols, read one at a time
+    """
+    from oemicroservices.common.metrics import stage
+    from oemicroservices.common.perception import reparse_molecule
+    if isinstance(mol, string_types):
+        from oemicroservices.common.util import iter_frames_from_string
+        if not fmt:
+            raise InvalidMolecule("No molecule format given")
+        frames = iter_frames_from_string(_text(mol, gz), fmt)
+    else:
+        from openeye.oechem import OEGraphMol, OEMolBase
+        if not isinstance(mol, OEMolBase):
+            raise Exception("Expected a molecule or a molecule string")
+        frames = (OEGraphMol(conf) for conf in mol.GetConfs()) if hasattr(mol, 'GetConfs') else iter([OEGraphMol(mol)])
+    for frame in frames:
+        with stage('reparse'):
+            yield reparse_molecule(frame, mode)
+
+
+def _pair_frames(receptors, ligands):
+    """
+    Pair the receptor and ligand frames. A single receptor frame (e.g. a rigid receptor) is paired with every ligand
+    frame, and a single ligand frame with every receptor frame.
+    :return: The (receptor, ligand) pairs
+    """
+    receptors, ligands = iter(receptors), iter(ligands)
+    receptor, ligand = next(receptors, None), next(ligands, None)
+    if receptor is None:
+        raise InvalidMolecule("No receptor frames")
+    if ligand is None:
+        raise InvalidMolecule("No ligand frames")
+    next_receptor, next_ligand = next(receptors, None), next(ligands, None)
+    if next_receptor is None and next_ligand is None:
+        yield receptor, ligand
+        return
+    if next_receptor is None:
+        receptors = itertools.repeat(receptor)
+    else:
+        receptors = itertools.chain([receptor, next_receptor], receptors)
+    if next_ligand is None:
+        ligands = itertools.repeat(ligand)
+    else:
+        ligands = itertools.chain([ligand, next_ligand], ligands)
+    while True:
+        receptor, ligand = next(receptors, None), next(ligands, None)
+        if receptor is None or ligand is None:
+            return
+        yield receptor, ligand
+
+
+def _render_frame(receptor, ligand, options):
+    """
+    Render the interactions of a frame
+    :return: The image, the interactions and None, or None, None and the error message
+    :rtype: tuple
+    """
+    from oemicroservices.common.interaction import render_interaction_image
+    interactions = []
+    try:
+        image = render_interaction_image(receptor, ligand, options, interactions=interactions)[0]
+    except Exception as ex:
+        return None, None, str(ex)
+    return image, interactions, None
+
+
+def iter_interaction_frames(receptor, ligand, receptor_format=None, ligand_format=None, receptor_gz=False,
+                            ligand_gz=False, reparse=False, receptor_reparse=None, ligand_reparse=None, **options):
+    """
+    Render the interactions of each frame of a trajectory (or of the models of an NMR ensemble), given as a receptor
+    and a ligand with several frames (models or conformers). A receptor or ligand with a single frame is used for every
+    frame of the other. Frames are read and rendered one at a time.
+    :param receptor: The receptor or receptor string
+    :type receptor: OEMolBase or str or bytes
+    :param ligand: The ligand or ligand string
+    :type ligand: OEMolBase or str or bytes
+    :param receptor_reparse: The reparse mode of the receptor frames, instead of reparse (see depict_interaction)
+    :param ligand_reparse: The reparse mode of the ligand frames, instead of reparse
+    :param options: The depiction options (see INTERACTION_OPTIONS)
+    :return: The image, interactions and error message of each frame (see write_frames)
+    """
+    options = _options(INTERACTION_OPTIONS, options)
+    receptors = _frames(receptor, receptor_format, receptor_gz, reparse_mode(_either(receptor_reparse, reparse)))
+    ligands = _frames(ligand, ligand_format, ligand_gz, reparse_mode(_either(ligand_reparse, reparse)))
+    for receptor, ligand in _pair_frames(receptors, ligands):
+        yield _render_frame(receptor, ligand, options)
+
+
+def iter_complex_frames(mol, fmt=None, gz=False, reparse=False, chain=None, resi=None, resn=None,
+                        receptor_reparse=None, ligand_reparse=None, **options):
+    """
+    Render the interactions of each frame of a receptor-ligand complex with several frames (e.g. a multi-model PDB
+    file), selecting the ligand by chain, residue number and/or residue name. Frames are read and rendered one at a
+    time.
+    :param mol: The complex or complex string
+    :type mol: OEMolBase or str or bytes
+    :param receptor_reparse: The reparse mode of the receptor, instead of reparse (see depict_complex)
+    :param ligand_reparse: The reparse mode of the ligand, instead of reparse
+    :param options: The depiction options (see INTERACTION_OPTIONS)
+    :return: The image, interactions and error message of each frame (see write_frames)
+    """
+    from oemicroservices.common.interaction import split_complex
+    from oemicroservices.common.metrics import stage
+    from oemicroservices.common.perception import reparse_molecule
+    options = _options(INTERACTION_OPTIONS, options)
+    if not (chain or resi or resn):
+        raise Exception("No ligand selection options given")
+    receptor_mode = reparse_mode(_either(receptor_reparse, reparse))
+    ligand_mode = reparse_mode(_either(ligand_reparse, reparse))
+    for frame in _frames(mol, fmt, gz, False):
+        try:
+            receptor, ligand = split_complex(frame, chain, resi, resn)
+            with stage('reparse'):
+                receptor = reparse_molecule(receptor, receptor_mode)
+                ligand = reparse_molecule(ligand, ligand_mode)
+        except Exception as ex:
+            yield None, None, str(ex)
+            continue
+        yield _render_frame(receptor, ligand, options)
+
+
+def depict_interaction_frames(receptor, ligand, filename, max_frames=None, **kwargs):
+    """
+    Write the per-frame images and the interaction frequency summary of a receptor and a ligand with several frames to
+    a JSON file (see oemicroservices.common.frames)
+    :param filename: The file to write the JSON document to
+    :type filename: str
+    :param max_frames: The maximum number of frames to depict (None for no limit)
+    :type max_frames: int
+    :param kwargs: The arguments of iter_interaction_frames
+    :return: The summary
+    :rtype: dict
+    """
+    from oemicroservices.common.frames import write_frames
+    return write_frames(iter_interaction_frames(receptor, ligand, **kwargs), filename, max_frames)
+
+
+def depict_complex_frames(mol, filename, max_frames=None, **kwargs):
+    """
+    Write the per-frame images and the interaction frequency summary of a receptor-ligand complex with several frames
+    to a JSON file (see oemicroservices.common.frames)
+    :param filename: The file to write the JSON document to
+    :type filename: str
+    :param max_frames: The maximum number of frames to depict (None for no limit)
+    :type max_frames: int
+    :param kwargs: The arguments of iter_complex_frames
+    :return: The summary
+    :rtype: dict
+    """
+    from oemicroservices.common.frames import write_frames
+    return write_frames(iter_complex_frames(mol, **kwargs), filename, max_frames)
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                Molecule Conversion                                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def convert(mol, output_format, fmt=None, gz=False, reparse=False, output_gz=False, filename=None):
+    """
+    Convert a molecule to a molecule string
+    :param mol: The molecule or molecule string
+    :type mol: OEMolBase or str or bytes
+    :param output_format: The output file format (e.g. smiles, sdf, pdb)
+    :type output_format: str
+    :param fmt: The file format of a molecule string
+    :type fmt: str
+    :param gz: Whether a molecule string is gzipped and base64 encoded
+    :type gz: bool
+    :param reparse: Whether to reparse connectivity, bond orders, stereo, etc. of a molecule string
+    :type reparse: bool
+    :param output_gz: Whether to gzip and then base64 encode the output
+    :type output_gz: bool
+    :param filename: Write the molecule to this file instead of returning it, so that large molecules are not held in
+                     memory as strings (the file is never gzipped)
+    :type filename: str
+    :return: The molecule string (None if written to a file)
+    :rtype: str
+    """
+    from oemicroservices.common.convert import write_molecule_to_file, write_molecule_to_string
+    if filename is not None:
+        if output_gz:
+            raise Exception("Output written to a file cannot be gzipped and base64 encoded")
+        return write_molecule_to_file(_read(mol, fmt, gz, reparse), output_format, filename)
+    return write_molecule_to_string(_read(mol, fmt, gz, reparse), output_format, bool(output_gz))
+
+
+def iter_convert(mols, output_format, fmt=None, gz=False, reparse=False, output_gz=False, errors='raise'):
+    """
+    Convert molecules to molecule strings
+    :param mols: The molecules or molecule strings
+    :param output_format: The output file format (e.g. smiles, sdf, pdb)
+    :type output_format: str
+    :param errors: On error, 'raise' the exception or 'ignore' it and yield None for the molecule
+    :type errors: str
+    :return: The molecule strings, in order
+    """
+    from oemicroservices.common.convert import write_molecule_to_string
+
+    def write(mol):
+        return write_molecule_to_string(_read(mol, fmt, gz, reparse), output_format, bool(output_gz))
+    return _iterate(write, mols, errors)
@@ -0,0 +1,217 @@
+# Traffic replay for oemicroservices
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# Replay requests recorded with RECORD_REQUESTS = True against a local instance, to size capacity with the real mix of
+# formats, sizes and options:
+#
+#   python -m oemicroservices.replay requests-1234.log --url http://127.0.0.1:5000 --concurrency 8 --speedup 4
+#
+# Requests are sent at their recorded inter-arrival times divided by the speed-up factor (0 sends them as fast as the
+# clients allow). The report includes throughput, the latency distribution, the error rate and, when the server has
+# metrics enabled, the cache hit ratio.
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from timeit import default_timer
+
+from oemicroservices.benchmark import HttpClient, InProcessClient, percentile
+from oemicroservices.common.recorder import read_log
+
+if sys.version_info < (3,):
+    import Queue as queue
+else:
+    import queue
+
+# Cache lookup counters in the metrics exposition, except those of the request recorder
+__cache_pattern = re.compile(r'^oemicroservices_cache_requests_total\{cache="(?!recorded_bodies")[^}]*'
+                             r'result="(hit|miss)"[^}]*\} (\S+)$', re.M)
+
+
+def cache_counts(client):
+    """
+    Get the total cache hits and misses from the server metrics
+    :param client: The client (InProcessClient or HttpClient)
+    :return: The hits and misses, or None if the server does not serve metrics
+    :rtype: tuple
+    """
+    status, text = client.fetch('/metrics')
+    if status != 200:
+        return None
+    counts = {'hit': 0.0, 'miss': 0.0}
+    for result, value in __cache_pattern.findall(text):
+        counts[result] += float(value)
+    return counts['hit'], counts['miss']
+
+
+def to_scenario(record):
+    """
+    Convert a recorded request to a benchmark scenario
+    :param record: The recorded request
+    :type record: dict
+    :return: The scenario
+    :rtype: dict
+    """
+    path = record['path'] + ('?' + record['query'] if record['query'] else '')
+    return {
+        'name': record['path'],
+        'endpoint': record['path'],
+        'method': record['method'],
+        'path': path,
+        'body': record['body'] if record['method'] != 'GET' else None,
+        'content_type': record['content_type'],
+        'accept': record.get('accept'),
+        'accept_encoding': record.get('accept_encoding'),
+        'time': record['time']
+    }
+
+
+def replay(client, records, concurrency=1, speedup=1.0):
+    """
+    Replay recorded requests
+    :param client: The client (InProcessClient or HttpClient)
+    :param records: The recorded requests, in order
+    :type records: list
+    :param concurrency: The number of concurrent clients
+    :type concurrency: int
+    :param speedup: The factor by which to compress the recorded inter-arrival times (0 for no delays)
+    :type speedup: float
+    :return: The replay results
+    :rtype: dict
+    """
+    # Requests whose body was not recorded cannot be replayed
+    scenarios = [to_scenario(r) for r in records if r['body'] is not None or r['method'] == 'GET']
+    skipped = len(records) - len(scenarios)
+    before = cache_counts(client)
+
+    pending = queue.Queue()
+    lock = threading.Lock()
+    latencies = []
+    lags = []
+    paths = {}
+    errors = [0]
+
+    def work():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            scenario, scheduled = item
+            start = default_timer()
+            try:
+                status = client.request(scenario)
+            except Exception:
+                status = 599
+            elapsed = default_timer() - start
+            with lock:
+                latencies.append(elapsed)
+                lags.append(max(0.0, start - scheduled))
+                stats = paths.setdefault(scenario['name'], {'requests': 0, 'errors': 0})
+                stats['requests'] += 1
+                if status >= 400:
+                    errors[0] += 1
+                    stats['errors'] += 1
+
+    threads = [threading.Thread(target=work) for i in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    start = default_timer()
+    first = scenarios[0]['time'] if scenarios else 0.0
+    for scenario in scenarios:
+        scheduled = start
+        if speedup > 0:
+            scheduled = start + (scenario['time'] - first) / speedup
+            delay = scheduled - default_timer()
+            if delay > 0:
+                time.sleep(delay)
+        pending.put((scenario, scheduled))
+    for thread in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    duration = default_timer() - start
+    after = cache_counts(client)
+
+    cache_hit_ratio = None
+    if before is not None and after is not None:
+        hits, misses = after[0] - before[0], after[1] - before[1]
+        if hits + misses > 0:
+            cache_hit_ratio = round(hits / (hits + misses), 4)
+
+    latencies.sort()
+    lags.sort()
+
+    def ms(value):
+        return None if value is None else round(value * 1000.0, 3)
+
+    return {
+        'requests': len(latencies),
+        'skipped': skipped,
+        'errors': errors[0],
+        'error_rate': round(float(errors[0]) / len(latencies), 4) if latencies else None,
+        'duration_s': round(duration, 3),
+        'rps': round(len(latencies) / duration, 3) if duration > 0 else None,
+        'latency_ms': dict(('p{0}'.format(p), ms(percentile(latencies, p))) for p in (50, 90, 95, 99, 100)),
+        'max_lag_ms': ms(lags[-1] if lags else None),
+        'cache_hit_ratio': cache_hit_ratio,
+        'paths': paths
+    }
+
+
+def main(argv=None):
+    """
+    Replay command line entry point
+    :param argv: The command line arguments (defaults to sys.argv)
+    :type argv: list
+    :return: The exit status
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description='Replay recorded requests against an oemicroservices instance')
+    parser.add_argument('logs', nargs='+', help='Request logs recorded with RECORD_REQUESTS')
+    parser.add_argument('--url', help='Base URL of the server (default: in-process Flask test client)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--speedup', type=float, default=1.0,
+                        help='Divide recorded inter-arrival times by this factor (0 for no delays)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    options = parser.parse_args(argv)
+
+    # Merge the logs of several server processes by time
+    records = []
+    for path in options.logs:
+        records.extend(read_log(path))
+    records.sort(key=lambda r: r['time'])
+
+    client = HttpClient(options.url) if options.url else InProcessClient()
+    results = replay(client, records, options.concurrency, options.speedup)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(text)
+    sys.stdout.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# Slow request reproduction for oemicroservices
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# Re-run a request captured with SLOW_REQUESTS = True in isolation, under cProfile:
+#
+#   python -m oemicroservices.reproduce slow-requests/20151020T101500-moleculedepictor-1a2b3c4d.json --top 30
+#
+# The request is run through the in-process Flask test client with the worker pools disabled, so that the toolkit
+# calls are profiled on this thread. The report compares the stage timings of the run with those of the capture.
+
+import argparse
+import cProfile
+import pstats
+import sys
+from timeit import default_timer
+
+from oemicroservices.common.spool import read_capture
+
+if sys.version_info < (3,):
+    from urllib import urlencode
+else:
+    from urllib.parse import urlencode
+
+
+def isolate(app):
+    """
+    Configure the application to run requests on the calling thread, without recording or capturing them
+    :param app: The Flask application
+    :type app: Flask
+    """
+    app.config['TESTING'] = True
+    app.extensions.pop('pools', None)
+    if 'slow_requests' in app.extensions:
+        app.extensions['slow_requests'].threshold = float('inf')
+    if 'recorder' in app.extensions:
+        app.extensions['recorder'].sample = 0.0
+
+
+def reproduce(app, capture, profiler=None):
+    """
+    Re-run a captured request
+    :param app: The Flask application
+    :type app: Flask
+    :param capture: The capture (see read_capture)
+    :type capture: dict
+    :param profiler: The profiler to enable around the request (optional)
+    :type profiler: cProfile.Profile
+    :return: The response and the elapsed time in seconds
+    :rtype: tuple
+    """
+    if capture['body'] is None and capture['method'] != 'GET':
+        raise Exception("The request body of size {0} was not captured".format(capture['size']))
+    path = capture['path']
+    if capture['args']:
+        path += '?' + urlencode(capture['args'], doseq=True)
+    headers = {'content-type': capture['content_type']} if capture['content_type'] else {}
+    client = app.test_client()
+    start = default_timer()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        response = client.open(path, method=capture['method'], data=capture['body'], headers=headers)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    return response, default_timer() - start
+
+
+def main(argv=None):
+    """
+    Reproduction command line entry point
+    :param argv: The command line arguments (defaults to sys.argv)
+    :type argv: list
+    :return: The exit status
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description='Re-run a captured slow request under the profiler')
+    parser.add_argument('capture', help='Request captured with SLOW_REQUESTS')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of times to run the request')
+    parser.add_argument('--top', type=int, default=25, help='Number of functions to report')
+    parser.add_argument('--sort', default='tottime', help='Profile sort key (e.g. tottime, cumulative)')
+    parser.add_argument('--output', help='Write the raw profile to this file (e.g. for snakeviz)')
+    parser.add_argument('--no-profile', action='store_true', help='Only time the request')
+    options = parser.parse_args(argv)
+
+    capture = read_capture(options.capture)
+    # Imported here so that the capture can be read without the toolkits
+    from oemicroservices.api import app
+    isolate(app)
+
+    profiler = None if options.no_profile else cProfile.Profile()
+    out = sys.stdout
+    out.write('{0} {1} ({2}, {3} bytes)\n'.format(
+        capture['method'], capture['path'], capture['endpoint'], capture['size']))
+    out.write('captured: status {0} in {1:.1f} ms\n'.format(capture['status'], capture['duration'] * 1000.0))
+    if capture.get('stages'):
+        out.write('  stages: {0}\n'.format(
+            ', '.join('{0}={1:.1f}ms'.format(k, v * 1000.0) for k, v in capture['stages'].items())))
+    for i in range(max(1, options.repeat)):
+        response, elapsed = reproduce(app, capture, profiler)
+        out.write('run {0}: status {1} in {2:.1f} ms\n'.format(i + 1, response.status_code, elapsed * 1000.0))
+        if response.headers.get('Server-Timing'):
+            out.write('  Server-Timing: {0}\n'.format(response.headers['Server-Timing']))
+
+    if profiler is not None:
+        if options.output:
+            profiler.dump_stats(options.output)
+        out.write('\n')
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats(options.sort).print_stats(options.top)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
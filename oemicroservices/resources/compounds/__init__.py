@@ -0,0 +1 @@
+# Initialization for oemicroservices.compounds
@@ -0,0 +1,195 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import time
+
+from flask.ext.restful import Resource, request
+from flask import current_app
+
+from oemicroservices.common.admission import ServiceOverloaded, overloaded_response
+from oemicroservices.common.compounds import parse_compounds
+from oemicroservices.common.schema import Arg, QuerySchema
+from oemicroservices.common.transport import encode_response, response_mimetype
+from oemicroservices.common.metrics import stage
+from oemicroservices.common.pool import DeadlineExceeded, deadline_response, run_in_pool
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   CompoundList                                                       #
+#                                       Count or upload the searchable compounds                                       #
+#                                                                                                                      #
+# A POST uploads a molecule file (raw, or gzipped with gz=true) in the given format and returns the number of          #
+# compounds added. Compounds are identified by the COMPOUND_ID_TAG SD tag or their title, and replace any compound     #
+# with the same ID. Uploads are disabled unless COMPOUND_UPLOAD_TOKEN is set, and must send it in the X-Upload-Token   #
+# header. Uploads larger than COMPOUND_MAX_UPLOAD bytes (before or after decompression) are rejected, and the file is  #
+# parsed on the worker pools. The compounds are only added to the store of the server process that receives them.      #
+########################################################################################################################
+
+upload_args = QuerySchema(
+    # The file format of the uploaded compounds
+    Arg('format', str),
+    # If the upload is gzipped
+    Arg('gz', bool, False)
+)
+
+
+class CompoundList(Resource):
+    """
+    Count or upload the searchable compounds
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(CompoundList, self).__init__()
+
+    def get(self):
+        """
+        Count the compounds
+        :return: A Flask Response with the number of compounds
+        :rtype: Response
+        """
+        return encode_response({'compounds': len(current_app.extensions['compounds'].store)})
+
+    def post(self):
+        """
+        Upload compounds
+        :return: A Flask Response with the number of compounds added
+        :rtype: Response
+        """
+        compounds = current_app.extensions['compounds']
+        if not compounds.upload_token:
+            return encode_response({"error": "Compound uploads are disabled"}, 403)
+        if request.headers.get('X-Upload-Token') != compounds.upload_token:
+            return encode_response({"error": "Compound uploads require a valid X-Upload-Token"}, 403)
+        # Check the declared size before the body is read
+        if (request.content_length or 0) > compounds.max_upload:
+            return encode_response({"error": "Uploads are limited to {0} bytes".format(compounds.max_upload)}, 413)
+        args = upload_args.parse()
+        try:
+            if not args['format']:
+                raise Exception("No compound format provided")
+            data = request.get_data()
+            if len(data) > compounds.max_upload:
+                return encode_response({"error": "Uploads are limited to {0} bytes".format(compounds.max_upload)}, 413)
+            added = compounds.add(run_in_pool(parse_compounds, (data, args['format'], args['gz'], compounds.id_tag,
+                                                                compounds.max_upload)))
+        # Reject the request if the worker pool is overloaded
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
+        except Exception as ex:
+            return encode_response({"error": str(ex)}, 400)
+        return encode_response({'added': added, 'compounds': len(compounds.store)})
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  CompoundSearch                                                      #
+#                                     Substructure search over the compound store                                      #
+#                                                                                                                      #
+# Expects a GET with the SMARTS pattern in the smarts query parameter, and optional offset and limit. Returns:         #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   results: [                                                                                                         #
+#     {                                                                                                                #
+#       id:         The compound ID                                                                                    #
+#       smiles:     The compound SMILES                                                                                #
+#       atoms:      The matched atom indices (in SMILES order) of each unique match                                    #
+#     }                                                                                                                #
+#   ],                                                                                                                 #
+#   next:           The offset of the next page, or null on the last page                                              #
+#   screened:       The number of compounds screened by fingerprint                                                    #
+#   candidates:     The number of compounds that passed the screen and were matched exactly                            #
+# }                                                                                                                    #
+#                                                                                                                      #
+# A page ends after limit results, after COMPOUND_MAX_SCREEN compounds have been screened or at the compoundsearch     #
+# deadline (WORKER_DEADLINES), whichever comes first, so a page may hold fewer results (or none) and still have a next #
+# offset. The page is complete before the response is sent. The results can be depicted by passing the SMILES as the   #
+# molecule and the SMARTS pattern as the highlight to /v1/depict/structure/smiles.                                     #
+########################################################################################################################
+
+search_args = QuerySchema(
+    # The SMARTS pattern
+    Arg('smarts', str),
+    # The position in the compound store to continue from (the next value of the previous page)
+    Arg('offset', int, 0),
+    # The maximum number of results
+    Arg('limit', int)
+)
+
+
+def _search_results(hits, limit, stats):
+    """
+    Take a page of search results
+    :param hits: The matching compounds (see CompoundStore.search)
+    :param limit: The maximum number of results
+    :type limit: int
+    :param stats: The search statistics (see CompoundStore.search), whose next offset is set when the page is full
+    :type stats: dict
+    :return: The results
+    """
+    count = 0
+    for position, compound_id, smiles, atoms in hits:
+        count += 1
+        yield {'id': compound_id, 'smiles': smiles, 'atoms': atoms}
+        if count == limit:
+            stats['next'] = position + 1
+            break
+
+
+class CompoundSearch(Resource):
+    """
+    Find the compounds that contain a substructure
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(CompoundSearch, self).__init__()
+
+    def get(self):
+        """
+        Search the compounds
+        :return: A Flask Response with a page of matching compounds
+        :rtype: Response
+        """
+        compounds = current_app.extensions['compounds']
+        args = search_args.parse()
+        limit = min(args['limit'] or compounds.page_size, compounds.max_page_size)
+        mimetype = response_mimetype()
+        stats = {}
+        try:
+            if not args['smarts']:
+                raise Exception("No SMARTS pattern provided")
+            if limit < 1:
+                raise Exception("The limit must be positive")
+            # Bound the work of each page, so that a rare substructure cannot scan the whole store in one request. The
+            # page is complete before the response is returned, so that it runs within the admission limit.
+            deadline = current_app.config.get('WORKER_DEADLINES', {}).get(request.endpoint)
+            hits = compounds.store.search(args['smarts'], args['offset'], stats, compounds.max_screen,
+                                          None if deadline is None else time.time() + deadline)
+        except Exception as ex:
+            return encode_response({"error": str(ex)}, 400)
+        with stage('search'):
+            results = list(_search_results(hits, limit, stats))
+        return encode_response({'results': results, 'next': stats['next'], 'screened': stats['screened'],
+                                'candidates': stats['candidates']}, 200, mimetype)
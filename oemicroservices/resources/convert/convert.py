@@ -19,27 +19,28 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import base64
 import json
-# noinspection PyUnresolvedReferences
-import sys
 
-from flask.ext.restful import Resource, request
-from flask import Response
-from openeye.oechem import *
+from flask.ext.restful import Resource
+from flask import current_app
 
-from oemicroservices.common.util import compress_string, read_molecule_from_string
-
-############################
-# Python 2/3 Compatibility #
-############################
-
-# To support unicode as UTF-8 in Python 2 and 3
-if sys.version_info < (3,):
-    def to_utf8(u):
-        return u.encode('utf-8')
-else:
-    def to_utf8(u):
-        return u
+from oemicroservices.library import convert
+from oemicroservices.common.jobs import run_chunk
+from oemicroservices.common.admission import ServiceOverloaded, get_request_cost, overloaded_response
+from oemicroservices.common.pool import DeadlineExceeded, deadline_response, run_in_pool
+from oemicroservices.common.cache import negative_cache
+from oemicroservices.common.schema import BodySchema, Field, validate_molecules
+from oemicroservices.common.streaming import (
+    CHUNK_SIZE,
+    iter_base64_gzip,
+    iter_file,
+    iter_json_string,
+    remove_file,
+    spool_file,
+    stream_response)
+from oemicroservices.common.transport import encode_response, encode_results, is_binary, response_mimetype
+from oemicroservices.common.metrics import stage, record_formats
 
 ########################################################################################################################
 #                                                                                                                      #
@@ -71,9 +72,62 @@ else:
 #       gz:         If the output molecule string is gzip + b64 encoded                                                #
 #   }                                                                                                                  #
 # }                                                                                                                    #
+#                                                                                                                      #
+# The POST may also be sent as MessagePack (application/msgpack) or CBOR (application/cbor), and the response is sent  #
+# in either when the Accept header asks for it. Their molecule strings may be binary, and gzipped molecule strings are #
+# raw gzip rather than gzip + b64 encoded.                                                                             #
 ########################################################################################################################
 
 
+def stream_molecules():
+    """
+    Check whether the output molecule of the current request is written to a spool file and streamed, because the
+    input molecule is large
+    :return: True to stream the output
+    :rtype: bool
+    """
+    config = current_app.config
+    return config.get('STREAM_OUTPUTS', False) and get_request_cost().atoms >= config.get('STREAM_MIN_ATOMS', 0)
+
+
+def _stream_json(path, output_format, output_gz, chunk_size=CHUNK_SIZE):
+    """
+    Stream the JSON response of a molecule converted to a spool file
+    :param path: The spool file path
+    :type path: str
+    :param output_format: The output file format
+    :type output_format: str
+    :param output_gz: Whether to gzip and then base64 encode the molecule string
+    :type output_gz: bool
+    :param chunk_size: The size of the chunks read from the spool file
+    :type chunk_size: int
+    :return: The response chunks
+    """
+    yield b'{"molecule": {"value": '
+    chunks = iter_file(path, chunk_size)
+    if output_gz:
+        # Base64 needs no escaping in a JSON string
+        yield b'"'
+        for chunk in iter_base64_gzip(chunks):
+            yield chunk
+        yield b'"'
+    else:
+        for chunk in iter_json_string(chunks):
+            yield chunk
+    yield ', "format": {0}, "gz": {1}}}}}'.format(json.dumps(output_format), json.dumps(output_gz)).encode('utf-8')
+
+
+# The JSON POST of the MoleculeConvert
+convert_schema = BodySchema(
+    Field('molecule', "No molecule information provided"),
+    Field('molecule.value', "No molecule file provided"),
+    Field('molecule.input', "No input information provided"),
+    Field('molecule.input.format', "No input format provided"),
+    Field('molecule.output', "No output information provided"),
+    Field('molecule.output.format', "No output format provided")
+)
+
+
 class MoleculeConvert(Resource):
     """
     Convert between molecule file formats
@@ -83,29 +137,6 @@ class MoleculeConvert(Resource):
         # Initialize superclass
         super(MoleculeConvert, self).__init__()
 
-    # noinspection PyMethodMayBeStatic
-    def __validate_schema(self, obj):
-        """
-        Validate schema for JSON POST'ed to the resource
-        :param obj: The parsed JSON object POST'ed to this resource
-        """
-        if not obj:
-            raise Exception("No POST data received")
-        if not isinstance(obj, dict):
-            raise Exception("Unexpected POST data received")
-        if 'molecule' not in obj:
-            raise Exception("No molecule information provided")
-        if 'value' not in obj['molecule']:
-            raise Exception("No molecule file provided")
-        if 'input' not in obj['molecule']:
-            raise Exception("No input information provided")
-        if 'format' not in obj['molecule']['input']:
-            raise Exception("No input format provided")
-        if 'output' not in obj['molecule']:
-            raise Exception("No output information provided")
-        if 'format' not in obj['molecule']['output']:
-            raise Exception("No output format provided")
-
     def post(self):
         """
         Convert a molecule to another file format
@@ -115,44 +146,131 @@ class MoleculeConvert(Resource):
         # Parse the query options
         try:
             # We exepct a JSON object in request.data with the protein and ligand data structures
-            payload = json.loads(request.data.decode("utf-8"))
-            # Checks to make sure we have everything we need in payload
-            self.__validate_schema(payload)
-            # Read the molecule
-            mol = read_molecule_from_string(
-                payload['molecule']['value'],
-                payload['molecule']['input']['format'],
-                payload['molecule']['input']['gz'] if 'gz' in payload['molecule']['input'] else False,
-                payload['molecule']['input']['reparse'] if 'reparse' in payload['molecule']['input'] else False
-            )
-
-            # Prepare the molecule for writing
-            ofs = oemolostream()
-            if payload['molecule']['output']['format'] == "smiles":
-                ofs_format = OEFormat_SMI
-            else:
-                ofs_format = OEGetFileType(to_utf8(payload['molecule']['output']['format']))
-            if ofs_format == OEFormat_UNDEFINED:
-                raise Exception("Unknown output file type: " + payload['molecule']['output']['format'])
-            ofs.SetFormat(ofs_format)
-            ofs.openstring()
-            OEWriteMolecule(ofs, mol)
-
-            # Get molecule output stream
-            if 'gz' in payload['molecule']['output'] and payload['molecule']['output']['gz']:
-                output = compress_string(ofs.GetString().decode('utf-8'))
-            else:
-                output = ofs.GetString().decode('utf-8')
-
-            return Response(json.dumps(
+            with stage('decode'):
+                payload = convert_schema.parse()
+            record_formats(payload['molecule']['input']['format'], payload['molecule']['output']['format'])
+            # Convert the molecule in the worker pool
+            mol_input = payload['molecule']['input']
+            mol_output = payload['molecule']['output']
+            reparse = mol_input['reparse'] if 'reparse' in mol_input else False
+            gz = mol_input['gz'] if 'gz' in mol_input else False
+            output_gz = mol_output['gz'] if 'gz' in mol_output else False
+            kwargs = {'fmt': mol_input['format'], 'gz': gz, 'reparse': reparse, 'output_gz': output_gz}
+            mimetype = response_mimetype()
+            with negative_cache(payload['molecule']['value'], mol_input['format'], gz, reparse):
+                # Large molecules are written to a spool file by the worker and streamed from it as JSON
+                if stream_molecules() and not is_binary(mimetype):
+                    path = spool_file(current_app.config.get('STREAM_DIR'))
+                    kwargs.update(output_gz=False, filename=path)
+                    try:
+                        run_in_pool(convert, (payload['molecule']['value'], mol_output['format']), bool(reparse),
+                                    kwargs)
+                    except Exception:
+                        remove_file(path)
+                        raise
+                    chunks = _stream_json(path, mol_output['format'], output_gz,
+                                          current_app.config.get('STREAM_CHUNK_SIZE', CHUNK_SIZE))
+                    return stream_response(path, chunks, 'application/json')
+                output = run_in_pool(convert, (payload['molecule']['value'], mol_output['format']), bool(reparse),
+                                     kwargs)
+            # Binary responses carry the molecule string as bytes, and a gzipped molecule string as raw gzip
+            if is_binary(mimetype):
+                output = base64.b64decode(output) if output_gz else output.encode('utf-8')
+            return encode_response(
                 {
                     'molecule': {
                         'value': output,
-                        'format': payload['molecule']['output']['format'],
-                        'gz': payload['molecule']['output']['gz'] if 'gz' in payload['molecule']['output'] else False
+                        'format': mol_output['format'],
+                        'gz': output_gz
                     }
-                }
-            ), status=200, mimetype='application/json')
+                },
+                200,
+                mimetype
+            )
+
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
+        except Exception as ex:
+            return encode_response({"error": str(ex)}, 400)
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                               MoleculeConvertBatch                                                   #
+#                                   Convert a batch of molecules in a single request                                   #
+#                                                                                                                      #
+# Expects a POST (JSON, MessagePack or CBOR):                                                                          #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   molecules: [                                                                                                       #
+#     {                                                                                                                #
+#       value:      The molecule file string (*Required)                                                               #
+#       format:     The file format of the molecule string (*Required)                                                 #
+#       gz:         If the molecule string is gzipped (gzip + b64 encoded in JSON, raw gzip otherwise)                 #
+#     }                                                                                                                #
+#   ],                                                                                                                 #
+#   output: {                                                                                                          #
+#     format:       The output file format (*Required)                                                                 #
+#     gz:           If the output molecule strings should be gzipped                                                   #
+#   },                                                                                                                 #
+#   reparse:        Reparse connectivity, bond orders, stereo, etc.                                                    #
+# }                                                                                                                    #
+#                                                                                                                      #
+# Returns the following, in the format asked for by the Accept header:                                                 #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   results: [                                                                                                         #
+#     {                                                                                                                #
+#       value:      The output molecule string (bytes in MessagePack and CBOR), or null on error                       #
+#       error:      Why the molecule failed, if it did                                                                 #
+#     }                                                                                                                #
+#   ]                                                                                                                  #
+# }                                                                                                                    #
+########################################################################################################################
+
+# The POST of the MoleculeConvertBatch
+convert_batch_schema = BodySchema(
+    Field('molecules', "No molecules provided"),
+    Field('output', "No output information provided"),
+    Field('output.format', "No output format provided")
+)
+
+
+class MoleculeConvertBatch(Resource):
+    """
+    Convert a batch of molecules to another file format
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(MoleculeConvertBatch, self).__init__()
+
+    def post(self):
+        """
+        Convert a batch of molecules to another file format
+        :return: A Flask Response with the converted molecules
+        :rtype: Response
+        """
+        try:
+            with stage('decode'):
+                payload = convert_batch_schema.parse()
+            validate_molecules(payload['molecules'], current_app.config.get('BATCH_MAX_MOLECULES', 1000))
+            record_formats(payload['molecules'][0]['format'], payload['output']['format'])
+            # Convert the molecules in a single worker call
+            reparse = bool(payload.get('reparse', False))
+            results = run_in_pool(run_chunk, ('convert', {'output': payload['output'], 'reparse': reparse},
+                                              payload['molecules']), reparse)
+            return encode_results(results, text=True, gz=bool(payload['output'].get('gz', False)))
 
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
         except Exception as ex:
-            return Response(json.dumps({"error": str(ex)}), status=400, mimetype='application/json')
+            return encode_response({"error": str(ex)}, 400)
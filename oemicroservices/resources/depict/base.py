@@ -19,7 +19,16 @@
 # specific language governing permissions and limitations
 # under the License.
 
-from flask.ext.restful import reqparse
+import base64
+
+from flask import Response, current_app
+
+from oemicroservices.library import get_image_mime_type
+from oemicroservices.common.cache import ERROR_IMAGE_CACHE
+from oemicroservices.common.pool import run_in_pool
+from oemicroservices.common.streaming import file_response, remove_file, spool_file, stream_images
+from oemicroservices.common.schema import Arg, QuerySchema
+from oemicroservices.common.transport import encode_response, is_binary, response_mimetype
 
 ########################################################################################################################
 #                                                                                                                      #
@@ -27,22 +36,152 @@ from flask.ext.restful import reqparse
 #                                                                                                                      #
 ########################################################################################################################
 
-depictor_base_arg_parser = reqparse.RequestParser()
-# If we should reparse connectivity, aromaticity, stereochemistry, hydrogens and formal charges
-depictor_base_arg_parser.add_argument('reparse', type=bool, default=False, location='args')
-# If we should keep the molecule title (if using an SDF or other file format with titles)
-depictor_base_arg_parser.add_argument('keeptitle', type=bool, default=False, location='args')
-# The title location (top or bottom), if we have a title
-depictor_base_arg_parser.add_argument('titleloc', type=str, default='top', location='args')
-# The image format (png, svg, pdf, etc.)
-depictor_base_arg_parser.add_argument('format', type=str, default='png', location='args')
-# The molecule title
-depictor_base_arg_parser.add_argument('title', type=str, default='', location='args')
-# If the molecule is gzipped then base64 encoded
-depictor_base_arg_parser.add_argument('gz', type=bool, default=False, location='args')
-# Bond scales with the size of the image
-depictor_base_arg_parser.add_argument('scalebonds', type=bool, default=False, location='args')
-# Background color of image
-depictor_base_arg_parser.add_argument('background', type=str, default="#ffffff00", location='args')
-# Debug mode
-depictor_base_arg_parser.add_argument('debug', type=bool, default=False, location='args')
+depictor_base_args = QuerySchema(
+    # If we should reparse connectivity, aromaticity, stereochemistry, hydrogens and formal charges
+    Arg('reparse', bool, False),
+    # If we should keep the molecule title (if using an SDF or other file format with titles)
+    Arg('keeptitle', bool, False),
+    # The title location (top or bottom), if we have a title
+    Arg('titleloc', str, 'top'),
+    # The image format (png, svg, pdf, etc.), or a comma separated list of formats
+    Arg('format', str, 'png'),
+    # The molecule title
+    Arg('title', str, ''),
+    # If the molecule is gzipped then base64 encoded
+    Arg('gz', bool, False),
+    # Bond scales with the size of the image
+    Arg('scalebonds', bool, False),
+    # Background color of image
+    Arg('background', str, "#ffffff00"),
+    # Debug mode
+    Arg('debug', bool, False)
+)
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  Utility Functions                                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+
+def select_options(args, defaults):
+    """
+    Select the library options from the parsed URL query string
+    :param args: The parsed URL query string dictionary
+    :type args: dict
+    :param defaults: The library option defaults (e.g. oemicroservices.library.DEPICT_OPTIONS)
+    :type defaults: dict
+    :return: The library options
+    :rtype: dict
+    """
+    return dict((key, args[key]) for key in defaults)
+
+
+def image_response(func, args, reparse, options, image_format):
+    """
+    Render an image in the worker pool. Formats that can be large (e.g. PDF) are written to a spool file by the worker
+    and streamed from it, rather than held in memory.
+    :param func: The library function that renders the image
+    :param args: The function arguments
+    :type args: tuple
+    :param reparse: If the molecules are reparsed (see run_in_pool)
+    :type reparse: bool
+    :param options: The function keyword arguments
+    :type options: dict
+    :param image_format: The image format
+    :type image_format: str
+    :return: An HTTP response with the image
+    :rtype: Response
+    """
+    mimetype = get_image_mime_type(image_format)
+    if not stream_images(image_format):
+        return Response(run_in_pool(func, args, reparse, options), mimetype=mimetype)
+    path = spool_file(current_app.config.get('STREAM_DIR'))
+    try:
+        options = dict(options)
+        options['filename'] = path
+        run_in_pool(func, args, reparse, options)
+    except Exception:
+        remove_file(path)
+        raise
+    return file_response(path, mimetype)
+
+
+def get_image_formats(image_format):
+    """
+    Split the format query parameter into its image formats
+    :param image_format: An image format, or a comma separated list of image formats
+    :type image_format: str
+    :return: The image formats
+    :rtype: list
+    """
+    return [fmt.strip() for fmt in image_format.split(',') if fmt.strip()]
+
+
+def images_response(func, args, reparse, options):
+    """
+    Render a molecule in several image formats in the worker pool. The images are returned together as
+    {"images": {format: image}}, base64 encoded in JSON or as bytes in MessagePack and CBOR.
+    :param func: The library function that renders the images, returning them by image format
+    :param args: The function arguments
+    :type args: tuple
+    :param reparse: If the molecules are reparsed (see run_in_pool)
+    :type reparse: bool
+    :param options: The function keyword arguments
+    :type options: dict
+    :return: An HTTP response with the images
+    :rtype: Response
+    """
+    mimetype = response_mimetype()
+    images = run_in_pool(func, args, reparse, options)
+    if not is_binary(mimetype):
+        images = dict((fmt, base64.b64encode(image).decode('ascii')) for fmt, image in images.items())
+    return encode_response({'images': images}, 200, mimetype)
+
+
+def frames_response(func, args, reparse, options):
+    """
+    Depict the frames of a trajectory in the worker pool. The worker writes the JSON document (see
+    oemicroservices.common.frames) to a spool file one frame at a time, and it is streamed from the file, so that
+    neither process holds more than one frame in memory.
+    :param func: The library function that writes the frames to a file
+    :param args: The function arguments
+    :type args: tuple
+    :param reparse: If the molecules are reparsed (see run_in_pool)
+    :type reparse: bool
+    :param options: The function keyword arguments
+    :type options: dict
+    :return: An HTTP response with the JSON document
+    :rtype: Response
+    """
+    path = spool_file(current_app.config.get('STREAM_DIR'))
+    try:
+        options = dict(options)
+        options.update(filename=path, max_frames=current_app.config.get('FRAMES_MAX'))
+        run_in_pool(func, args, reparse, options)
+    except Exception:
+        remove_file(path)
+        raise
+    return file_response(path, 'application/json')
+
+
+def error_image_response(width, height, message):
+    """
+    Render a PNG with an error message
+    :param width: The image width
+    :type width: int or float
+    :param height: The image height
+    :type height: int or float
+    :param message: The error text to put on the image
+    :type message: str
+    :return: An HTTP response with the error image
+    :rtype: Response
+    """
+    key = (width, height, message)
+    image = ERROR_IMAGE_CACHE.get(key)
+    if image is None:
+        # Imported here so that the toolkits are loaded on first use
+        from oemicroservices.common.util import render_error_image
+        image = render_error_image(width, height, message)
+        ERROR_IMAGE_CACHE.put(key, image)
+    return Response(image, mimetype='image/png')
@@ -22,21 +22,29 @@
 import json
 
 from flask.ext.restful import Resource, request
-from flask import Response
-from openeye.oechem import *
-from openeye.oedepict import *
-from openeye.oegrapheme import *
-
-from openeye.oedocking import *
-
-from oemicroservices.resources.depict.base import depictor_base_arg_parser
-from oemicroservices.common.functor import generate_ligand_functor
-from oemicroservices.common.util import (
-    render_error_image,
-    get_image_mime_type,
-    get_color_from_rgba,
-    get_title_location,
-    read_molecule_from_string)
+from flask import Response, current_app
+
+from oemicroservices.library import (
+    INTERACTION_OPTIONS,
+    depict_interaction,
+    depict_interaction_frames,
+    depict_complex,
+    depict_complex_frames,
+    depict_target_interaction,
+    reparse_mode)
+from oemicroservices.resources.depict.base import (
+    depictor_base_args,
+    error_image_response,
+    frames_response,
+    image_response,
+    select_options)
+from oemicroservices.common.admission import ServiceOverloaded, overloaded_response
+from oemicroservices.common.pool import DeadlineExceeded, deadline_response
+from oemicroservices.common.cache import negative_cache
+from oemicroservices.common.receptors import RECEPTORS
+from oemicroservices.common.schema import Arg, BodySchema, Field
+from oemicroservices.common.metrics import stage, record_formats
+from oemicroservices.common.transport import encode_response
 
 ########################################################################################################################
 #                                                                                                                      #
@@ -44,109 +52,98 @@ from oemicroservices.common.util import (
 #                                                                                                                      #
 ########################################################################################################################
 
-# Extend the standard image_parser
-interaction_arg_parser = depictor_base_arg_parser.copy()
-# The image width
-interaction_arg_parser.add_argument('width', type=int, default=800, location='args')
-# The image height
-interaction_arg_parser.add_argument('height', type=int, default=600, location='args')
-# Include a legend with the image
-interaction_arg_parser.add_argument('legend', type=bool, default=True, location='args')
-
-# Parameters for POST: Find the ligand
-interaction_arg_parser.add_argument('chain', type=str, location='args')  # Ligand chain ID
-interaction_arg_parser.add_argument('resi', type=int, location='args')   # Ligand residue number
-interaction_arg_parser.add_argument('resn', type=str, location='args')   # Ligand residue name
-
-########################################################################################################################
-#                                                                                                                      #
-#                                                  Utility Functions                                                   #
-#                                                                                                                      #
-########################################################################################################################
+# Extend the standard image arguments
+interaction_args = depictor_base_args.extend(
+    # The image width
+    Arg('width', int, 800),
+    # The image height
+    Arg('height', int, 600),
+    # Include a legend with the image
+    Arg('legend', bool, True),
+    # Reparse modes of the ligand and receptor (true, false, geometry or template), instead of reparse
+    Arg('ligandreparse', reparse_mode),
+    Arg('receptorreparse', reparse_mode),
+    # Parameters for POST: Find the ligand
+    Arg('chain', str),  # Ligand chain ID
+    Arg('resi', int),   # Ligand residue number
+    Arg('resn', str)    # Ligand residue name
+)
+
+# The JSON POST of the InteractionDepictor
+interaction_schema = BodySchema(
+    Field('ligand', "No ligand data provided in POST"),
+    Field('ligand.value', "No value for ligand file provided in POST"),
+    Field('ligand.format', "No format for ligand file provided in POST"),
+    Field('receptor', "No receptor data provided in POST")
+)
+
+# The receptor of the InteractionDepictor, when it is not a receptor of the receptor library
+receptor_schema = BodySchema(
+    Field('value', "No value for receptor file provided in POST"),
+    Field('format', "No format for receptor file provided in POST")
+)
+
+
+def get_reparse(part, query, default):
+    """
+    Get the reparse mode of the ligand or receptor of a JSON POST
+    :param part: The ligand or receptor of the JSON POST
+    :type part: dict
+    :param query: The reparse mode of the part in the query string (None if not given)
+    :type query: str
+    :param default: The reparse option of both parts in the query string
+    :type default: bool
+    :return: The reparse mode (False to not reparse)
+    :rtype: str
+    """
+    if 'reparse' in part:
+        return reparse_mode(part['reparse'])
+    return reparse_mode(default if query is None else query)
 
 
-def _render_image(receptor, ligand, args):
+def get_interaction_options(payload, args):
+    """
+    Get the library options of a JSON POST with a receptor and ligand file
+    :param payload: The JSON POST
+    :type payload: dict
+    :param args: The query options
+    :type args: dict
+    :return: The library options
+    :rtype: dict
+    """
+    receptor_schema.validate(payload['receptor'])
+    record_formats(payload['ligand']['format'], args['format'])
+    record_formats(payload['receptor']['format'])
+    options = select_options(args, INTERACTION_OPTIONS)
+    options.update(
+        receptor_format=payload['receptor']['format'],
+        ligand_format=payload['ligand']['format'],
+        receptor_gz=payload['receptor'].get('gz', False),
+        ligand_gz=payload['ligand'].get('gz', False),
+        receptor_reparse=get_reparse(payload['receptor'], args['receptorreparse'], args['reparse']),
+        ligand_reparse=get_reparse(payload['ligand'], args['ligandreparse'], args['reparse']))
+    return options
+
+
+def get_complex_options(fmt, args):
     """
-    Render a receptor-ligand interaction image
-    :param receptor: The receptor
-    :type receptor OEMol
-    :param ligand: The bound ligand
-    :type ligand: OEMol
-    :param args: The parsed URL query string dictionary
+    Get the library options of a POST of a receptor-ligand complex
+    :param fmt: The file format of the complex
+    :type fmt: str
+    :param args: The query options
     :type args: dict
-    :return: A Flask Response with the rendered image
-    :rtype: Response
+    :return: The library options
+    :rtype: dict
     """
-    # *********************************************************************
-    # *                      Parse Parameters                             *
-    # *********************************************************************
-    width = args['width']                                       # Image width
-    height = args['height']                                     # Image height
-    title = args['title']                                       # Image title
-    use_molecule_title = bool(args['keeptitle'])                # Use the molecule title in the molecule file
-    bond_scaling = bool(args['scalebonds'])                      # Bond width scales with size
-    image_format = args['format']                               # The output image format
-    image_mimetype = get_image_mime_type(image_format)          # MIME type corresponding to the image format
-    title_location = get_title_location(args['titleloc'])       # The OpenEye title location (if we have a title)
-    legend = bool(args['legend'])                               # Display a legend
-    background = get_color_from_rgba(args['background'])        # Background color
-
-    # Make sure we got valid inputs
-    if not image_mimetype:
-        raise Exception("Invalid MIME type")
-
-    if not title_location:
-        title_location = OETitleLocation_Top
-    # *********************************************************************
-    # *                      Create the Image                             *
-    # *********************************************************************
-    image = OEImage(width, height)
-    # Compute the image frame sizes
-    cwidth = width if legend == 0 else 0.80 * width
-    lwidth = width if legend == 0 else 0.20 * width
-    loffset = 0.0 if legend == 0 else 0.8 * width
-    cframe = OEImageFrame(image, cwidth, height, OE2DPoint(0.0, 0.0))
-    lframe = OEImageFrame(image, lwidth, height, OE2DPoint(loffset, 0.0))
-    # Prepare the depiction
-    opts = OE2DActiveSiteDisplayOptions(cframe.GetWidth(), cframe.GetHeight())
-
-    # Additional visualization options
-    opts.SetBondWidthScaling(bond_scaling)
-    opts.SetBackgroundColor(background)
-
-    # Perceive interactions
-    asite = OEFragmentNetwork(receptor, ligand)
-
-    if not asite.IsValid():
-        raise Exception("The active site is not valid")
-
-    # Add optional title
-    if title:
-        asite.SetTitle(title)
-        opts.SetTitleLocation(title_location)
-    elif use_molecule_title:
-        asite.SetTitle(ligand.GetTitle())
-        opts.SetTitleLocation(title_location)
-    else:
-        asite.SetTitle("")
-        opts.SetTitleLocation(OETitleLocation_Hidden)
-
-    # Add interactions
-    OEAddDockingInteractions(asite)
-    OEPrepareActiveSiteDepiction(asite)
-
-    # Render the active site
-    adisp = OE2DActiveSiteDisplay(asite, opts)
-    OERenderActiveSite(cframe, adisp)
-
-    # Render the legend
-    if args['legend'] != 0:
-        lopts = OE2DActiveSiteLegendDisplayOptions(10, 1)
-        OEDrawActiveSiteLegend(lframe, adisp, lopts)
-
-    # Respond with the image
-    img_content = OEWriteImageToString(image_format, image)
-    return Response(img_content, mimetype=image_mimetype)
+    # Check the ligand selection before doing any work
+    if not (args['chain'] or args['resi'] or args['resn']):
+        raise Exception("No ligand selection options given")
+    record_formats(fmt, args['format'])
+    options = select_options(args, INTERACTION_OPTIONS)
+    options.update(gz=args['gz'], reparse=args['reparse'], chain=args['chain'], resi=args['resi'], resn=args['resn'],
+                   receptor_reparse=args['receptorreparse'], ligand_reparse=args['ligandreparse'])
+    return options
+
 
 ########################################################################################################################
 #                                                                                                                      #
@@ -160,14 +157,23 @@ def _render_image(receptor, ligand, args):
 #     value:  A string that contains the ligand structure                                                              #
 #     format: The file format of the ligand string (e.g. sdf, pdb, oeb, etc.)                                          #
 #     gz:     If the ligand string is gzipped and then b64 encoded                                                     #
+#     reparse: The reparse mode of the ligand (true, false, geometry or template), instead of the query options        #
 #   },                                                                                                                 #
 #   receptor: {                                                                                                        #
 #     value:  A string that contains the receptor structure                                                            #
 #     format: The file format of the receptor string (e.g. sdf, pdb, oeb, egc.)                                        #
 #     gz:     If the receptor string is gzipped and then b64 encoded                                                   #
+#     reparse: The reparse mode of the receptor. template bonds the amino acids from residue templates, which is much  #
+#              faster than perceiving the bonds of the whole receptor from its geometry (true or geometry).            #
 #   }                                                                                                                  #
 # }                                                                                                                    #
 #                                                                                                                      #
+# Or, to depict the pocket of a receptor of the receptor library (see RECEPTOR_DIR) around the ligand:                 #
+#                                                                                                                      #
+#   receptor: {                                                                                                        #
+#     name:   The receptor name                                                                                        #
+#   }                                                                                                                  #
+#                                                                                                                      #
 ########################################################################################################################
 
 
@@ -180,32 +186,6 @@ class InteractionDepictor(Resource):
         # Call the superclass initializers
         super(InteractionDepictor, self).__init__()
 
-    # noinspection PyMethodMayBeStatic
-    def __validate_schema(self, obj):
-        """
-        Validate schema for JSON POST'ed to the resource
-        :param obj: The parsed JSON object
-        """
-        # Check data
-        if not obj:
-            raise Exception("No POST data received")
-        if not isinstance(obj, dict):
-            raise Exception("Unexpected POST data received")
-        # Check ligand
-        if 'ligand' not in obj:
-            raise Exception("No ligand data provided in POST")
-        if 'value' not in obj['ligand']:
-            raise Exception("No value for ligand file provided in POST")
-        if 'format' not in obj['ligand']:
-            raise Exception("No format for ligand file provided in POST")
-        # Check receptor
-        if 'receptor' not in obj:
-            raise Exception("No receptor data provided in POST")
-        if 'value' not in obj['receptor']:
-            raise Exception("No value for receptor file provided in POST")
-        if 'format' not in obj['receptor']:
-            raise Exception("No format for receptor file provided in POST")
-
     def post(self):
         """
         Render JSON that has been POST'ed to this resource
@@ -213,49 +193,91 @@ class InteractionDepictor(Resource):
         :rtype: Response
         """
         # Parse the query options
-        args = interaction_arg_parser.parse_args()
+        args = interaction_args.parse()
         try:
             # We exepct a JSON object in request.data with the protein and ligand data structures
-            payload = json.loads(request.data.decode("utf-8"))
-            self.__validate_schema(payload)
-
-            # Try to read the ligand from the payload
-            try:
-                ligand = read_molecule_from_string(
-                    payload['ligand']['value'],
-                    payload['ligand']['format'],
-                    payload['ligand']['gz'] if 'gz' in payload['ligand'] else False,
-                    args['reparse']
-                )
-            except Exception as ex:
-                message = "Error reading ligand"
-                if args['debug']:
-                    message += ": {0}".format(str(ex))
-                raise Exception(message)
-
-            # Try to read the receptor from the payload
-            try:
-                receptor = read_molecule_from_string(
-                    payload['receptor']['value'],
-                    payload['receptor']['format'],
-                    payload['receptor']['gz'] if 'gz' in payload['receptor'] else False,
-                    args['reparse']
-                )
-            except Exception as ex:
-                message = "Error reading receptor"
-                if args['debug']:
-                    message += ": {0}".format(str(ex))
-                raise Exception(message)
-
-            # Render the image
-            return _render_image(receptor, ligand, args)
-
+            with stage('decode'):
+                payload = interaction_schema.parse()
+            receptor = payload['receptor']
+            if isinstance(receptor, dict) and 'name' in receptor:
+                return self.__depict_target(receptor['name'], payload['ligand'], args)
+            # Read the molecules and render the image in the worker pool
+            options = get_interaction_options(payload, args)
+            options['debug'] = args['debug']
+            with negative_cache(payload['receptor']['value'], options['receptor_format'], options['receptor_gz'],
+                                payload['ligand']['value'], options['ligand_format'], options['ligand_gz'],
+                                options['receptor_reparse'], options['ligand_reparse'], args['debug']):
+                # Only geometric perception of the receptor makes the request heavy
+                return image_response(depict_interaction, (payload['receptor']['value'], payload['ligand']['value']),
+                                      options['receptor_reparse'] == 'geometry', options, args['format'])
+
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
         # On error render a PNG with an error message
         except Exception as ex:
             if args['debug']:
                 return Response(json.dumps({"error": str(ex)}), status=400, mimetype='application/json')
             else:
-                return render_error_image(args['width'], args['height'], str(ex))
+                return error_image_response(args['width'], args['height'], str(ex))
+
+    # noinspection PyMethodMayBeStatic
+    def __depict_target(self, name, ligand, args):
+        """
+        Render the interactions of a ligand with a receptor of the receptor library
+        :param name: The receptor name
+        :type name: str
+        :param ligand: The ligand of the JSON POST
+        :type ligand: dict
+        :param args: The query options
+        :type args: dict
+        :return: A Flask Response with the rendered image
+        :rtype: Response
+        """
+        # Check the name here, since the worker would only fail after the ligand has been read
+        if RECEPTORS.get(name) is None:
+            raise Exception("Unknown receptor: {0}".format(name))
+        record_formats(ligand['format'], args['format'])
+        options = select_options(args, INTERACTION_OPTIONS)
+        options.update(
+            ligand_format=ligand['format'],
+            ligand_gz=ligand.get('gz', False),
+            reparse=get_reparse(ligand, args['ligandreparse'], args['reparse']),
+            debug=args['debug'])
+        with negative_cache(name, ligand['value'], options['ligand_format'], options['ligand_gz'], options['reparse'],
+                            args['debug']):
+            return image_response(depict_target_interaction, (name, ligand['value']), False, options, args['format'])
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                    ReceptorList                                                      #
+#                                     List the receptors of the receptor library                                       #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class ReceptorList(Resource):
+    """
+    List the receptors that interaction depictions can reference by name
+    """
+
+    def __init__(self):
+        # Call the superclass initializers
+        super(ReceptorList, self).__init__()
+
+    # noinspection PyMethodMayBeStatic
+    def get(self):
+        """
+        List the receptors
+        :return: A Flask Response with the receptor names
+        :rtype: Response
+        """
+        return encode_response({'receptors': RECEPTORS.names(), 'pocket_radius': RECEPTORS.pocket_radius})
+
 
 ########################################################################################################################
 #                                                                                                                      #
@@ -284,48 +306,130 @@ class FindLigandInteractionDepictor(Resource):
         :rtype: Response
         """
         # Parse the query options
-        args = interaction_arg_parser.parse_args()
+        args = interaction_args.parse()
         try:
-            # Try to read the receptor-ligand complex
-            try:
-                mol = read_molecule_from_string(
-                    request.data.decode("utf-8"),
-                    fmt,
-                    args['gz'],
-                    args['reparse']
-                )
-            except Exception as ex:
-                message = "Error reading molecule file"
-                if args['debug']:
-                    message += ": {0}".format(str(ex))
-                raise Exception(message)
-
-            # Generate the ligand selection functor
-            if args['chain'] or args['resi'] or args['resn']:
-                functor = generate_ligand_functor(args['chain'], args['resi'], args['resn'])
+            options = get_complex_options(fmt, args)
+            with stage('decode'):
+                mol_string = request.data.decode("utf-8")
+            # Read the complex and render the image in the worker pool
+            options.update(debug=args['debug'], prefilter=current_app.config.get('COMPLEX_PREFILTER_RADIUS'))
+            with negative_cache(mol_string, fmt, args['gz'], args['reparse'], args['receptorreparse'],
+                                args['ligandreparse'], args['debug']):
+                receptor_reparse = args['reparse'] if args['receptorreparse'] is None else args['receptorreparse']
+                return image_response(depict_complex, (mol_string, fmt), reparse_mode(receptor_reparse) == 'geometry',
+                                      options, args['format'])
+
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
+        except Exception as ex:
+            if args['debug']:
+                return Response(json.dumps({"error": str(ex)}), status=400, mimetype='application/json')
             else:
-                raise Exception("No ligand selection options given")
+                return error_image_response(args['width'], args['height'], str(ex))
 
-            # Split the ligand from the complex
-            ligand = OEGraphMol()
-            OESubsetMol(ligand, mol, functor, False, False)
 
-            # Check the ligand
-            if not ligand or ligand.NumAtoms() == 0:
-                raise Exception("No atoms matched ligand selection")
+########################################################################################################################
+#                                                                                                                      #
+#                                                  InteractionFrames                                                   #
+#                                Depict the interactions of each frame of a trajectory                                 #
+#                                                                                                                      #
+# Expects the JSON POST of the InteractionDepictor, with a receptor and/or ligand with several frames: the models of   #
+# a multi-model PDB file (e.g. an NMR ensemble or MD trajectory) or the conformers of a multi-conformer file. A        #
+# receptor or ligand with a single frame is used for every frame of the other. Returns a JSON document with the image  #
+# and interactions of each frame, and a summary of how often each receptor residue interaction occurs (see             #
+# oemicroservices.common.frames).                                                                                      #
+#                                                                                                                      #
+########################################################################################################################
 
-            # Delete the ligand from the complex
-            for atom in mol.GetAtoms(functor):
-                mol.DeleteAtom(atom)
 
-            # Error check receptor
-            if not mol or mol.NumAtoms() == 0:
-                raise Exception("No atoms in receptor")
+class InteractionFrames(Resource):
+    """
+    Generate a receptor-ligand interaction map for each frame of a receptor and ligand in a JSON object
+    """
 
-            return _render_image(mol, ligand, args)
+    def __init__(self):
+        # Call the superclass initializers
+        super(InteractionFrames, self).__init__()
 
+    # noinspection PyMethodMayBeStatic
+    def post(self):
+        """
+        Render each frame of the JSON that has been POST'ed to this resource
+        :return: A Flask Response with the frames
+        :rtype: Response
+        """
+        args = interaction_args.parse()
+        try:
+            with stage('decode'):
+                payload = interaction_schema.parse()
+            if isinstance(payload['receptor'], dict) and 'name' in payload['receptor']:
+                raise Exception("Receptors of the receptor library have no frames")
+            options = get_interaction_options(payload, args)
+            with negative_cache(payload['receptor']['value'], options['receptor_format'], options['receptor_gz'],
+                                payload['ligand']['value'], options['ligand_format'], options['ligand_gz'],
+                                options['receptor_reparse'], options['ligand_reparse']):
+                return frames_response(depict_interaction_frames,
+                                       (payload['receptor']['value'], payload['ligand']['value']),
+                                       options['receptor_reparse'] == 'geometry', options)
+
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
         except Exception as ex:
-            if args['debug']:
-                return Response(json.dumps({"error": str(ex)}), status=400, mimetype='application/json')
-            else:
-                return render_error_image(args['width'], args['height'], str(ex))
+            return encode_response({"error": str(ex)}, 400, 'application/json')
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                             FindLigandInteractionFrames                                              #
+#                       Finds the ligand in each frame of a complex and depicts the interactions                       #
+#                                                                                                                      #
+# The POST is the raw file of a ligand-receptor complex with several frames (e.g. a multi-model PDB file), with the    #
+# query options of the FindLigandInteractionDepictor. Returns the JSON document of the InteractionFrames.              #
+#                                                                                                                      #
+########################################################################################################################
+
+
+class FindLigandInteractionFrames(Resource):
+    """
+    Generate a receptor-ligand interaction map for each frame of a receptor-ligand complex
+    """
+
+    def __init__(self):
+        # Call the superclass initializers
+        super(FindLigandInteractionFrames, self).__init__()
+
+    # noinspection PyMethodMayBeStatic
+    def post(self, fmt):
+        """
+        Render each frame of a raw receptor-ligand complex that has been POST'ed to this resource
+        :return: A Flask Response with the frames
+        :rtype: Response
+        """
+        args = interaction_args.parse()
+        try:
+            options = get_complex_options(fmt, args)
+            with stage('decode'):
+                mol_string = request.data.decode("utf-8")
+            options['fmt'] = fmt
+            with negative_cache(mol_string, fmt, args['gz'], args['reparse'], args['receptorreparse'],
+                                args['ligandreparse']):
+                receptor_reparse = args['reparse'] if args['receptorreparse'] is None else args['receptorreparse']
+                return frames_response(depict_complex_frames, (mol_string,),
+                                       reparse_mode(receptor_reparse) == 'geometry', options)
+
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
+        except Exception as ex:
+            return encode_response({"error": str(ex)}, 400, 'application/json')
@@ -0,0 +1,173 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from flask.ext.restful import Resource, request
+from flask import Response, current_app
+
+from oemicroservices.library import layout
+from oemicroservices.common.admission import ServiceOverloaded, overloaded_response
+from oemicroservices.common.cache import LAYOUT_CACHE, input_key, negative_cache
+from oemicroservices.common.pool import DeadlineExceeded, deadline_response, run_in_pool
+from oemicroservices.common.schema import Arg, QuerySchema
+from oemicroservices.common.transport import encode_response, response_mimetype
+from oemicroservices.common.metrics import stage, record_formats
+
+########################################################################################################################
+#                                                                                                                      #
+#                                          Molecule layout argument parser                                             #
+#                                                                                                                      #
+########################################################################################################################
+
+layout_args = QuerySchema(
+    # If we should reparse connectivity, aromaticity, stereochemistry, hydrogens and formal charges
+    Arg('reparse', bool, False),
+    # If the molecule is gzipped then base64 encoded
+    Arg('gz', bool, False),
+    # Substructure to match (multiple values allowed)
+    Arg('highlight', str, multiple=True),
+    # Reference scaffold SMILES to align the layout to
+    Arg('scaffold', str, ''),
+    # Only for GET: the molecule string
+    Arg('val', str)
+)
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   MoleculeLayout                                                     #
+#                                  2D coordinates of small molecules for rendering by clients                          #
+#                                                                                                                      #
+# Returns the following (JSON, or MessagePack or CBOR as asked for by the Accept header):                              #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   title:          The molecule title                                                                                 #
+#   atoms: {                                                                                                           #
+#     element:      The element symbol of each atom                                                                    #
+#     x, y:         The 2D coordinates of each atom                                                                    #
+#     charge:       The formal charge of each atom                                                                     #
+#     hydrogens:    The implicit hydrogen count of each atom                                                           #
+#   },                                                                                                                 #
+#   bonds: {                                                                                                           #
+#     begin, end:   The atoms of each bond, by position in the atom lists                                              #
+#     order:        The bond order of each bond                                                                        #
+#     aromatic:     If each bond is aromatic                                                                           #
+#     stereo:       The wedge or hash marking of each bond (or null)                                                   #
+#   },                                                                                                                 #
+#   highlights: [                                                                                                      #
+#     {                                                                                                                #
+#       smarts:     The highlight SMARTS pattern                                                                       #
+#       atoms:      The matched atoms                                                                                  #
+#       bonds:      The matched bonds                                                                                  #
+#     }                                                                                                                #
+#   ]                                                                                                                  #
+# }                                                                                                                    #
+########################################################################################################################
+
+
+def _layout_response(mol_string, fmt, args):
+    """
+    Lay out a molecule in the worker pool, or take its layout from the cache. Layouts of GET requests may be cached by
+    clients, and are revalidated by an ETag of the input without the layout being computed.
+    :param mol_string: The molecule string
+    :type mol_string: str
+    :param fmt: The molecule format
+    :type fmt: str
+    :param args: The parsed URL query string dictionary
+    :type args: dict
+    :return: An HTTP response with the layout
+    :rtype: Response
+    """
+    mimetype = response_mimetype()
+    highlight = args['highlight'] or []
+    key = input_key(mol_string, fmt, args['gz'], args['reparse'], args['scaffold'], *highlight)
+    cacheable = request.method == 'GET'
+    etag = input_key(key, mimetype)
+    if cacheable and etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        result = LAYOUT_CACHE.get(key)
+        if result is None:
+            with negative_cache(mol_string, fmt, args['gz'], args['reparse']):
+                result = run_in_pool(layout, (mol_string, fmt, args['gz'], args['reparse']), bool(args['reparse']),
+                                     {'highlight': highlight, 'scaffold': args['scaffold']})
+            LAYOUT_CACHE.put(key, result)
+        with stage('encode'):
+            response = encode_response(result, 200, mimetype)
+    if cacheable:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age={0}'.format(current_app.config.get('LAYOUT_MAX_AGE', 0))
+        response.vary.add('Accept')
+    return response
+
+
+class MoleculeLayout(Resource):
+    """
+    Lay out a small molecule in 2D
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(MoleculeLayout, self).__init__()
+
+    def get(self, fmt):
+        """
+        Lay out the molecule passed through the URL
+        :param fmt: The molecule format
+        :type fmt: str
+        :return: The layout
+        :rtype: Response
+        """
+        # Parse the query options
+        args = layout_args.parse()
+        record_formats(fmt)
+        try:
+            return _layout_response(args['val'], fmt, args)
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
+        except Exception as ex:
+            return encode_response({"error": str(ex)}, 400)
+
+    def post(self, fmt):
+        """
+        Lay out the molecule POST'ed to this resource
+        :param fmt: The molecule format
+        :type fmt: str
+        :return: The layout
+        :rtype: Response
+        """
+        # Parse the query options
+        args = layout_args.parse()
+        record_formats(fmt)
+        try:
+            with stage('decode'):
+                mol_string = request.data.decode("utf-8")
+            return _layout_response(mol_string, fmt, args)
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
+        except Exception as ex:
+            return encode_response({"error": str(ex)}, 400)
@@ -22,19 +22,23 @@
 import json
 
 from flask.ext.restful import Resource, request
-from flask import Response
-from openeye.oechem import *
-
-from openeye.oedepict import *
-
-from oemicroservices.resources.depict.base import depictor_base_arg_parser
-from oemicroservices.common.util import (
-    render_error_image,
-    get_image_mime_type,
-    get_color_from_rgba,
-    get_title_location,
-    get_highlight_style,
-    read_molecule_from_string)
+from flask import Response, current_app
+
+from oemicroservices.library import DEPICT_OPTIONS, depict, depict_formats, get_image_mime_type
+from oemicroservices.resources.depict.base import (
+    depictor_base_args,
+    error_image_response,
+    get_image_formats,
+    image_response,
+    images_response,
+    select_options)
+from oemicroservices.common.admission import ServiceOverloaded, overloaded_response
+from oemicroservices.common.pool import DeadlineExceeded, deadline_response, run_in_pool
+from oemicroservices.common.cache import negative_cache
+from oemicroservices.common.jobs import run_chunk
+from oemicroservices.common.schema import Arg, BodySchema, Field, validate_molecules
+from oemicroservices.common.transport import encode_response, encode_results
+from oemicroservices.common.metrics import stage, record_formats
 
 ########################################################################################################################
 #                                                                                                                      #
@@ -42,20 +46,23 @@ from oemicroservices.common.util import (
 #                                                                                                                      #
 ########################################################################################################################
 
-# Extend the standard image_parser
-depictor_arg_parser = depictor_base_arg_parser.copy()
-# The image width
-depictor_arg_parser.add_argument('width', type=int, default=400, location='args')
-# The image height
-depictor_arg_parser.add_argument('height', type=int, default=400, location='args')
-# Substructure to highlight (multiple values allowed)
-depictor_arg_parser.add_argument('highlight', type=str, action='append', location='args')
-# Hex code for coloring the substructure
-depictor_arg_parser.add_argument('highlightcolor',  type=str, default='#7070FF', location='args')
-# Style in which to render the highlighted substructure
-depictor_arg_parser.add_argument('highlightstyle',  type=str, default='default', location='args')
-# Only for GET: the molecule string
-depictor_arg_parser.add_argument('val', type=str, location='args')
+# Extend the standard image arguments
+depictor_args = depictor_base_args.extend(
+    # The image width
+    Arg('width', int, 400),
+    # The image height
+    Arg('height', int, 400),
+    # Substructure to highlight (multiple values allowed)
+    Arg('highlight', str, multiple=True),
+    # Hex code for coloring the substructure
+    Arg('highlightcolor', str, '#7070FF'),
+    # Style in which to render the highlighted substructure
+    Arg('highlightstyle', str, 'default'),
+    # Reference scaffold SMILES to align the depiction to, so that the members of a series are laid out consistently
+    Arg('scaffold', str, ''),
+    # Only for GET: the molecule string
+    Arg('val', str)
+)
 
 ########################################################################################################################
 #                                                                                                                      #
@@ -65,6 +72,33 @@ depictor_arg_parser.add_argument('val', type=str, location='args')
 ########################################################################################################################
 
 
+def _depict_response(mol_string, fmt, args):
+    """
+    Render a molecule in the worker pool. A comma separated list of image formats returns every image, rendered from a
+    single layout, in one response.
+    :param mol_string: The molecule string
+    :type mol_string: str
+    :param fmt: The molecule format
+    :type fmt: str
+    :param args: The parsed URL query string dictionary
+    :type args: dict
+    :return: An HTTP response with the image or images
+    :rtype: Response
+    """
+    image_formats = get_image_formats(args['format'])
+    record_formats(fmt)
+    for image_format in image_formats:
+        record_formats(None, image_format)
+    options = select_options(args, DEPICT_OPTIONS)
+    if len(image_formats) < 2:
+        options['format'] = image_formats[0] if image_formats else args['format']
+        return image_response(depict, (mol_string, fmt, args['gz'], args['reparse']), bool(args['reparse']),
+                              options, options['format'])
+    del options['format']
+    return images_response(depict_formats, (mol_string, image_formats, fmt, args['gz'], args['reparse']),
+                           bool(args['reparse']), options)
+
+
 class MoleculeDepictor(Resource):
     """
     Render a small molecule in 2D
@@ -83,18 +117,23 @@ class MoleculeDepictor(Resource):
         :rtype: Response
         """
         # Parse the query options
-        args = depictor_arg_parser.parse_args()
+        args = depictor_args.parse()
         try:
-            # Read the molecule
-            mol = read_molecule_from_string(args['val'], fmt, bool(args['gz']), bool(args['reparse']))
-            # Render the image
-            return self.__render_image(mol, args)
+            # Read the molecule and render the image in the worker pool
+            with negative_cache(args['val'], fmt, args['gz'], args['reparse']):
+                return _depict_response(args['val'], fmt, args)
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
         # On error render a PNG with an error message
         except Exception as ex:
             if args['debug']:
                 return Response(json.dumps({"error": str(ex)}), status=400, mimetype='application/json')
             else:
-                return render_error_image(args['width'], args['height'], str(ex))
+                return error_image_response(args['width'], args['height'], str(ex))
 
     def post(self, fmt):
         """
@@ -105,88 +144,104 @@ class MoleculeDepictor(Resource):
         :rtype: Response
         """
         # Parse the query options
-        args = depictor_arg_parser.parse_args()
+        args = depictor_args.parse()
         try:
-            # Read the molecule
-            mol = read_molecule_from_string(request.data.decode("utf-8"), fmt, bool(args['gz']), bool(args['reparse']))
-            # Render the image
-            return self.__render_image(mol, args)
+            with stage('decode'):
+                mol_string = request.data.decode("utf-8")
+            # Read the molecule and render the image in the worker pool
+            with negative_cache(mol_string, fmt, args['gz'], args['reparse']):
+                return _depict_response(mol_string, fmt, args)
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
         # On error render a PNG with an error message
         except Exception as ex:
             if args['debug']:
                 return Response(json.dumps({"error": str(ex)}), status=400, mimetype='application/json')
             else:
-                return render_error_image(args['width'], args['height'], str(ex))
+                return error_image_response(args['width'], args['height'], str(ex))
+
 
-    # noinspection PyMethodMayBeStatic
-    def __render_image(self, mol, args):
+########################################################################################################################
+#                                                                                                                      #
+#                                               MoleculeDepictorBatch                                                  #
+#                                  Depict a batch of small molecules in a single request                               #
+#                                                                                                                      #
+# Expects a POST (JSON, MessagePack or CBOR):                                                                          #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   molecules: [                                                                                                       #
+#     {                                                                                                                #
+#       value:      The molecule file string (*Required)                                                               #
+#       format:     The file format of the molecule string (*Required)                                                 #
+#       gz:         If the molecule string is gzipped (gzip + b64 encoded in JSON, raw gzip otherwise)                 #
+#     }                                                                                                                #
+#   ],                                                                                                                 #
+#   options:        The depiction options, named as the query parameters of /v1/depict/structure                       #
+#   reparse:        Reparse connectivity, bond orders, stereo, etc.                                                    #
+# }                                                                                                                    #
+#                                                                                                                      #
+# Returns the following, in the format asked for by the Accept header:                                                 #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   results: [                                                                                                         #
+#     {                                                                                                                #
+#       value:      The image (base64 encoded in JSON, bytes in MessagePack and CBOR), or null on error                #
+#       error:      Why the molecule failed, if it did                                                                 #
+#     }                                                                                                                #
+#   ]                                                                                                                  #
+# }                                                                                                                    #
+########################################################################################################################
+
+# The POST of the MoleculeDepictorBatch
+depictor_batch_schema = BodySchema(
+    Field('molecules', "No molecules provided")
+)
+
+
+class MoleculeDepictorBatch(Resource):
+    """
+    Render a batch of small molecules in 2D
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(MoleculeDepictorBatch, self).__init__()
+
+    def post(self):
         """
-        Render a small molecule image
-        :param mol: The molecule
-        :param args: The parsed URL query string dictionary
-        :return: A Flask Response with the rendered image
+        Render an image of each molecule POST'ed to this resource
+        :return: A Flask Response with the rendered images
         :rtype: Response
         """
-        # *********************************************************************
-        # *                      Parse Parameters                             *
-        # *********************************************************************
-        width = args['width']                                          # Image width
-        height = args['height']                                        # Image height
-        title = args['title']                                          # Image title
-        use_molecule_title = bool(args['keeptitle'])                   # Use the molecule title in the molecule file
-        bond_scaling = bool(args['scalebonds'])                        # Bond width scales with size
-        image_format = args['format']                                  # The output image format
-        image_mimetype = get_image_mime_type(image_format)             # MIME type corresponding to the image format
-        highlight_style = get_highlight_style(args['highlightstyle'])  # The substructure highlights style
-        title_location = get_title_location(args['titleloc'])          # The title location (if we have a title)
-        highlight = args['highlight']                                  # SMARTS substructures to highlight
-        background = get_color_from_rgba(args['background'])           # Background color
-        color = get_color_from_rgba(args['highlightcolor'])            # Highlight color
-
-        # Make sure we got valid inputs
-        if not image_mimetype:
-            raise Exception("Invalid MIME type")
-
-        # Defaults for invalid inputs
-        if not highlight_style:
-            highlight_style = OEHighlightStyle_Default
-
-        if not title_location:
-            title_location = OETitleLocation_Top
-        # *********************************************************************
-        # *                      Create the Image                             *
-        # *********************************************************************
-        image = OEImage(width, height)
-        # Prepare the depiction
-        OEPrepareDepiction(mol, False, True)
-        opts = OE2DMolDisplayOptions(image.GetWidth(), image.GetHeight(), OEScale_AutoScale)
-
-        # If we provided a title
-        if title:
-            mol.SetTitle(title)
-            opts.SetTitleLocation(title_location)
-        # Else hide if we didn't provide a title and we're *not* using the molecule title
-        elif not use_molecule_title:
-            mol.SetTitle("")
-            opts.SetTitleLocation(OETitleLocation_Hidden)
-
-        # Other configuration options
-        opts.SetBondWidthScaling(bond_scaling)
-        opts.SetBackgroundColor(background)
-
-        # Prepare the display
-        disp = OE2DMolDisplay(mol, opts)
-
-        # Do any substructure matching
-        if highlight:
-            for querySmiles in highlight:
-                subs = OESubSearch(querySmiles)
-                for match in subs.Match(mol, True):
-                    OEAddHighlighting(disp, color, highlight_style, match)
-
-        # Render the image
-        OERenderMolecule(image, disp)
-
-        # Return the image in the response
-        img_content = OEWriteImageToString(image_format, image)
-        return Response(img_content, mimetype=image_mimetype)
+        try:
+            with stage('decode'):
+                payload = depictor_batch_schema.parse()
+            validate_molecules(payload['molecules'], current_app.config.get('BATCH_MAX_MOLECULES', 1000))
+            options = payload.get('options', {})
+            if not isinstance(options, dict):
+                raise Exception("Unexpected options received")
+            for key in options:
+                if key not in DEPICT_OPTIONS:
+                    raise Exception("Unknown option: {0}".format(key))
+            image_format = options.get('format', DEPICT_OPTIONS['format'])
+            if not get_image_mime_type(image_format):
+                raise Exception("Invalid image format: {0}".format(image_format))
+            record_formats(payload['molecules'][0]['format'], image_format)
+            # Render the images in a single worker call
+            reparse = bool(payload.get('reparse', False))
+            results = run_in_pool(run_chunk, ('depict', {'options': options, 'reparse': reparse},
+                                              payload['molecules']), reparse)
+            return encode_results(results)
+
+        # Shed the request if the worker pool is full
+        except ServiceOverloaded as ex:
+            return overloaded_response(ex)
+        # Report a server timeout if the worker pool did not finish in time
+        except DeadlineExceeded as ex:
+            return deadline_response(ex)
+        except Exception as ex:
+            return encode_response({"error": str(ex)}, 400)
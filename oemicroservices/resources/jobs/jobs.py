@@ -0,0 +1,354 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import base64
+import json
+
+from flask.ext.restful import Resource, request
+from flask import Response, current_app
+
+from oemicroservices.library import DEPICT_OPTIONS, INTERACTION_OPTIONS, get_image_mime_type
+from oemicroservices.common.jobs import JOB_TYPES, ACTIVE_STATES, TooManyJobs
+from oemicroservices.common.schema import BodySchema, Field, validate_molecule, validate_molecules
+
+# Number of results returned per page by default, and at most
+RESULTS_PAGE_SIZE = 100
+RESULTS_MAX_PAGE_SIZE = 1000
+
+# Seconds a client with too many active jobs is asked to wait before submitting another
+RETRY_AFTER = 60
+
+
+def _json_response(obj, status=200, headers=None):
+    """
+    Create a JSON response
+    :param obj: The object to return
+    :type obj: dict
+    :param status: The HTTP status
+    :type status: int
+    :param headers: Additional response headers
+    :type headers: dict
+    :return: The response
+    :rtype: Response
+    """
+    return Response(json.dumps(obj), status=status, mimetype='application/json', headers=headers)
+
+
+def _job_fields(job):
+    """
+    Get the fields of a job reported to clients
+    :param job: The job
+    :type job: dict
+    :return: The reported fields
+    :rtype: dict
+    """
+    return dict((key, value) for key, value in job.items() if key not in ('client', 'mimetype'))
+
+
+def _job_response(job, status=200, headers=None):
+    """
+    Create a response describing a job
+    :param job: The job
+    :type job: dict
+    :return: The response
+    :rtype: Response
+    """
+    return _json_response({'job': _job_fields(job)}, status, headers)
+
+
+def _get_client():
+    """
+    Identify the client of a request, by the X-Client-Id header or else its address
+    :return: The client identifier
+    :rtype: str
+    """
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'unknown'
+
+
+def _get_job(job_id):
+    """
+    Get a job of the requesting client
+    :param job_id: The job ID
+    :type job_id: str
+    :return: The job, or None if there is no such job for this client
+    :rtype: dict
+    """
+    jobs = current_app.extensions['jobs']
+    job = jobs.store.get(job_id)
+    if job is None or job['client'] != _get_client():
+        return None
+    return job
+
+
+def _not_found(job_id):
+    """
+    Create the response for an unknown job
+    :param job_id: The job ID
+    :type job_id: str
+    :return: The response
+    :rtype: Response
+    """
+    return _json_response({"error": "No such job: {0}".format(job_id)}, 404)
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      JobList                                                         #
+#                                       Submit a batch of molecules as a background job                                #
+#                                                                                                                      #
+# Expects a POST:                                                                                                      #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   type:           The job type: depict, interaction or convert (*Required)                                           #
+#   molecules: [    The molecules, or the ligands of an interaction job (*Required)                                    #
+#     {                                                                                                                #
+#       value:      The molecule file string (*Required)                                                               #
+#       format:     The file format of the molecule string (e.g. smi, sdf, pdb, etc.) (*Required)                      #
+#       gz:         If the molecule string is gzip + b64 encoded                                                       #
+#     }                                                                                                                #
+#   ],                                                                                                                 #
+#   receptor: {     The receptor of an interaction job, with value, format and gz as above                             #
+#   },                                                                                                                 #
+#   options: {      Depiction options, as the query parameters of the depiction endpoints                              #
+#   },                                                                                                                 #
+#   output: {       The output of a convert job                                                                        #
+#     format:       The output file format (*Required)                                                                 #
+#     gz:           If the output molecule strings should be gzip + b64 encoded                                        #
+#   },                                                                                                                 #
+#   reparse:        Whether to reparse connectivity, bond orders, stereo, etc.                                         #
+# }                                                                                                                    #
+#                                                                                                                      #
+# Returns 202 with the job, and its URL in the Location header                                                         #
+########################################################################################################################
+
+# The JSON POST of the JobList, and the additional fields of interaction and convert jobs
+job_schema = BodySchema(
+    Field('type', "Job type must be one of: {0}".format(', '.join(JOB_TYPES))),
+    Field('molecules', "No molecules provided", list)
+)
+job_interaction_schema = BodySchema(
+    Field('receptor', "No receptor information provided")
+)
+job_convert_schema = BodySchema(
+    Field('output', "No output information provided"),
+    Field('output.format', "No output format provided")
+)
+
+
+class JobList(Resource):
+    """
+    Submit a background job
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(JobList, self).__init__()
+
+    # noinspection PyMethodMayBeStatic
+    def __validate_job(self, obj, max_molecules):
+        """
+        Validate the parts of a job that depend on its type
+        :param obj: The parsed JSON object POST'ed to this resource
+        :param max_molecules: The maximum number of molecules in a job
+        """
+        if obj['type'] not in JOB_TYPES:
+            raise Exception("Job type must be one of: {0}".format(', '.join(JOB_TYPES)))
+        validate_molecules(obj['molecules'], max_molecules)
+        if not isinstance(obj.get('options', {}), dict):
+            raise Exception("Unexpected options received")
+        if obj['type'] == 'interaction':
+            job_interaction_schema.validate(obj)
+            validate_molecule(obj['receptor'], 'receptor')
+        if obj['type'] == 'convert':
+            job_convert_schema.validate(obj)
+
+    def post(self):
+        """
+        Submit a job
+        :return: A Flask Response with the job
+        :rtype: Response
+        """
+        jobs = current_app.extensions['jobs']
+        try:
+            payload = job_schema.parse()
+            self.__validate_job(payload, jobs.max_molecules)
+            # Check the options up front, rather than failing every molecule in the background
+            options = payload.get('options', {})
+            defaults = {'depict': DEPICT_OPTIONS, 'interaction': INTERACTION_OPTIONS}.get(payload['type'], {})
+            for key in options:
+                if key not in defaults:
+                    raise Exception("Unknown option: {0}".format(key))
+            if payload['type'] == 'convert':
+                # Gzipped output is stored as raw gzip, and base64 encoded in the JSON results like an image
+                mimetype = 'application/gzip' if payload['output'].get('gz', False) else 'text/plain'
+            else:
+                mimetype = get_image_mime_type(options.get('format', defaults['format']))
+                if not mimetype:
+                    raise Exception("Invalid image format: {0}".format(options['format']))
+            job = jobs.submit(_get_client(), payload['type'], payload, mimetype)
+        except TooManyJobs as ex:
+            return _json_response({"error": str(ex)}, 429, {'Retry-After': str(RETRY_AFTER)})
+        except Exception as ex:
+            return _json_response({"error": str(ex)}, 400)
+        return _job_response(job, 202, {'Location': '/v1/jobs/{0}'.format(job['id'])})
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                        Job                                                           #
+#                                        Get the progress of a job, or cancel it                                       #
+#                                                                                                                      #
+# GET returns the job: its status (queued, running, done, failed or cancelled), the total number of molecules, the     #
+# number completed and the number that failed. DELETE cancels an active job, or deletes a finished job and its         #
+# results.                                                                                                             #
+########################################################################################################################
+
+
+class Job(Resource):
+    """
+    Get or cancel a background job
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(Job, self).__init__()
+
+    # noinspection PyMethodMayBeStatic
+    def get(self, job_id):
+        """
+        Get the progress of a job
+        :param job_id: The job ID
+        :type job_id: str
+        :return: A Flask Response with the job
+        :rtype: Response
+        """
+        job = _get_job(job_id)
+        if job is None:
+            return _not_found(job_id)
+        return _job_response(job)
+
+    # noinspection PyMethodMayBeStatic
+    def delete(self, job_id):
+        """
+        Cancel an active job, or delete a finished job
+        :param job_id: The job ID
+        :type job_id: str
+        :return: A Flask Response with the job, or no content if it was deleted
+        :rtype: Response
+        """
+        jobs = current_app.extensions['jobs']
+        job = _get_job(job_id)
+        if job is None:
+            return _not_found(job_id)
+        if job['status'] in ACTIVE_STATES and jobs.store.cancel(job_id):
+            return _job_response(jobs.store.get(job_id))
+        jobs.store.delete(job_id)
+        return Response(status=204)
+
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                     JobResults                                                       #
+#                                            Download the results of a job                                             #
+#                                                                                                                      #
+# GET /v1/jobs/<job_id>/results?offset=0&limit=100 returns the results available so far:                               #
+#                                                                                                                      #
+# {                                                                                                                    #
+#   job:            The job                                                                                            #
+#   results: [                                                                                                         #
+#     {                                                                                                                #
+#       index:      The index of the molecule in the job                                                               #
+#       value:      The molecule string, or the base64 encoded image                                                   #
+#       error:      Why the molecule failed, if it did                                                                 #
+#     }                                                                                                                #
+#   ]                                                                                                                  #
+# }                                                                                                                    #
+#                                                                                                                      #
+# GET /v1/jobs/<job_id>/results/<index> returns a single result as a file, e.g. an image                               #
+########################################################################################################################
+
+
+class JobResults(Resource):
+    """
+    Download a page of the results of a job
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(JobResults, self).__init__()
+
+    # noinspection PyMethodMayBeStatic
+    def get(self, job_id):
+        """
+        Get a page of results
+        :param job_id: The job ID
+        :type job_id: str
+        :return: A Flask Response with the results
+        :rtype: Response
+        """
+        jobs = current_app.extensions['jobs']
+        job = _get_job(job_id)
+        if job is None:
+            return _not_found(job_id)
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(max(1, int(request.args.get('limit', RESULTS_PAGE_SIZE))), RESULTS_MAX_PAGE_SIZE)
+        except ValueError:
+            return _json_response({"error": "offset and limit must be integers"}, 400)
+        text = job['mimetype'] == 'text/plain'
+        results = []
+        for index, value, error in jobs.store.results(job_id, offset, limit):
+            if value is not None:
+                value = value.decode('utf-8') if text else base64.b64encode(value).decode('ascii')
+            results.append({'index': index, 'value': value, 'error': error})
+        return _json_response({'job': _job_fields(job), 'results': results})
+
+
+class JobResult(Resource):
+    """
+    Download a single result of a job
+    """
+
+    def __init__(self):
+        # Initialize superclass
+        super(JobResult, self).__init__()
+
+    # noinspection PyMethodMayBeStatic
+    def get(self, job_id, index):
+        """
+        Get a result
+        :param job_id: The job ID
+        :type job_id: str
+        :param index: The index of the molecule in the job
+        :type index: int
+        :return: A Flask Response with the result
+        :rtype: Response
+        """
+        jobs = current_app.extensions['jobs']
+        job = _get_job(job_id)
+        if job is None:
+            return _not_found(job_id)
+        results = jobs.store.results(job_id, index, 1)
+        if not results or results[0][0] != index:
+            return _json_response({"error": "No result {0} yet".format(index)}, 404)
+        if results[0][2] is not None:
+            return _json_response({"error": results[0][2]}, 422)
+        return Response(results[0][1], status=200, mimetype=job['mimetype'])
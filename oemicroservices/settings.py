@@ -0,0 +1,387 @@
+# Default configuration for oemicroservices
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+# These defaults are loaded into the Flask application configuration when oemicroservices.api is imported. To override
+# any of them, point the OEMICROSERVICES_SETTINGS environment variable at a Python file that redefines the values you
+# want to change, e.g.:
+#
+#   export OEMICROSERVICES_SETTINGS=/etc/oemicroservices/settings.py
+#   gunicorn oemicroservices.api:app --bind 0.0.0.0:5000 --threads 5
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      Metrics                                                         #
+#                                                                                                                      #
+########################################################################################################################
+
+# Measure request and stage latencies and serve them in the Prometheus text format
+METRICS = True
+
+# Path of the metrics endpoint
+METRICS_PATH = '/metrics'
+
+# Add a Server-Timing header with the duration of each stage to every response (requires METRICS)
+SERVER_TIMING = True
+
+# Token that administrators send in the X-Profile-Token header to profile a request with profile=true. Profiling is
+# disabled when no token is set.
+PROFILE_TOKEN = None
+
+# Number of functions in a profile summary
+PROFILE_FUNCTIONS = 25
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Admission control                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+# Enable admission control (per-endpoint concurrency limits with a bounded wait queue)
+ADMISSION_CONTROL = True
+
+# Limits per endpoint. The capacity is the number of cost units that may execute at once on the endpoint, queue is the
+# number of requests that may wait for capacity (0 by default) and timeout is how long (in seconds) a request may wait
+# before it is rejected. A request costs one unit plus one unit for every ADMISSION_ATOMS_PER_UNIT estimated atoms, up
+# to the full capacity of the endpoint, so a single very large receptor can occupy an endpoint without starving the
+# others.
+#
+# Running and waiting requests each hold a server thread (Gunicorn --threads, 5 in the Dockerfile), so keep capacity
+# plus queue of every endpoint below the thread count of a server process, and the expensive endpoints well below it,
+# so that a burst on one endpoint leaves threads for the others. Without a queue, excess requests get a 503 straight
+# away instead of blocking a thread. Raise the limits with the thread count.
+ADMISSION_LIMITS = {
+    'moleculedepictor': {'capacity': 4},
+    'interactiondepictor': {'capacity': 2},
+    'findligandinteractiondepictor': {'capacity': 2},
+    'interactionframes': {'capacity': 1},
+    'findligandinteractionframes': {'capacity': 1},
+    'moleculeconvert': {'capacity': 3},
+    'moleculelayout': {'capacity': 4},
+    'compoundsearch': {'capacity': 2},
+    'compoundlist': {'capacity': 1},
+    'moleculedepictorbatch': {'capacity': 2},
+    'moleculeconvertbatch': {'capacity': 2}
+}
+
+# Limits for any endpoint not listed in ADMISSION_LIMITS (None to leave other endpoints unrestricted)
+ADMISSION_DEFAULT_LIMIT = None
+
+# Estimated atoms per cost unit
+ADMISSION_ATOMS_PER_UNIT = 2000
+
+# Value of the Retry-After header (in seconds) sent with 503 responses when a request is shed
+ADMISSION_RETRY_AFTER = 5
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Worker pools                                                       #
+#                                                                                                                      #
+########################################################################################################################
+
+# Run molecule parsing and rendering on separate light and heavy worker pools, so that small molecule requests never
+# wait behind receptor-sized work
+WORKER_POOLS = True
+
+# Number of workers (size) and maximum number of requests waiting for a worker (queue) in each pool. With processes
+# enabled each worker runs its work in a supervised subprocess, which is killed and replaced when a request passes its
+# deadline. The memory_limit caps the address space of each worker process in MB (None for no limit). The address
+# space includes the toolkit libraries and license data mapped by the worker, so measure the virtual size of an idle
+# worker process before setting a cap well above it (see README).
+WORKER_POOL_LIMITS = {
+    'light': {'size': 8, 'queue': 64, 'processes': True, 'memory_limit': None},
+    'heavy': {'size': 2, 'queue': 8, 'processes': True, 'memory_limit': None}
+}
+
+# Endpoints that always run on the heavy pool
+WORKER_POOL_HEAVY_ENDPOINTS = ('interactiondepictor', 'findligandinteractiondepictor', 'interactionframes',
+                               'findligandinteractionframes', 'compoundlist')
+
+# Requests with more estimated atoms than this run on the heavy pool
+WORKER_POOL_HEAVY_ATOMS = 1000
+
+# Requests that reparse the molecule with more estimated atoms than this run on the heavy pool
+WORKER_POOL_HEAVY_REPARSE_ATOMS = 200
+
+# Deadline in seconds for each endpoint, including time spent waiting for a worker (None or missing for no deadline)
+WORKER_DEADLINES = {
+    'moleculedepictor': 10,
+    'interactiondepictor': 60,
+    'findligandinteractiondepictor': 60,
+    'interactionframes': 600,
+    'findligandinteractionframes': 600,
+    'moleculeconvert': 30,
+    'moleculelayout': 10,
+    'moleculedepictorbatch': 120,
+    'moleculeconvertbatch': 120,
+    'compoundlist': 120,
+    'compoundsearch': 10
+}
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Request recording                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+# Record requests to a log that python -m oemicroservices.replay can replay against another instance
+RECORD_REQUESTS = False
+
+# Request log path. {pid} is replaced by the process ID, so that each server process writes its own log.
+RECORD_PATH = 'requests-{pid}.log'
+
+# Fraction of requests to record
+RECORD_SAMPLE = 1.0
+
+# Record request bodies (each distinct body is written once). Without bodies only GET requests can be replayed.
+RECORD_BODIES = True
+
+# Size in bytes at which the log is renamed with a .1 suffix and a new log is started (None for no limit)
+RECORD_MAX_BYTES = 100 * 1024 * 1024
+
+# Requests waiting for the background writer. Further requests are not recorded until it catches up.
+RECORD_MAX_PENDING = 1000
+
+# Number of body hashes remembered to write each body once. Bodies forgotten beyond this are written again.
+RECORD_SEEN_BODIES = 10000
+
+########################################################################################################################
+#                                                                                                                      #
+#                                               Slow request capture                                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+# Save the full inputs and stage timings of slow requests, to reproduce them with python -m oemicroservices.reproduce
+SLOW_REQUESTS = False
+
+# Spool directory for captured requests
+SLOW_REQUEST_DIR = 'slow-requests'
+
+# Requests that take longer than this (in seconds) are captured
+SLOW_REQUEST_THRESHOLD = 5.0
+
+# Fraction of slow requests to capture
+SLOW_REQUEST_SAMPLE = 1.0
+
+# Maximum number of captures and their total size in bytes (the oldest captures are removed first)
+SLOW_REQUEST_MAX_FILES = 100
+SLOW_REQUEST_MAX_BYTES = 100 * 1024 * 1024
+
+# Request bodies larger than this (in bytes) are not captured
+SLOW_REQUEST_MAX_BODY = 10 * 1024 * 1024
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                  Toolkit warm-up                                                     #
+#                                                                                                                      #
+########################################################################################################################
+
+# Load the toolkits and render a canned molecule and interaction when the application is loaded, so that processes
+# forked from it (gunicorn --preload workers and worker pool processes) skip the first-request costs. When disabled,
+# each toolkit is loaded on first use of an endpoint that needs it.
+WARM_UP = True
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Asynchronous jobs                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+# Accept large batches at /v1/jobs and process them in the background
+JOBS = False
+
+# SQLite database of queued jobs and their results, which may be shared by the server processes on a host
+JOBS_DATABASE = 'jobs.sqlite'
+
+# Number of jobs processed at once by each server process, and whether each runs in a supervised subprocess with a
+# memory limit in MB (None for no limit). As with WORKER_POOL_LIMITS, the limit caps the address space, which includes
+# the toolkit libraries and license data mapped by the worker, so size it from an idle worker process (see README).
+JOBS_WORKERS = 2
+JOBS_PROCESSES = True
+JOBS_MEMORY_LIMIT = None
+
+# Molecules processed per worker call, and the deadline in seconds for each call. Cancellation and progress are
+# checked between chunks.
+JOBS_CHUNK_SIZE = 50
+JOBS_CHUNK_DEADLINE = 300.0
+
+# Maximum number of molecules in a job
+JOBS_MAX_MOLECULES = 100000
+
+# Maximum number of queued and running jobs of a client (identified by the X-Client-Id header or its address), and how
+# many of them run at once
+JOBS_PER_CLIENT = 4
+JOBS_RUNNING_PER_CLIENT = 1
+
+# Seconds that finished jobs and their results are kept
+JOBS_TTL = 24 * 3600
+
+# Running jobs without progress for this many seconds (e.g. because their server process died) are requeued
+JOBS_STALE_AFTER = 900
+
+# Seconds between checks for queued jobs when idle
+JOBS_POLL_INTERVAL = 1.0
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                      Caches                                                          #
+#                                                                                                                      #
+########################################################################################################################
+
+# Number of unreadable inputs remembered per process. Repeats of these fail with the cached error without using a
+# worker (0 disables the cache).
+NEGATIVE_CACHE_SIZE = 10000
+
+# Number of rendered error images kept per process by size and message (0 disables the cache)
+ERROR_IMAGE_CACHE_SIZE = 1000
+
+# Number of 2D layouts kept per process by input (0 disables the cache)
+LAYOUT_CACHE_SIZE = 10000
+
+# Number of series scaffolds kept laid out in 2D per process, so that each is laid out only once (0 disables the cache)
+SCAFFOLD_CACHE_SIZE = 100
+
+# Seconds that clients and proxies may cache 2D layouts (layouts are identified by an ETag of their input, so that
+# clients can revalidate them without a layout being computed)
+LAYOUT_MAX_AGE = 86400
+
+########################################################################################################################
+#                                                                                                                      #
+#                                               Response compression                                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+# Compress responses with gzip for clients that send Accept-Encoding: gzip
+COMPRESSION = True
+
+# The gzip level (1 is fastest, 9 is smallest)
+COMPRESSION_LEVEL = 6
+
+# Responses smaller than this (in bytes) are sent uncompressed
+COMPRESSION_MIN_SIZE = 500
+
+# Response MIME types to compress (PNG images are already compressed)
+COMPRESSION_MIMETYPES = ('application/json', 'application/postscript', 'application/pdf', 'image/svg+xml',
+                         'text/plain', 'text/csv')
+
+# Number of compressed responses kept per process by content digest, so that repeated outputs are not compressed again
+# (0 disables the cache), and the largest response (in bytes) kept
+COMPRESSION_CACHE_SIZE = 1000
+COMPRESSION_CACHE_MAX_BODY = 256 * 1024
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                 Streamed outputs                                                     #
+#                                                                                                                      #
+########################################################################################################################
+
+# Write large outputs to a spool file in the worker and stream them to the client in chunks, so that the memory used
+# by a request does not grow with the size of its output
+STREAM_OUTPUTS = True
+
+# Spool directory for streamed outputs (None for the system temporary directory). Must be shared with the worker
+# processes, which run on the same host.
+STREAM_DIR = None
+
+# Size in bytes of the streamed chunks
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Image formats that are always streamed
+STREAM_IMAGE_FORMATS = ('pdf', 'ps')
+
+# Converted molecules are streamed when the input has more estimated atoms than this
+STREAM_MIN_ATOMS = 5000
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                    Batch requests                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+# Maximum number of molecules in a synchronous batch request (/v1/depict/structures and /v1/convert/molecules). Larger
+# batches should be submitted as asynchronous jobs.
+BATCH_MAX_MOLECULES = 1000
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Compound search                                                    #
+#                                                                                                                      #
+########################################################################################################################
+
+# Enable substructure search over an in-memory compound set (/v1/compounds and /v1/compounds/search). Each server
+# process keeps its own set: COMPOUND_FILE is shared by the processes forked from a preloaded application, but uploads
+# only reach the process that receives them. Run a single server process, or load the compounds from COMPOUND_FILE and
+# restart, when every process must see the same compounds.
+COMPOUNDS = False
+
+# Molecule file (e.g. SDF or OEB) loaded into the compound set at startup (None to start empty)
+COMPOUND_FILE = None
+
+# SD tag with the compound IDs (None, or a compound without the tag, uses the molecule title)
+COMPOUND_ID_TAG = None
+
+# Default and maximum number of search results per page
+COMPOUND_PAGE_SIZE = 100
+COMPOUND_MAX_PAGE_SIZE = 1000
+
+# Maximum number of compounds screened for one page of search results. A page ends early at this limit and its next
+# offset continues the search, so that every request does a bounded amount of work.
+COMPOUND_MAX_SCREEN = 100000
+
+# Token that clients send in the X-Upload-Token header to upload compounds (None to disable uploads)
+COMPOUND_UPLOAD_TOKEN = None
+
+# Maximum size of an uploaded compound file in bytes, before and after decompression
+COMPOUND_MAX_UPLOAD = 16 * 1024 * 1024
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                   Receptor library                                                   #
+#                                                                                                                      #
+########################################################################################################################
+
+# Directory of receptor files (.oeb, .pdb, .sdf, .mol2, .cif, optionally gzipped) read at startup, which interaction
+# depictions can reference by name (the file name without extensions). None disables the receptor library.
+RECEPTOR_DIR = None
+
+# Residues with an atom within this distance in angstroms of the ligand are depicted as the binding pocket
+RECEPTOR_POCKET_RADIUS = 10.0
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                    Ligand search                                                     #
+#                                                                                                                      #
+########################################################################################################################
+
+# Before a PDB complex is parsed for /v1/depict/interaction/search, cut the ligand and the residues within this
+# distance in angstroms of it out of the PDB text, so that the atoms far from the ligand are never parsed (None to parse
+# the whole complex)
+COMPLEX_PREFILTER_RADIUS = 12.0
+
+########################################################################################################################
+#                                                                                                                      #
+#                                                     Trajectories                                                     #
+#                                                                                                                      #
+########################################################################################################################
+
+# Maximum number of frames depicted by /v1/depict/interaction/frames and /v1/depict/interaction/search/<fmt>/frames.
+# Later frames are not read, and the summary is marked as truncated (None for no limit).
+FRAMES_MAX = 1000
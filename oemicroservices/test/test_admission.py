@@ -0,0 +1,116 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import threading
+import time
+
+from oemicroservices.common.admission import AdmissionLimiter, ServiceOverloaded, estimate_cost
+from oemicroservices.api import app
+
+
+class TestEstimateCost(TestCase):
+    def test_count_pdb_records(self):
+        """
+        Test counting PDB atom records
+        """
+        body = b'ATOM      1  N   MET A   1\nATOM      2  CA  MET A   1\nHETATM    3  C1  SUV A2001\nEND\n'
+        self.assertEqual(3, estimate_cost(body, 'pdb').atoms)
+
+    def test_count_pdb_records_in_json(self):
+        """
+        Test counting PDB atom records embedded in a JSON body
+        """
+        body = b'{"receptor": {"value": "ATOM      1  N   MET A   1\\nATOM      2  CA  MET A   1\\n"}}'
+        self.assertEqual(2, estimate_cost(body).atoms)
+
+    def test_smiles_bytes(self):
+        """
+        Test estimating atoms from the size of a SMILES string
+        """
+        self.assertEqual(1, estimate_cost(b'C', 'smiles').atoms)
+        self.assertEqual(50, estimate_cost(b'C' * 100, 'smiles').atoms)
+
+    def test_gz_expansion(self):
+        """
+        Test that compressed payloads are estimated larger than their size
+        """
+        self.assertGreater(estimate_cost(b'x' * 800, 'sdf', gz=True).atoms, estimate_cost(b'x' * 800, 'sdf').atoms)
+
+
+class TestAdmissionLimiter(TestCase):
+    def test_reject_when_queue_full(self):
+        """
+        Test that requests are rejected when at capacity with no queue
+        """
+        limiter = AdmissionLimiter(2, queue=0)
+        self.assertEqual(2, limiter.acquire(5))
+        self.assertRaises(ServiceOverloaded, limiter.acquire, 1)
+        limiter.release(2)
+        self.assertEqual(1, limiter.acquire(1))
+
+    def test_queue_timeout(self):
+        """
+        Test that queued requests are rejected after the timeout
+        """
+        limiter = AdmissionLimiter(1, queue=1, timeout=0.05)
+        limiter.acquire(1)
+        self.assertRaises(ServiceOverloaded, limiter.acquire, 1)
+        self.assertEqual(0, limiter.waiting)
+
+    def test_queued_request_admitted(self):
+        """
+        Test that a queued request is admitted when capacity is released
+        """
+        limiter = AdmissionLimiter(1, queue=1, timeout=5.0)
+        limiter.acquire(1)
+        timer = threading.Timer(0.05, limiter.release, (1,))
+        timer.start()
+        start = time.time()
+        self.assertEqual(1, limiter.acquire(1))
+        self.assertLess(time.time() - start, 5.0)
+        timer.join()
+
+
+class TestAdmissionControl(TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.limiter = app.extensions['admission'].get_limiter('moleculedepictor')
+
+    def test_shed_with_retry_after(self):
+        """
+        Test that a request to an endpoint at capacity is shed with a 503 and Retry-After
+        """
+        queue = self.limiter.queue
+        self.limiter.queue = 0
+        units = self.limiter.acquire(self.limiter.capacity)
+        try:
+            response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&debug=true')
+        finally:
+            self.limiter.release(units)
+            self.limiter.queue = queue
+        self.assertEqual("503 SERVICE UNAVAILABLE", response.status)
+        self.assertIn('Retry-After', response.headers)
+        # Capacity is released after each request
+        response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&debug=true')
+        self.assertEqual("200 OK", response.status)
+        self.assertEqual(0, self.limiter.in_use)
@@ -0,0 +1,116 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import gzip
+import os
+import shutil
+import tempfile
+
+from oemicroservices.batch import read_records, find_inputs, parse_options, run_batch, main
+from oemicroservices.library import DEPICT_OPTIONS
+
+# Define the resource files relative to this test file because setup.py will run from the root package directory
+# but some IDEs will run the tests from within the tests directory. We can be friendly to everybody.
+LIGAND_FILE = os.path.join(os.path.dirname(__file__), 'assets/suv.pdb')
+RECEPTOR_FILE = os.path.join(os.path.dirname(__file__), 'assets/receptor.pdb')
+
+SMILES = 'c1ccccc1 benzene\n\nCCO ethanol\ninvalid( broken\nCC(=O)Oc1ccccc1C(=O)O aspirin\n'
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name, content=None):
+        path = os.path.join(self.directory, name)
+        if content is not None:
+            with (gzip.open if name.endswith('.gz') else open)(path, 'wb') as f:
+                f.write(content.encode('utf-8'))
+        return path
+
+    def test_read_smiles(self):
+        """
+        Test reading SMILES records, skipping blank lines
+        """
+        records = list(read_records(self.path('in.smi', SMILES)))
+        self.assertEqual(4, len(records))
+        self.assertEqual(('smi', 'c1ccccc1 benzene'), records[0])
+
+    def test_read_sdf_gz(self):
+        """
+        Test reading compressed SDF records
+        """
+        records = list(read_records(self.path('in.sdf.gz', 'a\n\n\nM  END\n$$$$\nb\n\n\nM  END\n$$$$\n')))
+        self.assertEqual([('sdf', 'a\n\n\nM  END\n$$$$\n'), ('sdf', 'b\n\n\nM  END\n$$$$\n')], records)
+
+    def test_find_inputs(self):
+        """
+        Test expanding directories to the molecule files in them
+        """
+        self.path('b.smi', SMILES)
+        self.path('a.sdf.gz', '')
+        self.path('notes.txt', '')
+        self.assertEqual([self.path('a.sdf.gz'), self.path('b.smi')], find_inputs([self.directory]))
+
+    def test_parse_options(self):
+        """
+        Test converting options to the types of their defaults
+        """
+        options = parse_options(['width=300', 'keeptitle=true', 'highlight=c1ccccc1', 'highlight=CC'], DEPICT_OPTIONS)
+        self.assertEqual({'width': 300, 'keeptitle': True, 'highlight': ['c1ccccc1', 'CC']}, options)
+        self.assertRaises(Exception, parse_options, ['colour=red'], DEPICT_OPTIONS)
+
+    def test_depict_in_order(self):
+        """
+        Test depicting in a process pool with the results in input order
+        """
+        results = []
+        stats = run_batch('depict', [self.path('in.smi', SMILES)], {'format': 'svg'},
+                          lambda path, index, image: results.append((index, image)), processes=2, chunksize=1)
+        self.assertEqual(4, stats['records'])
+        self.assertEqual(1, stats['errors'])
+        self.assertEqual([1, 2, 4], [index for index, image in results])
+        self.assertTrue(all(b'<svg' in image for index, image in results))
+
+    def test_interaction(self):
+        """
+        Test depicting the interactions of ligands with a receptor read once per process
+        """
+        with open(RECEPTOR_FILE, 'r') as f:
+            receptor = ('pdb', f.read())
+        results = []
+        stats = run_batch('interaction', [LIGAND_FILE], {'format': 'png'},
+                          lambda path, index, image: results.append(image), processes=1, receptor=receptor)
+        self.assertEqual(0, stats['errors'])
+        self.assertEqual(b'\x89PNG', results[0][:4])
+
+    def test_convert_command(self):
+        """
+        Test converting to one compressed file from the command line
+        """
+        output = self.path('out.sdf.gz')
+        self.assertEqual(1, main(['convert', self.path('in.smi', SMILES), '--output', output, '-j', '1']))
+        with gzip.open(output, 'rb') as f:
+            self.assertEqual(3, f.read().decode('utf-8').count('$$$$'))
@@ -0,0 +1,79 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+
+from oemicroservices.benchmark import (InProcessClient, HttpClient, build_scenarios, compare_results, percentile,
+                                      run_benchmark, run_scenario)
+
+
+class TestBenchmark(TestCase):
+    def test_percentile(self):
+        """
+        Test nearest-rank percentiles
+        """
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(95, percentile(values, 95))
+        self.assertEqual(100, percentile(values, 100))
+        self.assertEqual(7, percentile([7], 99))
+        self.assertIsNone(percentile([], 50))
+
+    def test_compare_results(self):
+        """
+        Test comparing two runs
+        """
+        baseline = {'results': [{'scenario': 'a', 'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 40.0, 'rps': 100.0}]}
+        current = {'results': [{'scenario': 'a', 'p50_ms': 5.0, 'p95_ms': 20.0, 'p99_ms': None, 'rps': 150.0}]}
+        lines = compare_results(baseline, current)
+        self.assertEqual(2, len(lines))
+        self.assertEqual(['a', '-50.0%', '+0.0%', 'n/a', '+50.0%'], lines[1].split())
+
+    def test_scenarios_cover_endpoints(self):
+        """
+        Test that every endpoint has a scenario
+        """
+        endpoints = set(s['endpoint'] for s in build_scenarios())
+        self.assertEqual(set(['moleculedepictor', 'interactiondepictor', 'findligandinteractiondepictor',
+                              'moleculeconvert']), endpoints)
+
+    def test_run_benchmark(self):
+        """
+        Test running scenarios in-process
+        """
+        scenarios = [s for s in build_scenarios() if s['name'] in ('depict/benzene/png', 'convert/smiles-sdf')]
+        results = run_benchmark(InProcessClient(), scenarios, requests=3, concurrency=2, warmup=0)
+        self.assertEqual(2, len(results['results']))
+        for result in results['results']:
+            self.assertEqual(3, result['requests'])
+            self.assertEqual(0, result['errors'])
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_unreachable_server(self):
+        """
+        Test that requests which get no response are counted as errors, and that a remote server's memory is not
+        reported
+        """
+        scenario = [s for s in build_scenarios() if s['name'] == 'depict/benzene/png'][0]
+        result = run_scenario(HttpClient('http://127.0.0.1:1'), scenario, requests=2, concurrency=2, warmup=1)
+        self.assertEqual(2, result['requests'])
+        self.assertEqual(2, result['errors'])
+        self.assertIsNone(result['peak_rss_kb'])
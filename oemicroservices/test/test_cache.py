@@ -0,0 +1,102 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+
+from oemicroservices.library import InvalidMolecule
+from oemicroservices.common.cache import LRUCache, NEGATIVE_CACHE, ERROR_IMAGE_CACHE, input_key, negative_cache
+from oemicroservices.api import app
+
+
+class TestLRUCache(TestCase):
+    def test_eviction(self):
+        """
+        Test that the least recently used entries are evicted
+        """
+        cache = LRUCache('test', 2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        cache.resize(1)
+        self.assertEqual(1, len(cache))
+        cache.resize(0)
+        cache.put('d', 4)
+        self.assertIsNone(cache.get('d'))
+
+
+class TestNegativeCache(TestCase):
+    def setUp(self):
+        NEGATIVE_CACHE.clear()
+        ERROR_IMAGE_CACHE.clear()
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+
+    def test_input_key(self):
+        """
+        Test that the parts of a key are kept apart
+        """
+        self.assertNotEqual(input_key('ab', 'c'), input_key('a', 'bc'))
+        self.assertEqual(input_key('c1ccccc1', 'smiles', False), input_key(b'c1ccccc1', 'smiles', False))
+
+    def test_read_errors_cached(self):
+        """
+        Test that read errors are cached and other errors are not
+        """
+        calls = []
+
+        def fail(value, ex):
+            with negative_cache(value, 'smiles'):
+                calls.append(ex)
+                raise ex
+
+        for i in range(2):
+            self.assertRaises(InvalidMolecule, fail, 'invalid', InvalidMolecule("Invalid molecule"))
+        self.assertEqual(1, len(calls))
+        for i in range(2):
+            self.assertRaises(ValueError, fail, 'c1ccccc1', ValueError("Render error"))
+        self.assertEqual(3, len(calls))
+        self.assertEqual(1, len(NEGATIVE_CACHE))
+
+    def test_invalid_smiles(self):
+        """
+        Test that repeated invalid molecules are served from the caches
+        """
+        responses = [self.app.get('/v1/depict/structure/smiles?val=invalid&format=png') for i in range(2)]
+        self.assertEqual(responses[0].data, responses[1].data)
+        self.assertEqual('image/png', responses[1].mimetype)
+        self.assertEqual(1, len(NEGATIVE_CACHE))
+        self.assertEqual(1, len(ERROR_IMAGE_CACHE))
+        response = self.app.get('/v1/depict/structure/smiles?val=invalid&debug=true')
+        self.assertEqual('{"error": "Invalid molecule"}', response.data.decode('utf-8'))
+
+    def test_invalid_gzip(self):
+        """
+        Test that corrupt gzipped molecules are reported as invalid and cached
+        """
+        for i in range(2):
+            response = self.app.get('/v1/depict/structure/smiles?val=bm90IGd6aXA%3D&gz=true&debug=true')
+            self.assertEqual("400 BAD REQUEST", response.status)
+            self.assertIn('Invalid gzipped molecule', response.data.decode('utf-8'))
+        self.assertEqual(1, len(NEGATIVE_CACHE))
@@ -0,0 +1,134 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import json
+import time
+
+from flask import Flask
+from flask.ext.restful import Api
+
+from oemicroservices.common.compounds import CompoundLibrary, CompoundStore
+from oemicroservices.resources.compounds.compounds import CompoundList, CompoundSearch
+
+COMPOUNDS = 'c1ccccc1O phenol\nCCO ethanol\nc1ccccc1N aniline\nCC(=O)O acetic\nOc1ccc(O)cc1 hydroquinone\n'
+
+
+class TestCompoundStore(TestCase):
+    def setUp(self):
+        self.store = CompoundStore()
+        self.store.read(COMPOUNDS, 'smi', from_string=True)
+
+    def test_read(self):
+        """
+        Test that compounds are identified by title, and replaced by ID
+        """
+        self.assertEqual(5, len(self.store))
+        self.store.read('c1ccccc1OC phenol\n', 'smi', from_string=True)
+        self.assertEqual(5, len(self.store))
+
+    def test_search(self):
+        """
+        Test that the screen skips compounds before the exact match
+        """
+        stats = {}
+        hits = list(self.store.search('c1ccccc1[OX2H]', stats=stats))
+        self.assertEqual(['phenol', 'hydroquinone'], [hit[1] for hit in hits])
+        self.assertEqual(2, len(hits[1][3]))
+        self.assertEqual(7, len(hits[0][3][0]))
+        self.assertEqual(5, stats['screened'])
+        self.assertLess(stats['candidates'], 5)
+        # Continue from a position
+        self.assertEqual(['hydroquinone'], [hit[1] for hit in self.store.search('c1ccccc1[OX2H]', 1)])
+
+    def test_max_screen(self):
+        """
+        Test that a search stops after screening max_screen compounds and reports where to continue
+        """
+        stats = {}
+        hits = list(self.store.search('c1ccccc1[OX2H]', 1, stats, max_screen=2))
+        self.assertEqual([], hits)
+        self.assertEqual(2, stats['screened'])
+        self.assertEqual(3, stats['next'])
+        hits = list(self.store.search('c1ccccc1[OX2H]', 3, stats, max_screen=2))
+        self.assertEqual(['hydroquinone'], [hit[1] for hit in hits])
+        self.assertIsNone(stats['next'])
+
+    def test_deadline(self):
+        """
+        Test that a search stops screening at its deadline and reports where to continue
+        """
+        stats = {}
+        self.assertEqual([], list(self.store.search('c1ccccc1[OX2H]', 1, stats, deadline=time.time() - 1)))
+        self.assertEqual(0, stats['screened'])
+        self.assertEqual(1, stats['next'])
+
+    def test_invalid(self):
+        with self.assertRaises(Exception):
+            self.store.search('c1cc(')
+
+
+class TestCompoundResources(TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.config.update(COMPOUND_PAGE_SIZE=1, COMPOUND_UPLOAD_TOKEN='token', COMPOUND_MAX_UPLOAD=1024)
+        api = Api(app)
+        self.compounds = CompoundLibrary(app)
+        api.add_resource(CompoundList, '/v1/compounds')
+        api.add_resource(CompoundSearch, '/v1/compounds/search')
+        self.app = app.test_client()
+
+    def test_upload_and_search(self):
+        response = self.app.post('/v1/compounds?format=smi', data=COMPOUNDS)
+        self.assertEqual("403 FORBIDDEN", response.status)
+        response = self.app.post('/v1/compounds?format=smi', data=COMPOUNDS, headers={'X-Upload-Token': 'token'})
+        self.assertEqual({'added': 5, 'compounds': 5}, json.loads(response.data.decode('utf-8')))
+        # Page through the results
+        page = json.loads(self.app.get('/v1/compounds/search?smarts=cO').data.decode('utf-8'))
+        self.assertEqual(['phenol'], [result['id'] for result in page['results']])
+        page = json.loads(self.app.get('/v1/compounds/search?smarts=cO&offset={0}'.format(page['next']))
+                          .data.decode('utf-8'))
+        self.assertEqual(['hydroquinone'], [result['id'] for result in page['results']])
+
+    def test_upload_limits(self):
+        """
+        Test that uploads are disabled without a token and limited in size
+        """
+        response = self.app.post('/v1/compounds?format=smi', data='C' * 1025, headers={'X-Upload-Token': 'token'})
+        self.assertEqual("413 REQUEST ENTITY TOO LARGE", response.status)
+        self.compounds.upload_token = None
+        response = self.app.post('/v1/compounds?format=smi', data=COMPOUNDS, headers={'X-Upload-Token': 'token'})
+        self.assertEqual("403 FORBIDDEN", response.status)
+
+    def test_max_screen(self):
+        """
+        Test that a page ends after screening COMPOUND_MAX_SCREEN compounds, even without results
+        """
+        self.compounds.max_screen = 2
+        self.app.post('/v1/compounds?format=smi', data=COMPOUNDS, headers={'X-Upload-Token': 'token'})
+        page = json.loads(self.app.get('/v1/compounds/search?smarts=cO&offset=1').data.decode('utf-8'))
+        self.assertEqual([], page['results'])
+        self.assertEqual(3, page['next'])
+        self.assertEqual(2, page['screened'])
+
+    def test_invalid_smarts(self):
+        response = self.app.get('/v1/compounds/search?smarts=c1cc(')
+        self.assertEqual("400 BAD REQUEST", response.status)
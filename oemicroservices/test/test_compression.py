@@ -0,0 +1,125 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import gzip
+import io
+import os
+
+from flask import Flask, Response
+
+from oemicroservices.common.compression import ResponseCompression, COMPRESSED_CACHE, gzip_bytes, gzip_cached
+from oemicroservices.common.streaming import file_response, spool_file
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg">' + b'<line x1="0" y1="0" x2="10" y2="10"/>' * 100 + b'</svg>'
+
+
+def _gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+
+class TestResponseCompression(TestCase):
+    def setUp(self):
+        COMPRESSED_CACHE.clear()
+        self.paths = []
+        app = Flask(__name__)
+        app.config.update(COMPRESSION_MIN_SIZE=100)
+        ResponseCompression(app)
+
+        @app.route('/svg')
+        def svg():
+            return Response(SVG, mimetype='image/svg+xml')
+
+        @app.route('/png')
+        def png():
+            return Response(b'\x89PNG' * 100, mimetype='image/png')
+
+        @app.route('/pdf')
+        def pdf():
+            # A streamed depiction, as for PDF and PostScript images with STREAM_OUTPUTS
+            path = spool_file()
+            with open(path, 'wb') as f:
+                f.write(SVG)
+            self.paths.append(path)
+            return file_response(path, 'application/pdf')
+
+        @app.route('/small')
+        def small():
+            return Response(b'{}', mimetype='application/json')
+
+        self.app = app.test_client()
+
+    def test_gzip(self):
+        """
+        Test that compressible responses are compressed for clients that accept gzip
+        """
+        response = self.app.get('/svg', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertLess(len(response.data), len(SVG))
+        self.assertEqual(SVG, _gunzip(response.data))
+
+    def test_gzip_streamed(self):
+        """
+        Test that streamed responses are compressed as they are streamed, and their spool files removed
+        """
+        response = self.app.get('/pdf', headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue(response.is_streamed)
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(SVG, _gunzip(response.data))
+        response.close()
+        self.assertFalse(os.path.exists(self.paths[0]))
+        # Not compressed for clients that do not accept gzip
+        response = self.app.get('/pdf')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(SVG, response.data)
+        response.close()
+
+    def test_not_accepted(self):
+        """
+        Test that responses are not compressed unless the client accepts gzip
+        """
+        for headers in ({}, {'Accept-Encoding': 'deflate'}, {'Accept-Encoding': 'gzip;q=0'}):
+            response = self.app.get('/svg', headers=headers)
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertEqual(SVG, response.data)
+
+    def test_skipped(self):
+        """
+        Test that compressed formats and small responses are not compressed
+        """
+        for path in ('/png', '/small'):
+            response = self.app.get(path, headers={'Accept-Encoding': 'gzip'})
+            self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_cache(self):
+        """
+        Test that identical responses reuse the compressed bytes
+        """
+        first = self.app.get('/svg', headers={'Accept-Encoding': 'gzip'}).data
+        self.assertEqual(1, len(COMPRESSED_CACHE))
+        self.assertEqual(first, self.app.get('/svg', headers={'Accept-Encoding': 'gzip'}).data)
+        self.assertEqual(1, len(COMPRESSED_CACHE))
+        # Data over the size limit is compressed without caching
+        self.assertEqual(SVG + b' ', _gunzip(gzip_cached(SVG + b' ', max_size=len(SVG))))
+        self.assertEqual(1, len(COMPRESSED_CACHE))
+        self.assertEqual(SVG, _gunzip(gzip_bytes(SVG, 1)))
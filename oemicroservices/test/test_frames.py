@@ -0,0 +1,121 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+
+from oemicroservices.common.frames import InteractionCounter, write_frames
+from oemicroservices.library import _pair_frames
+
+HBOND = {'residue': 'TYR123:A', 'type': 'hbond'}
+CONTACT = {'residue': 'LEU45:A', 'type': 'contact'}
+
+
+class TestInteractionCounter(TestCase):
+    def test_frequencies(self):
+        """
+        Test counting the frames with each interaction
+        """
+        counter = InteractionCounter()
+        counter.add([HBOND, CONTACT])
+        counter.add([HBOND, HBOND])
+        counter.add(None)
+        summary = counter.summary()
+        self.assertEqual(3, summary['frames'])
+        self.assertEqual(2, summary['depicted'])
+        self.assertEqual([
+            {'residue': 'TYR123:A', 'type': 'hbond', 'frames': 2, 'frequency': 1.0},
+            {'residue': 'LEU45:A', 'type': 'contact', 'frames': 1, 'frequency': 0.5}
+        ], summary['interactions'])
+
+    def test_no_frames(self):
+        """
+        Test the summary of no frames
+        """
+        self.assertEqual({'frames': 0, 'depicted': 0, 'interactions': []}, InteractionCounter().summary())
+
+
+class TestWriteFrames(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'frames.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write(self):
+        """
+        Test writing the frames and summary as JSON
+        """
+        summary = write_frames(iter([(b'png0', [HBOND], None), (None, None, 'Bad frame')]), self.path)
+        with open(self.path, 'r') as f:
+            document = json.load(f)
+        self.assertEqual(summary, document['summary'])
+        self.assertEqual(b'png0', base64.b64decode(document['frames'][0]['image']))
+        self.assertEqual([HBOND], document['frames'][0]['interactions'])
+        self.assertEqual({'frame': 1, 'error': 'Bad frame'}, document['frames'][1])
+        self.assertFalse(summary['truncated'])
+
+    def test_max_frames(self):
+        """
+        Test that frames beyond the maximum are not read
+        """
+        read = []
+
+        def frames():
+            for i in range(10):
+                read.append(i)
+                yield b'png', [], None
+        summary = write_frames(frames(), self.path, 3)
+        self.assertEqual(3, summary['frames'])
+        self.assertTrue(summary['truncated'])
+        self.assertEqual(4, len(read))
+
+
+class TestPairFrames(TestCase):
+    def test_both_moving(self):
+        """
+        Test pairing the frames of a receptor and ligand trajectory, up to the shorter of the two
+        """
+        self.assertEqual([('r0', 'l0'), ('r1', 'l1')], list(_pair_frames(['r0', 'r1', 'r2'], ['l0', 'l1'])))
+
+    def test_rigid_receptor(self):
+        """
+        Test pairing a single receptor frame with every ligand frame
+        """
+        self.assertEqual([('r0', 'l0'), ('r0', 'l1'), ('r0', 'l2')], list(_pair_frames(['r0'], ['l0', 'l1', 'l2'])))
+
+    def test_single_frames(self):
+        """
+        Test pairing single frames
+        """
+        self.assertEqual([('r0', 'l0')], list(_pair_frames(['r0'], ['l0'])))
+
+    def test_no_frames(self):
+        """
+        Test a ligand without frames
+        """
+        with self.assertRaises(Exception):
+            list(_pair_frames(['r0'], []))
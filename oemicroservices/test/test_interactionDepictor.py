@@ -131,6 +131,39 @@ class TestInteractionDepictor(TestCase):
         )
         self.assertEqual("200 OK", response.status)
 
+    def test_interaction_template_reparse(self):
+        """
+        Test reparsing the ligand from its geometry and the receptor from residue templates
+        """
+        with open(LIGAND_FILE, 'r') as f:
+            ligand = f.read()
+        with open(RECEPTOR_FILE, 'r') as f:
+            receptor = f.read()
+        response = self.app.post(
+            '/v1/depict/interaction?format=png&debug=true',
+            data=json.dumps({
+                "ligand": {"value": ligand, "format": "pdb", "reparse": True},
+                "receptor": {"value": receptor, "format": "pdb", "reparse": "template"}
+            }),
+            headers={"content-type": "application/json"}
+        )
+        self.assertEqual("200 OK", response.status)
+
+    def test_interaction_invalid_reparse(self):
+        """
+        Test an unknown reparse mode
+        """
+        response = self.app.post(
+            '/v1/depict/interaction?format=png&debug=true',
+            data=json.dumps({
+                "ligand": {"value": "x", "format": "pdb"},
+                "receptor": {"value": "x", "format": "pdb", "reparse": "fast"}
+            }),
+            headers={"content-type": "application/json"}
+        )
+        self.assertEqual("400 BAD REQUEST", response.status)
+        self.assertEqual('{"error": "Invalid reparse mode: fast"}', response.data.decode('utf-8'))
+
     def test_invalid_file_format(self):
         """
         Test providing an invalid file format for the molecule
@@ -211,6 +244,39 @@ class TestInteractionDepictor(TestCase):
         )
         self.assertEqual("200 OK", response.status)
 
+    def test_find_ligand_template_reparse(self):
+        """
+        Test reparsing the ligand and receptor of a complex independently
+        """
+        with open(PDB_FILE, 'r') as f:
+            pdb = f.read()
+        response = self.app.post(
+            '/v1/depict/interaction/search/pdb?format=png&debug=true&resn=SUV&ligandreparse=true'
+            '&receptorreparse=template',
+            data=pdb,
+            headers={"content-type": "text/plain"}
+        )
+        self.assertEqual("200 OK", response.status)
+
+    def test_find_ligand_frames(self):
+        """
+        Test depicting each model of a multi-model complex
+        """
+        with open(PDB_FILE, 'r') as f:
+            atoms = [line for line in f.read().splitlines() if line.startswith(('ATOM  ', 'HETATM'))]
+        pdb = '\n'.join(['MODEL        1'] + atoms + ['ENDMDL', 'MODEL        2'] + atoms + ['ENDMDL', 'END']) + '\n'
+        response = self.app.post(
+            '/v1/depict/interaction/search/pdb/frames?format=png&resn=SUV',
+            data=pdb,
+            headers={"content-type": "text/plain"}
+        )
+        self.assertEqual("200 OK", response.status)
+        document = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(2, len(document['frames']))
+        self.assertEqual(2, document['summary']['depicted'])
+        for interaction in document['summary']['interactions']:
+            self.assertEqual(1.0, interaction['frequency'])
+
     def test_find_ligand_chain_success(self):
         """
         Test POSTing a single molecule file and then finding the ligand based on chain ID
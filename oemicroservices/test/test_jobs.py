@@ -0,0 +1,194 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from flask import Flask
+from flask.ext.restful import Api
+
+from oemicroservices.common.jobs import JobStore, JobQueue, TooManyJobs, QUEUED, RUNNING, DONE, CANCELLED
+from oemicroservices.resources.jobs.jobs import JobList, Job, JobResults, JobResult
+
+
+def _request(n=3):
+    return {'type': 'depict', 'molecules': [{'value': 'c1ccccc1', 'format': 'smiles'}] * n}
+
+
+class TestJobStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.directory, 'jobs.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_submit_claim(self):
+        """
+        Test that jobs are claimed in order and their results stored
+        """
+        first = self.store.submit('a', 'depict', _request(), 3, 'image/png')
+        second = self.store.submit('b', 'depict', _request(), 3, 'image/png')
+        self.assertEqual(QUEUED, first['status'])
+        job = self.store.claim()
+        self.assertEqual(first['id'], job['id'])
+        self.assertEqual(_request(), job['request'])
+        self.store.add_results(job['id'], 0, [(b'1', None), (None, 'bad molecule')])
+        self.store.add_results(job['id'], 2, [(b'3', None)])
+        self.store.finish(job['id'], DONE)
+        job = self.store.get(job['id'])
+        self.assertEqual((DONE, 3, 1), (job['status'], job['completed'], job['errors']))
+        self.assertEqual([(1, None, 'bad molecule'), (2, b'3', None)], self.store.results(job['id'], 1, 10))
+        self.assertEqual(second['id'], self.store.claim()['id'])
+        self.assertIsNone(self.store.claim())
+
+    def test_running_per_client(self):
+        """
+        Test that a client with a running job does not block other clients
+        """
+        first = self.store.submit('a', 'depict', _request(), 3, 'image/png')
+        self.store.submit('a', 'depict', _request(), 3, 'image/png')
+        other = self.store.submit('b', 'depict', _request(), 3, 'image/png')
+        self.assertEqual(first['id'], self.store.claim(1)['id'])
+        self.assertEqual(other['id'], self.store.claim(1)['id'])
+        self.assertIsNone(self.store.claim(1))
+
+    def test_per_client_limit(self):
+        """
+        Test the limit on active jobs per client
+        """
+        self.store.submit('a', 'depict', _request(), 3, 'image/png', limit=1)
+        self.assertRaises(TooManyJobs, self.store.submit, 'a', 'depict', _request(), 3, 'image/png', limit=1)
+        self.store.submit('b', 'depict', _request(), 3, 'image/png', limit=1)
+
+    def test_cancel(self):
+        """
+        Test that a cancelled job is not finished by its runner
+        """
+        job = self.store.submit('a', 'depict', _request(), 3, 'image/png')
+        self.store.claim()
+        self.assertTrue(self.store.cancel(job['id']))
+        self.store.finish(job['id'], DONE)
+        self.assertEqual(CANCELLED, self.store.status(job['id']))
+        self.assertFalse(self.store.cancel(job['id']))
+
+    def test_requeue_and_cleanup(self):
+        """
+        Test that stale jobs are requeued and expired jobs deleted
+        """
+        job = self.store.submit('a', 'depict', _request(), 3, 'image/png')
+        self.store.claim()
+        self.assertEqual(0, self.store.requeue_stale(60))
+        self.assertEqual(1, self.store.requeue_stale(-1))
+        self.assertEqual(QUEUED, self.store.status(job['id']))
+        self.store.claim()
+        self.store.add_results(job['id'], 0, [(b'1', None)])
+        self.store.finish(job['id'], DONE)
+        self.assertEqual(0, self.store.cleanup(60))
+        self.assertEqual(1, self.store.cleanup(-1))
+        self.assertIsNone(self.store.get(job['id']))
+        self.assertEqual([], self.store.results(job['id']))
+
+
+class TestJobResources(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        app = Flask(__name__)
+        app.config.update(JOBS_DATABASE=os.path.join(self.directory, 'jobs.sqlite'), JOBS_WORKERS=1,
+                          JOBS_PROCESSES=False, JOBS_CHUNK_SIZE=2, JOBS_POLL_INTERVAL=0.05, JOBS_PER_CLIENT=1)
+        JobQueue(app)
+        api = Api(app)
+        api.add_resource(JobList, '/v1/jobs')
+        api.add_resource(Job, '/v1/jobs/<string:job_id>')
+        api.add_resource(JobResults, '/v1/jobs/<string:job_id>/results')
+        api.add_resource(JobResult, '/v1/jobs/<string:job_id>/results/<int:index>')
+        self.app = app.test_client()
+
+    def tearDown(self):
+        # The runner threads may still be polling the database
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __wait(self, job_id, timeout=60.0):
+        start = time.time()
+        while time.time() - start < timeout:
+            response = self.app.get('/v1/jobs/{0}'.format(job_id), headers={'X-Client-Id': 'test'})
+            job = json.loads(response.data.decode('utf-8'))['job']
+            if job['status'] not in (QUEUED, RUNNING):
+                return job
+            time.sleep(0.1)
+        self.fail("Job did not finish")
+
+    def test_depict_job(self):
+        """
+        Test submitting a depiction job, polling for it and downloading the results
+        """
+        payload = _request()
+        payload['molecules'].append({'value': 'not a molecule', 'format': 'smiles'})
+        payload['options'] = {'width': 200, 'height': 200}
+        response = self.app.post('/v1/jobs', data=json.dumps(payload), headers={'X-Client-Id': 'test'})
+        self.assertEqual(202, response.status_code)
+        job_id = json.loads(response.data.decode('utf-8'))['job']['id']
+        self.assertTrue(response.headers['Location'].endswith('/v1/jobs/{0}'.format(job_id)))
+        # Jobs are private to their client
+        self.assertEqual(404, self.app.get('/v1/jobs/{0}'.format(job_id)).status_code)
+        job = self.__wait(job_id)
+        self.assertEqual((DONE, 4, 4, 1), (job['status'], job['total'], job['completed'], job['errors']))
+        response = self.app.get('/v1/jobs/{0}/results?offset=2'.format(job_id), headers={'X-Client-Id': 'test'})
+        results = json.loads(response.data.decode('utf-8'))['results']
+        self.assertEqual([2, 3], [result['index'] for result in results])
+        self.assertTrue(base64.b64decode(results[0]['value']).startswith(b'\x89PNG'))
+        self.assertIsNotNone(results[1]['error'])
+        response = self.app.get('/v1/jobs/{0}/results/0'.format(job_id), headers={'X-Client-Id': 'test'})
+        self.assertEqual('image/png', response.mimetype)
+        self.assertEqual(422, self.app.get('/v1/jobs/{0}/results/3'.format(job_id),
+                                           headers={'X-Client-Id': 'test'}).status_code)
+        # Deleting a finished job removes it
+        self.assertEqual(204, self.app.delete('/v1/jobs/{0}'.format(job_id), headers={'X-Client-Id': 'test'})
+                         .status_code)
+        self.assertEqual(404, self.app.get('/v1/jobs/{0}'.format(job_id), headers={'X-Client-Id': 'test'})
+                         .status_code)
+
+    def test_invalid_job(self):
+        """
+        Test that invalid jobs are rejected when submitted
+        """
+        for payload in ({'type': 'dance', 'molecules': [{'value': 'C', 'format': 'smiles'}]},
+                        {'type': 'depict', 'molecules': []},
+                        {'type': 'depict', 'molecules': [{'value': 'C'}]},
+                        {'type': 'depict', 'molecules': [{'value': 'C', 'format': 'smiles'}], 'options': {'x': 1}},
+                        {'type': 'interaction', 'molecules': [{'value': 'C', 'format': 'smiles'}]},
+                        {'type': 'convert', 'molecules': [{'value': 'C', 'format': 'smiles'}]}):
+            self.assertEqual(400, self.app.post('/v1/jobs', data=json.dumps(payload)).status_code)
+
+    def test_too_many_jobs(self):
+        """
+        Test that a client beyond its active job limit is told to retry later
+        """
+        store = JobStore(os.path.join(self.directory, 'jobs.sqlite'))
+        store.submit('test', 'depict', _request(), 3, 'image/png')
+        response = self.app.post('/v1/jobs', data=json.dumps(_request()), headers={'X-Client-Id': 'test'})
+        self.assertEqual(429, response.status_code)
+        self.assertIn('Retry-After', response.headers)
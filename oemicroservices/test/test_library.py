@@ -0,0 +1,184 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import os
+
+from openeye.oechem import *
+
+from oemicroservices.common.cache import SCAFFOLD_CACHE
+from oemicroservices.common.util import compress_string
+from oemicroservices.library import (
+    depict,
+    iter_depict,
+    depict_interaction,
+    iter_depict_interaction,
+    depict_complex,
+    convert,
+    iter_convert,
+    layout)
+
+# Define the resource files relative to this test file because setup.py will run from the root package directory
+# but some IDEs will run the tests from within the tests directory. We can be friendly to everybody.
+PDB_FILE = os.path.join(os.path.dirname(__file__), 'assets/4s0v.pdb')
+LIGAND_FILE = os.path.join(os.path.dirname(__file__), 'assets/suv.pdb')
+RECEPTOR_FILE = os.path.join(os.path.dirname(__file__), 'assets/receptor.pdb')
+
+PNG_SIGNATURE = b'\x89PNG'
+
+
+def _read_file(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+class TestDepict(TestCase):
+    def test_depict_smiles(self):
+        """
+        Test depicting a SMILES string
+        """
+        self.assertEqual(PNG_SIGNATURE, depict('c1ccccc1', 'smiles')[:4])
+        self.assertIn(b'<svg', depict(b'c1ccccc1', 'smiles', format='svg', highlight=['c1ccccc1']))
+
+    def test_depict_molecule(self):
+        """
+        Test depicting an OEMol without changing it
+        """
+        mol = OEGraphMol()
+        OESmilesToMol(mol, 'c1ccccc1')
+        mol.SetTitle('benzene')
+        self.assertEqual(PNG_SIGNATURE, depict(mol, title='Benzene')[:4])
+        self.assertEqual('benzene', mol.GetTitle())
+        self.assertEqual(0, mol.GetDimension())
+
+    def test_series(self):
+        """
+        Test that the members of a series are aligned to the layout of their scaffold
+        """
+        SCAFFOLD_CACHE.clear()
+        scaffold = 'c1ccc2ccccc2c1'
+        first = layout('c1ccc2ccccc2c1C', 'smiles', scaffold=scaffold)
+        second = layout('c1ccc2ccccc2c1CCO', 'smiles', scaffold=scaffold)
+        # The scaffold is laid out once
+        self.assertEqual(1, len(SCAFFOLD_CACHE))
+        for axis in ('x', 'y'):
+            for a, b in zip(first['atoms'][axis][:10], second['atoms'][axis][:10]):
+                self.assertAlmostEqual(a, b, 2)
+        self.assertEqual(PNG_SIGNATURE, depict('c1ccc2ccccc2c1C', 'smiles', scaffold=scaffold)[:4])
+        # Molecules without the scaffold keep their own layout
+        self.assertEqual(PNG_SIGNATURE, depict('CCO', 'smiles', scaffold=scaffold)[:4])
+        with self.assertRaises(Exception):
+            depict('CCO', 'smiles', scaffold='c1cc(')
+        # Scaffolds are SMILES, not SMARTS
+        with self.assertRaises(Exception):
+            depict('c1ccc2ccccc2c1C', 'smiles', scaffold='c1cc[c,n]cc1')
+
+    def test_unknown_option(self):
+        """
+        Test that unknown options are rejected
+        """
+        self.assertRaises(Exception, depict, 'c1ccccc1', 'smiles', colour='red')
+
+    def test_no_format(self):
+        """
+        Test that molecule strings need a format
+        """
+        self.assertRaises(Exception, depict, 'c1ccccc1')
+
+    def test_iter_depict(self):
+        """
+        Test depicting several molecules in order, ignoring errors
+        """
+        images = list(iter_depict(['c1ccccc1', 'invalid(', 'CCO'], 'smiles', format='svg', errors='ignore'))
+        self.assertEqual(3, len(images))
+        self.assertIsNone(images[1])
+        self.assertIn(b'<svg', images[0])
+        self.assertIn(b'<svg', images[2])
+        self.assertRaises(Exception, list, iter_depict(['c1ccccc1', 'invalid('], 'smiles'))
+
+
+class TestDepictInteraction(TestCase):
+    def test_depict_interaction(self):
+        """
+        Test depicting the interactions of a receptor and ligand
+        """
+        image = depict_interaction(_read_file(RECEPTOR_FILE), _read_file(LIGAND_FILE), 'pdb', 'pdb', format='svg')
+        self.assertIn(b'<svg', image)
+
+    def test_depict_interaction_gz(self):
+        """
+        Test depicting the interactions of a compressed receptor
+        """
+        image = depict_interaction(compress_string(_read_file(RECEPTOR_FILE)), _read_file(LIGAND_FILE), 'pdb', 'pdb',
+                                   receptor_gz=True)
+        self.assertEqual(PNG_SIGNATURE, image[:4])
+
+    def test_ligand_error(self):
+        """
+        Test the ligand read error with and without the reason
+        """
+        try:
+            depict_interaction(_read_file(RECEPTOR_FILE), 'x', 'pdb', 'invalid', debug=True)
+            self.fail()
+        except Exception as ex:
+            self.assertEqual('Error reading ligand: Invalid molecule format: invalid', str(ex))
+        try:
+            depict_interaction(_read_file(RECEPTOR_FILE), 'x', 'pdb', 'invalid')
+            self.fail()
+        except Exception as ex:
+            self.assertEqual('Error reading ligand', str(ex))
+
+    def test_iter_depict_interaction(self):
+        """
+        Test depicting several ligands against one receptor
+        """
+        receptor = OEGraphMol()
+        ifs = oemolistream(RECEPTOR_FILE)
+        OEReadMolecule(ifs, receptor)
+        ligand = _read_file(LIGAND_FILE)
+        images = list(iter_depict_interaction(receptor, [ligand, ligand], ligand_format='pdb', format='svg'))
+        self.assertEqual(2, len(images))
+        self.assertEqual(images[0], images[1])
+
+    def test_depict_complex(self):
+        """
+        Test depicting a complex by selecting the ligand
+        """
+        self.assertEqual(PNG_SIGNATURE, depict_complex(_read_file(PDB_FILE), 'pdb', resn='SUV')[:4])
+        self.assertRaises(Exception, depict_complex, _read_file(PDB_FILE), 'pdb')
+
+
+class TestConvert(TestCase):
+    def test_convert(self):
+        """
+        Test converting a molecule string and an OEMol
+        """
+        self.assertEqual('c1ccccc1', convert('c1ccccc1', 'smiles', 'smiles').strip())
+        mol = OEGraphMol()
+        OESmilesToMol(mol, 'CCO')
+        self.assertIn('V2000', convert(mol, 'sdf'))
+
+    def test_iter_convert(self):
+        """
+        Test converting several molecules in order
+        """
+        output = list(iter_convert(['c1ccccc1', 'CCO'], 'smiles', fmt='smiles'))
+        self.assertEqual(['c1ccccc1', 'CCO'], [s.strip() for s in output])
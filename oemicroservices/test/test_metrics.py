@@ -0,0 +1,136 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+
+from oemicroservices.common.metrics import (
+    Counter,
+    Histogram,
+    Measurements,
+    call_instrumented,
+    format_label,
+    format_server_timing,
+    record_atoms,
+    stage)
+from oemicroservices.api import app
+
+
+def _work(value):
+    with stage('first'):
+        record_atoms(12)
+    with stage('second'):
+        pass
+    return value
+
+
+class TestMetricPrimitives(TestCase):
+    def test_counter(self):
+        """
+        Test rendering a counter
+        """
+        counter = Counter('test_total', 'Test counter', ('endpoint',))
+        counter.inc(('a',))
+        counter.inc(('a',), 2)
+        counter.inc(('b"',))
+        self.assertEqual([
+            '# HELP test_total Test counter',
+            '# TYPE test_total counter',
+            'test_total{endpoint="a"} 3',
+            'test_total{endpoint="b\\""} 1'
+        ], counter.render())
+
+    def test_histogram(self):
+        """
+        Test rendering a histogram with cumulative buckets
+        """
+        histogram = Histogram('test_seconds', 'Test histogram', ('endpoint',), (0.1, 1.0))
+        histogram.observe(('a',), 0.05)
+        histogram.observe(('a',), 0.5)
+        histogram.observe(('a',), 5.0)
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{endpoint="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{endpoint="a",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{endpoint="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_sum{endpoint="a"} 5.55', lines)
+        self.assertIn('test_seconds_count{endpoint="a"} 3', lines)
+
+
+class TestMeasurements(TestCase):
+    def test_call_instrumented(self):
+        """
+        Test collecting stage timings from a function
+        """
+        result, measurements = call_instrumented(_work, ('x',))
+        self.assertEqual('x', result)
+        self.assertEqual(['first', 'second'], [name for name, seconds in measurements.stages])
+        self.assertEqual([12], measurements.atoms)
+
+    def test_format_label(self):
+        """
+        Test that only known formats are recorded by name
+        """
+        self.assertEqual('sdf', format_label('SDF'))
+        self.assertEqual('pdb', format_label('.pdb.gz'))
+        self.assertEqual('png', format_label('png'))
+        self.assertEqual('other', format_label('x' * 100))
+
+    def test_server_timing(self):
+        """
+        Test formatting a Server-Timing header with repeated stages
+        """
+        measurements = Measurements()
+        measurements.stages = [('read', 0.001), ('read', 0.002), ('render', 0.0105)]
+        self.assertEqual('read;dur=3.000, render;dur=10.500, total;dur=20.000',
+                         format_server_timing(measurements, 0.02))
+
+    def test_stage_not_collecting(self):
+        """
+        Test that stages are ignored when measurements are not being collected
+        """
+        self.assertEqual('x', _work('x'))
+
+
+class TestMetricsEndpoint(TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+
+    def test_metrics(self):
+        """
+        Test that depiction stages are reported on the metrics endpoint
+        """
+        response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&debug=true')
+        self.assertEqual("200 OK", response.status)
+        response = self.app.get('/metrics')
+        self.assertEqual("200 OK", response.status)
+        metrics = response.data.decode('utf-8')
+        self.assertIn('oemicroservices_stage_seconds_count{endpoint="moleculedepictor",stage="read"}', metrics)
+        self.assertIn('oemicroservices_stage_seconds_count{endpoint="moleculedepictor",stage="render"}', metrics)
+        self.assertIn('oemicroservices_input_format_total{endpoint="moleculedepictor",format="smiles"}', metrics)
+        self.assertIn('oemicroservices_requests_total{endpoint="moleculedepictor",status="200"}', metrics)
+
+    def test_server_timing_header(self):
+        """
+        Test that responses include stage timings
+        """
+        response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&debug=true')
+        self.assertIn('render;dur=', response.headers['Server-Timing'])
+        self.assertIn('total;dur=', response.headers['Server-Timing'])
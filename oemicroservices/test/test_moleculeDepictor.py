@@ -20,6 +20,8 @@
 # under the License.
 
 from unittest import TestCase
+import base64
+import json
 import os
 
 try:
@@ -66,3 +68,16 @@ class TestMoleculeDepictor(TestCase):
         response = self.app.get('/v1/depict/structure/invalid?val=c1ccccc1&debug=true')
         self.assertEqual("400 BAD REQUEST", response.status)
         self.assertEqual('{"error": "Invalid molecule format: invalid"}', response.data.decode('utf-8'))
+
+    def test_get_formats(self):
+        response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&debug=true&format=png,svg')
+        self.assertEqual("200 OK", response.status)
+        images = json.loads(response.data.decode('utf-8'))['images']
+        self.assertEqual(['png', 'svg'], sorted(images))
+        self.assertTrue(base64.b64decode(images['png']).startswith(b'\x89PNG'))
+        self.assertIn(b'<svg', base64.b64decode(images['svg']))
+
+    def test_invalid_formats(self):
+        response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&debug=true&format=png,bmp')
+        self.assertEqual("400 BAD REQUEST", response.status)
+        self.assertEqual('{"error": "Invalid image format: bmp"}', response.data.decode('utf-8'))
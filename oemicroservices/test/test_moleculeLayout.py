@@ -0,0 +1,83 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import json
+
+from oemicroservices.library import layout
+from oemicroservices.common.cache import LAYOUT_CACHE
+from oemicroservices.api import app
+
+
+class TestMoleculeLayout(TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        LAYOUT_CACHE.clear()
+        self.app = app.test_client()
+
+    def test_layout(self):
+        """
+        Test the atoms, bonds and highlights of a layout
+        """
+        result = layout('c1ccccc1C(=O)[O-]', 'smiles', highlight=['C(=O)[O-]', '[N]'])
+        self.assertEqual(['C'] * 7 + ['O', 'O'], result['atoms']['element'])
+        self.assertEqual(9, len(result['atoms']['x']))
+        self.assertEqual(-1, result['atoms']['charge'][8])
+        self.assertEqual(9, len(result['bonds']['order']))
+        self.assertEqual(6, sum(result['bonds']['aromatic']))
+        self.assertEqual([6, 7, 8], result['highlights'][0]['atoms'])
+        self.assertEqual(2, len(result['highlights'][0]['bonds']))
+        self.assertEqual([], result['highlights'][1]['atoms'])
+
+    def test_wedges(self):
+        """
+        Test that stereocenters get a wedge or hash bond
+        """
+        result = layout('C[C@H](N)O', 'smiles')
+        self.assertEqual(1, len([stereo for stereo in result['bonds']['stereo'] if stereo in ('wedge', 'hash')]))
+
+    def test_get(self):
+        response = self.app.get('/v1/depict/layout/smiles?val=c1ccccc1&highlight=c1ccccc1')
+        self.assertEqual("200 OK", response.status)
+        self.assertEqual('application/json', response.mimetype)
+        result = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(6, len(result['atoms']['element']))
+        self.assertEqual(list(range(6)), result['highlights'][0]['atoms'])
+
+    def test_etag(self):
+        """
+        Test that clients can revalidate a cached layout
+        """
+        response = self.app.get('/v1/depict/layout/smiles?val=c1ccccc1')
+        self.assertIn('max-age', response.headers['Cache-Control'])
+        response = self.app.get('/v1/depict/layout/smiles?val=c1ccccc1',
+                                headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual("304 NOT MODIFIED", response.status)
+
+    def test_post(self):
+        response = self.app.post('/v1/depict/layout/smiles', data='c1ccccc1')
+        self.assertEqual("200 OK", response.status)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_invalid_file_format(self):
+        response = self.app.get('/v1/depict/layout/invalid?val=c1ccccc1')
+        self.assertEqual("400 BAD REQUEST", response.status)
+        self.assertEqual('{"error": "Invalid molecule format: invalid"}', response.data.decode('utf-8'))
@@ -0,0 +1,74 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import os
+
+from oemicroservices.library import reparse_mode
+
+RECEPTOR_FILE = os.path.join(os.path.dirname(__file__), 'assets/receptor.pdb')
+
+
+class TestReparseMode(TestCase):
+    def test_booleans(self):
+        """
+        Test that true reparses from the geometry
+        """
+        self.assertEqual('geometry', reparse_mode(True))
+        self.assertEqual('geometry', reparse_mode('true'))
+        self.assertFalse(reparse_mode(False))
+        self.assertFalse(reparse_mode('false'))
+        self.assertFalse(reparse_mode(None))
+
+    def test_modes(self):
+        """
+        Test the named reparse modes
+        """
+        self.assertEqual('geometry', reparse_mode('geometry'))
+        self.assertEqual('template', reparse_mode('Template'))
+
+    def test_invalid(self):
+        """
+        Test an unknown reparse mode
+        """
+        with self.assertRaises(Exception):
+            reparse_mode('fast')
+
+
+class TestResidueTemplates(TestCase):
+    def setUp(self):
+        from openeye.oechem import OEGraphMol, OEReadMolecule, oemolistream
+        self.protein = OEGraphMol()
+        ifs = oemolistream(RECEPTOR_FILE)
+        OEReadMolecule(ifs, self.protein)
+
+    def test_same_as_geometry(self):
+        """
+        Test that the templates bond the receptor like the geometric perception
+        """
+        from openeye.oechem import OEGraphMol, OECount, OEIsAromaticAtom
+        from oemicroservices.common.perception import perceive_geometry, perceive_residue_templates
+        geometry = OEGraphMol(self.protein)
+        perceive_geometry(geometry)
+        template = perceive_residue_templates(self.protein)
+        self.assertEqual(geometry.NumAtoms(), template.NumAtoms())
+        self.assertEqual(geometry.NumBonds(), template.NumBonds())
+        self.assertEqual(OECount(geometry, OEIsAromaticAtom()), OECount(template, OEIsAromaticAtom()))
@@ -0,0 +1,154 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import json
+import os
+import threading
+import time
+
+from oemicroservices.common.admission import RequestCost, ServiceOverloaded
+from oemicroservices.common.pool import DeadlineExceeded, WorkerPool, WorkerPools, deadline_response
+
+
+def _add(a, b):
+    return a + b
+
+
+def _fail():
+    raise ValueError("Failed")
+
+
+def _allocate(megabytes):
+    return len(bytearray(megabytes * 1024 * 1024))
+
+
+class TestWorkerPool(TestCase):
+    def test_run(self):
+        """
+        Test running a function on the pool
+        """
+        pool = WorkerPool('test', 2)
+        self.assertEqual(3, pool.run(_add, (1, 2)))
+        self.assertNotEqual(threading.current_thread().name, pool.run(lambda: threading.current_thread().name))
+
+    def test_run_error(self):
+        """
+        Test that exceptions raised on the pool are re-raised
+        """
+        pool = WorkerPool('test', 1)
+        self.assertRaises(ValueError, pool.run, _fail)
+        self.assertEqual(0, pool.outstanding)
+
+    def test_overloaded(self):
+        """
+        Test that work is rejected when the pool and its queue are full
+        """
+        release = threading.Event()
+        pool = WorkerPool('test', 1, queue=0)
+        worker = threading.Thread(target=pool.run, args=(release.wait,))
+        worker.start()
+        while pool.outstanding == 0:
+            release.wait(0.01)
+        self.assertRaises(ServiceOverloaded, pool.run, int)
+        release.set()
+        worker.join()
+        self.assertEqual(0, pool.run(int))
+
+    def test_thread_deadline(self):
+        """
+        Test that a thread pool returns at the deadline
+        """
+        pool = WorkerPool('test', 1)
+        start = time.time()
+        self.assertRaises(DeadlineExceeded, pool.run, time.sleep, (1.0,), 0.1)
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_deadline_response(self):
+        """
+        Test that a request past its deadline is reported as a server timeout rather than bad input
+        """
+        response = deadline_response(DeadlineExceeded("Deadline of 0.1 seconds exceeded"))
+        self.assertEqual(504, response.status_code)
+        self.assertEqual({"error": "Deadline exceeded: Deadline of 0.1 seconds exceeded"},
+                         json.loads(response.get_data().decode('utf-8')))
+
+
+class TestProcessWorkerPool(TestCase):
+    def test_run(self):
+        """
+        Test running a function in a worker process
+        """
+        pool = WorkerPool('test', 1, processes=True)
+        self.assertEqual(3, pool.run(_add, (1, 2)))
+        self.assertNotEqual(os.getpid(), pool.run(os.getpid))
+        self.assertRaises(ValueError, pool.run, _fail)
+
+    def test_deadline(self):
+        """
+        Test that work is killed at the deadline and the worker process is replaced
+        """
+        pool = WorkerPool('test', 1, queue=1, processes=True)
+        pid = pool.run(os.getpid)
+        start = time.time()
+        self.assertRaises(DeadlineExceeded, pool.run, time.sleep, (30,), 0.5)
+        self.assertLess(time.time() - start, 5.0)
+        # The next request runs in a fresh process
+        replacement = pool.run(os.getpid)
+        self.assertNotEqual(pid, replacement)
+        self.assertEqual(3, pool.run(_add, (1, 2), 5.0))
+
+    def test_memory_limit(self):
+        """
+        Test that worker processes cannot allocate beyond their memory limit
+        """
+        pool = WorkerPool('test', 1, processes=True, memory_limit=512)
+        self.assertEqual(1024 * 1024, pool.run(_allocate, (1,)))
+        self.assertRaises(MemoryError, pool.run, _allocate, (1024,))
+
+
+class TestWorkerPools(TestCase):
+    def setUp(self):
+        self.pools = WorkerPools()
+        self.pools.heavy_endpoints = ('interactiondepictor',)
+        self.pools.heavy_atoms = 1000
+        self.pools.heavy_reparse_atoms = 200
+
+    def test_route_endpoint(self):
+        """
+        Test that heavy endpoints are always routed to the heavy pool
+        """
+        self.assertEqual('heavy', self.pools.route('interactiondepictor', RequestCost(10, None, 1)))
+
+    def test_route_size(self):
+        """
+        Test routing by estimated atom count
+        """
+        self.assertEqual('light', self.pools.route('moleculedepictor', RequestCost(10, 'smiles', 5)))
+        self.assertEqual('heavy', self.pools.route('moleculedepictor', RequestCost(100000, 'pdb', 5000)))
+
+    def test_route_reparse(self):
+        """
+        Test that reparse requests are routed to the heavy pool at a lower size
+        """
+        cost = RequestCost(40000, None, 500)
+        self.assertEqual('light', self.pools.route('moleculeconvert', cost))
+        self.assertEqual('heavy', self.pools.route('moleculeconvert', cost, reparse=True))
@@ -0,0 +1,81 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import os
+
+from oemicroservices.common.prefilter import prefilter_complex
+
+# Define the resource files relative to this test file because setup.py will run from the root package directory
+# but some IDEs will run the tests from within the tests directory. We can be friendly to everybody.
+PDB_FILE = os.path.join(os.path.dirname(__file__), 'assets/4s0v.pdb')
+
+
+def _atoms(pdb):
+    return [line for line in pdb.splitlines() if line.startswith(('ATOM  ', 'HETATM'))]
+
+
+class TestPrefilterComplex(TestCase):
+    def setUp(self):
+        with open(PDB_FILE, 'r') as f:
+            self.pdb = f.read()
+
+    def test_prefilter(self):
+        """
+        Test cutting the ligand environment out of a complex
+        """
+        pocket = prefilter_complex(self.pdb, 8.0, resn='SUV')
+        atoms = _atoms(pocket)
+        ligand = [line for line in _atoms(self.pdb) if line[17:20] == 'SUV']
+        self.assertTrue(set(ligand).issubset(atoms))
+        self.assertLess(len(atoms), len(_atoms(self.pdb)))
+        self.assertGreater(len(atoms), len(ligand))
+
+    def test_whole_residues(self):
+        """
+        Test that residues are kept or dropped whole
+        """
+        pocket = prefilter_complex(self.pdb, 8.0, resn='SUV')
+        kept = set(line[17:27] for line in _atoms(pocket))
+        for line in _atoms(self.pdb):
+            if line[17:27] in kept:
+                self.assertIn(line, pocket)
+
+    def test_radius(self):
+        """
+        Test that a larger radius keeps more residues
+        """
+        self.assertLess(len(_atoms(prefilter_complex(self.pdb, 4.0, resn='SUV'))),
+                        len(_atoms(prefilter_complex(self.pdb, 12.0, resn='SUV'))))
+
+    def test_no_ligand(self):
+        """
+        Test a ligand selection that matches no atoms
+        """
+        self.assertIsNone(prefilter_complex(self.pdb, 8.0, resn='XXX'))
+        self.assertIsNone(prefilter_complex(self.pdb, 8.0, resn='SUV', chain='X'))
+
+    def test_empty_chain(self):
+        """
+        Test that an empty chain ID selects any chain
+        """
+        expected = prefilter_complex(self.pdb, 8.0, resn='SUV')
+        self.assertEqual(expected, prefilter_complex(self.pdb, 8.0, chain='', resn='SUV'))
@@ -0,0 +1,124 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import json
+import os
+import pstats
+
+from flask import Flask
+
+from oemicroservices.common.profiling import RequestProfiling, call_profiled, summarize_profile
+from oemicroservices.common.streaming import file_response, spool_file
+from oemicroservices.api import app
+
+
+def _fibonacci(n):
+    return n if n < 2 else _fibonacci(n - 1) + _fibonacci(n - 2)
+
+
+class _Profile(object):
+    """
+    Raw statistics in a form that pstats.Stats can load
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class TestProfilingHelpers(TestCase):
+    def test_call_profiled(self):
+        """
+        Test profiling a function and summarizing the hot functions
+        """
+        result, measurements = call_profiled(_fibonacci, (15,))
+        self.assertEqual(610, result)
+        self.assertEqual(1, len(measurements.profiles))
+        functions = summarize_profile(pstats.Stats(_Profile(measurements.profiles[0])), 1)
+        self.assertEqual(1, len(functions))
+        self.assertIn('_fibonacci', functions[0]['function'])
+        self.assertEqual(1973, functions[0]['calls'])
+
+
+class TestRequestProfiling(TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        self.profiling = app.extensions.get('profiling')
+        if self.profiling is None:
+            self.profiling = RequestProfiling(app)
+        self.token = self.profiling.token
+        self.profiling.token = 'secret'
+
+    def tearDown(self):
+        self.profiling.token = self.token
+
+    def test_profile_forbidden(self):
+        """
+        Test that profiling requires the token
+        """
+        response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&profile=true')
+        self.assertEqual("403 FORBIDDEN", response.status)
+        response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&profile=true',
+                                headers={'X-Profile-Token': 'wrong'})
+        self.assertEqual("403 FORBIDDEN", response.status)
+
+    def test_profile(self):
+        """
+        Test that a profiled request returns the profile as JSON
+        """
+        response = self.app.get('/v1/depict/structure/smiles?val=c1ccccc1&profile=true',
+                                headers={'X-Profile-Token': 'secret'})
+        self.assertEqual("200 OK", response.status)
+        self.assertEqual('application/json', response.mimetype)
+        profile = json.loads(response.data.decode('utf-8'))['profile']
+        self.assertEqual(200, profile['status'])
+        self.assertIn('render', profile['stages'])
+        self.assertGreater(len(profile['functions']), 0)
+
+
+class TestProfiledStream(TestCase):
+    def setUp(self):
+        self.paths = []
+        app = Flask(__name__)
+        app.config.update(PROFILE_TOKEN='secret')
+        RequestProfiling(app)
+
+        @app.route('/pdf')
+        def pdf():
+            path = spool_file()
+            with open(path, 'wb') as f:
+                f.write(b'%PDF')
+            self.paths.append(path)
+            return file_response(path, 'application/pdf')
+
+        self.app = app.test_client()
+
+    def test_spool_file_removed(self):
+        """
+        Test that the spool file of a streamed response replaced by the profile is removed
+        """
+        response = self.app.get('/pdf?profile=true', headers={'X-Profile-Token': 'secret'})
+        self.assertEqual(200, json.loads(response.data.decode('utf-8'))['profile']['status'])
+        self.assertFalse(os.path.exists(self.paths[0]))
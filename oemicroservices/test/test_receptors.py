@@ -0,0 +1,99 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from oemicroservices.common.receptors import SpatialIndex, ReceptorStore, receptor_name
+
+RECEPTOR_FILE = os.path.join(os.path.dirname(__file__), 'assets/receptor.pdb')
+LIGAND_FILE = os.path.join(os.path.dirname(__file__), 'assets/suv.pdb')
+
+
+class TestSpatialIndex(TestCase):
+    def setUp(self):
+        self.index = SpatialIndex([(0.0, 0.0, 0.0), (4.0, 0.0, 0.0), (12.0, 0.0, 0.0), (-6.0, -6.0, -6.0)])
+
+    def test_within(self):
+        """
+        Test finding the points near a point
+        """
+        self.assertEqual({0, 1}, self.index.within([(1.0, 0.0, 0.0)], 3.5))
+
+    def test_within_neighbor_cells(self):
+        """
+        Test finding points in other cells than the query point
+        """
+        self.assertEqual({2}, self.index.within([(9.5, 0.0, 0.0)], 2.5))
+        self.assertEqual({0, 3}, self.index.within([(-3.0, -3.0, -3.0)], 5.5))
+
+    def test_within_several_points(self):
+        """
+        Test that the points near several query points are only reported once
+        """
+        self.assertEqual({0, 1, 2}, self.index.within([(2.0, 0.0, 0.0), (11.0, 0.0, 0.0)], 2.5))
+
+    def test_within_nothing(self):
+        """
+        Test a query point far away from all points
+        """
+        self.assertEqual(set(), self.index.within([(100.0, 100.0, 100.0)], 10.0))
+
+    def test_receptor_name(self):
+        """
+        Test naming receptors after their files
+        """
+        self.assertEqual('4s0v', receptor_name('/data/4s0v.pdb.gz'))
+        self.assertEqual('target', receptor_name('target.oeb'))
+        self.assertIsNone(receptor_name('README.txt'))
+
+
+class TestReceptorStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        shutil.copy(RECEPTOR_FILE, os.path.join(self.directory, 'receptor.pdb'))
+        self.store = ReceptorStore()
+        self.store.load(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load(self):
+        """
+        Test reading a directory of receptors
+        """
+        self.assertEqual(['receptor'], self.store.names())
+        self.assertIsNone(self.store.get('missing'))
+
+    def test_pocket(self):
+        """
+        Test cutting out the residues near a ligand
+        """
+        from openeye.oechem import OEGraphMol, OEReadMolecule, oemolistream
+        ligand = OEGraphMol()
+        ifs = oemolistream(LIGAND_FILE)
+        OEReadMolecule(ifs, ligand)
+        receptor = self.store.get('receptor')
+        pocket = receptor.pocket(ligand, 5.0)
+        self.assertGreater(pocket.NumAtoms(), 0)
+        self.assertLess(pocket.NumAtoms(), receptor.mol.NumAtoms())
@@ -0,0 +1,113 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from oemicroservices.common.recorder import RequestRecorder, read_log
+from oemicroservices.benchmark import InProcessClient
+from oemicroservices.replay import replay
+
+
+class TestRequestRecorder(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.recorder = RequestRecorder()
+        self.recorder.path = os.path.join(self.directory, 'requests-{pid}.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def log_path(self):
+        return self.recorder.path.format(pid=os.getpid())
+
+    def test_bodies_written_once(self):
+        """
+        Test that each distinct body is written to the log once
+        """
+        self.recorder.record('POST', '/v1/depict/structure/smiles', 'format=svg', 'text/plain', b'c1ccccc1', 200)
+        self.recorder.record('POST', '/v1/depict/structure/smiles', '', 'text/plain', b'c1ccccc1', 200)
+        self.recorder.record('POST', '/v1/depict/structure/oeb', '', None, b'\xff\x00\x01', 400)
+        self.recorder.flush()
+        with open(self.log_path()) as f:
+            self.assertEqual(5, len(f.readlines()))
+        records = read_log(self.log_path())
+        self.assertEqual(3, len(records))
+        self.assertEqual(b'c1ccccc1', records[1]['body'])
+        self.assertEqual('format=svg', records[0]['query'])
+        self.assertEqual(b'\xff\x00\x01', records[2]['body'])
+
+    def test_without_bodies(self):
+        """
+        Test recording only body hashes
+        """
+        self.recorder.bodies = False
+        self.recorder.record('POST', '/v1/convert/molecule', '', 'application/json', b'{}', 200)
+        self.recorder.flush()
+        records = read_log(self.log_path())
+        self.assertIsNone(records[0]['body'])
+        self.assertIsNone(records[0]['hash'])
+        self.assertEqual(2, records[0]['size'])
+
+    def test_headers(self):
+        """
+        Test that the headers that select the response transport and compression are recorded
+        """
+        self.recorder.record('POST', '/v1/convert/molecule', '', 'application/json', b'{}', 200,
+                             'application/msgpack', 'gzip')
+        self.recorder.flush()
+        record = read_log(self.log_path())[0]
+        self.assertEqual('application/msgpack', record['accept'])
+        self.assertEqual('gzip', record['accept_encoding'])
+
+    def test_rotation(self):
+        """
+        Test that the log is rotated at its maximum size, and that the new log has its own copy of the bodies
+        """
+        self.recorder.max_bytes = 100
+        for i in range(3):
+            self.recorder.record('POST', '/v1/depict/structure/smiles', '', 'text/plain', b'c1ccccc1', 200)
+        self.recorder.flush()
+        self.assertTrue(os.path.exists(self.log_path() + '.1'))
+        records = read_log(self.log_path())
+        self.assertEqual(b'c1ccccc1', records[-1]['body'])
+
+
+class TestReplay(TestCase):
+    def test_replay(self):
+        """
+        Test replaying recorded requests in-process
+        """
+        records = [
+            {'time': 0.0, 'method': 'GET', 'path': '/v1/depict/structure/smiles', 'query': 'val=c1ccccc1&debug=true',
+             'content_type': None, 'body': b'', 'size': 0},
+            {'time': 0.01, 'method': 'POST', 'path': '/v1/depict/structure/smiles', 'query': 'debug=true',
+             'content_type': 'text/plain', 'body': b'C1CCCCC1', 'size': 8},
+            {'time': 0.02, 'method': 'POST', 'path': '/v1/depict/structure/smiles', 'query': 'debug=true',
+             'content_type': 'text/plain', 'body': None, 'size': 8}
+        ]
+        results = replay(InProcessClient(), records, concurrency=2, speedup=0)
+        self.assertEqual(2, results['requests'])
+        self.assertEqual(1, results['skipped'])
+        self.assertEqual(0, results['errors'])
+        self.assertEqual(2, results['paths']['/v1/depict/structure/smiles']['requests'])
@@ -0,0 +1,118 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+
+from flask import Flask
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import BadRequest
+
+from oemicroservices.common.schema import Arg, Field, QuerySchema, BodySchema, loads
+
+
+class TestQuerySchema(TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.schema = QuerySchema(
+            Arg('width', int, 400),
+            Arg('debug', bool, False),
+            Arg('highlight', str, multiple=True),
+            Arg('title', str, '')
+        )
+
+    def test_defaults(self):
+        """
+        Test that missing arguments take their defaults
+        """
+        self.assertEqual({'width': 400, 'debug': False, 'highlight': None, 'title': ''},
+                         self.schema.parse(MultiDict()))
+
+    def test_convert(self):
+        """
+        Test converting arguments, with repeated arguments as lists
+        """
+        args = MultiDict([('width', '300'), ('debug', 'true'), ('highlight', 'c1ccccc1'), ('highlight', 'N'),
+                          ('title', 'Benzene'), ('title', 'Ignored')])
+        self.assertEqual({'width': 300, 'debug': True, 'highlight': ['c1ccccc1', 'N'], 'title': 'Benzene'},
+                         self.schema.parse(args))
+
+    def test_request(self):
+        """
+        Test parsing the arguments of the current request, and rejecting invalid values
+        """
+        with self.app.test_request_context('/?width=250'):
+            self.assertEqual(250, self.schema.parse()['width'])
+        with self.app.test_request_context('/?width=wide'):
+            self.assertRaises(BadRequest, self.schema.parse)
+
+    def test_extend(self):
+        """
+        Test that extended schemas replace arguments of the same name
+        """
+        schema = self.schema.extend(Arg('width', int, 800), Arg('legend', bool, True))
+        self.assertEqual(['debug', 'highlight', 'title', 'width', 'legend'], [arg.name for arg in schema.args])
+        self.assertEqual(800, schema.parse(MultiDict())['width'])
+
+
+class TestBodySchema(TestCase):
+    def setUp(self):
+        self.schema = BodySchema(
+            Field('molecule', "No molecule information provided"),
+            Field('molecule.value', "No molecule file provided"),
+            Field('molecule.input', "No input information provided"),
+            Field('molecule.input.format', "No input format provided", (str, type(u'')))
+        )
+
+    def __error(self, data):
+        try:
+            self.schema.parse(data)
+        except Exception as ex:
+            return str(ex)
+        return None
+
+    def test_valid(self):
+        """
+        Test decoding a valid body from bytes
+        """
+        obj = self.schema.parse(b'{"molecule": {"value": "C", "input": {"format": "smiles"}}}')
+        self.assertEqual('smiles', obj['molecule']['input']['format'])
+
+    def test_missing(self):
+        """
+        Test the error messages of missing fields
+        """
+        self.assertEqual("No POST data received", self.__error('{}'))
+        self.assertEqual("Unexpected POST data received", self.__error('[1]'))
+        self.assertEqual("No molecule information provided", self.__error('{"ligand": {}}'))
+        self.assertEqual("No molecule file provided", self.__error('{"molecule": {}}'))
+        self.assertEqual("No input information provided", self.__error('{"molecule": {"value": "C"}}'))
+        self.assertEqual("No input format provided",
+                         self.__error('{"molecule": {"value": "C", "input": "smiles"}}'))
+        self.assertEqual("No input format provided",
+                         self.__error('{"molecule": {"value": "C", "input": {"format": 1}}}'))
+
+    def test_loads(self):
+        """
+        Test decoding JSON from bytes and text
+        """
+        self.assertEqual({'a': [1, 2]}, loads(b'{"a": [1, 2]}'))
+        self.assertEqual({'a': u'\u00e9'}, loads(u'{"a": "\u00e9"}'))
+        self.assertRaises(ValueError, loads, b'{')
@@ -0,0 +1,119 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from oemicroservices.common.spool import SlowRequestCapture, read_capture
+from oemicroservices.reproduce import isolate, reproduce
+from oemicroservices.api import app
+
+
+def _capture(endpoint='moleculedepictor', body=b'c1ccccc1'):
+    return {
+        'time': 0.0,
+        'endpoint': endpoint,
+        'method': 'POST',
+        'path': '/v1/depict/structure/smiles',
+        'args': {'debug': ['true']},
+        'view_args': {'fmt': 'smiles'},
+        'content_type': 'text/plain',
+        'status': 200,
+        'duration': 6.0,
+        'stages': {'read': 0.5, 'render': 5.0},
+        'size': len(body),
+        'body': body.decode('utf-8'),
+        'encoding': 'utf-8'
+    }
+
+
+class TestSlowRequestCapture(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spool = SlowRequestCapture()
+        self.spool.directory = os.path.join(self.directory, 'slow-requests')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_capture(self):
+        """
+        Test reading a capture back with its body
+        """
+        path = self.spool.capture(_capture())
+        capture = read_capture(path)
+        self.assertEqual(b'c1ccccc1', capture['body'])
+        self.assertEqual({'fmt': 'smiles'}, capture['view_args'])
+        self.assertEqual(5.0, capture['stages']['render'])
+
+    def test_max_files(self):
+        """
+        Test that the oldest captures are removed beyond the file limit
+        """
+        self.spool.max_files = 2
+        paths = []
+        for i in range(4):
+            paths.append(self.spool.capture(_capture()))
+            # Give each capture a distinct modification time
+            os.utime(paths[-1], (i, i))
+        self.assertEqual(sorted(os.path.basename(p) for p in paths[2:]), sorted(os.listdir(self.spool.directory)))
+
+    def test_max_bytes(self):
+        """
+        Test that the oldest captures are removed beyond the size limit
+        """
+        path = self.spool.capture(_capture(body=b'C' * 1000))
+        os.utime(path, (0, 0))
+        self.spool.max_bytes = os.path.getsize(path) + 100
+        self.spool.capture(_capture())
+        self.assertEqual(1, len(os.listdir(self.spool.directory)))
+        self.assertFalse(os.path.exists(path))
+
+
+class TestReproduce(TestCase):
+    def setUp(self):
+        self.pools = app.extensions.get('pools')
+
+    def tearDown(self):
+        if self.pools is not None:
+            app.extensions['pools'] = self.pools
+
+    def test_reproduce(self):
+        """
+        Test re-running a captured request on the calling thread
+        """
+        capture = _capture()
+        capture['body'] = b'c1ccccc1'
+        isolate(app)
+        self.assertNotIn('pools', app.extensions)
+        response, elapsed = reproduce(app, capture)
+        self.assertEqual(200, response.status_code)
+        self.assertGreater(elapsed, 0)
+
+    def test_missing_body(self):
+        """
+        Test that a capture without its body cannot be reproduced
+        """
+        capture = _capture()
+        capture['body'] = None
+        self.assertRaises(Exception, reproduce, app, capture)
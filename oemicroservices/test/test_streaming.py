@@ -0,0 +1,83 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+import zlib
+
+from flask import Flask
+
+from oemicroservices.common.streaming import (
+    file_response,
+    iter_base64_gzip,
+    iter_file,
+    iter_json_string,
+    spool_file)
+
+TEXT = u'HETATM    1  C1  SUV A2001 "\u00c5"\n' * 1000
+
+
+class TestStreaming(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = spool_file(self.directory)
+        with open(self.path, 'wb') as f:
+            f.write(TEXT.encode('utf-8'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_json_string(self):
+        """
+        Test encoding a JSON string from chunks that split multi-byte characters
+        """
+        encoded = b''.join(iter_json_string(iter_file(self.path, 7)))
+        self.assertEqual(TEXT, json.loads(encoded.decode('utf-8')))
+
+    def test_base64_gzip(self):
+        """
+        Test gzipping and base64 encoding a stream
+        """
+        encoded = b''.join(iter_base64_gzip(iter_file(self.path, 100)))
+        decoded = zlib.decompress(base64.b64decode(encoded), zlib.MAX_WBITS | 16)
+        self.assertEqual(TEXT.encode('utf-8'), decoded)
+
+    def test_file_response(self):
+        """
+        Test streaming a spool file, which is removed when the response is closed
+        """
+        app = Flask(__name__)
+        app.config['STREAM_CHUNK_SIZE'] = 1000
+
+        @app.route('/')
+        def index():
+            return file_response(self.path, 'text/plain')
+
+        response = app.test_client().get('/')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(str(os.path.getsize(self.path)), response.headers['Content-Length'])
+        self.assertEqual(TEXT, response.data.decode('utf-8'))
+        response.close()
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,120 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase, skipIf
+import json
+
+from flask import Flask
+
+from oemicroservices.common import transport
+from oemicroservices.common.transport import decode_body, encode_response, encode_results, is_binary
+
+PNG = b'\x89PNG\r\n\x1a\n\x00\xff'
+GZ = b'\x1f\x8b\x08\x00'
+
+
+class TestTransport(TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+
+        @app.route('/molecule')
+        def molecule():
+            return encode_response({'molecule': {'value': b'c1ccccc1', 'format': 'smiles'}})
+
+        @app.route('/results')
+        def results():
+            return encode_results([(PNG, None), (None, 'Could not read molecule')])
+
+        @app.route('/text')
+        def text():
+            return encode_results([(b'CCO\n', None)], text=True)
+
+        @app.route('/gz')
+        def gz():
+            return encode_results([(GZ, None)], text=True, gz=True)
+
+        self.app = app.test_client()
+
+    def test_json_default(self):
+        """
+        Test that JSON is sent unless the client asks for a binary transport, with images base64 encoded
+        """
+        for headers in ({}, {'Accept': '*/*'}, {'Accept': 'application/json'}, {'Accept': 'text/html'}):
+            response = self.app.get('/results', headers=headers)
+            self.assertEqual('application/json', response.mimetype)
+            self.assertEqual({'results': [{'value': 'iVBORw0KGgoA/w==', 'error': None},
+                                          {'value': None, 'error': 'Could not read molecule'}]},
+                             json.loads(response.data.decode('utf-8')))
+        response = self.app.get('/text')
+        self.assertEqual({'results': [{'value': 'CCO\n', 'error': None}]}, json.loads(response.data.decode('utf-8')))
+        # Gzipped text is base64 encoded
+        response = self.app.get('/gz')
+        self.assertEqual({'results': [{'value': 'H4sIAA==', 'error': None}]}, json.loads(response.data.decode('utf-8')))
+
+    def test_decode_json(self):
+        """
+        Test that JSON bodies are decoded by default
+        """
+        self.assertEqual({'a': [1, 2]}, decode_body(b'{"a": [1, 2]}'))
+        self.assertEqual({'a': [1, 2]}, decode_body(b'{"a": [1, 2]}', 'application/json'))
+        self.assertFalse(is_binary('application/json'))
+
+    @skipIf(transport.msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        """
+        Test that MessagePack is sent when asked for, with raw bytes values
+        """
+        msgpack = transport.msgpack
+        for accept in ('application/msgpack', 'application/x-msgpack', 'application/json;q=0.5, application/msgpack'):
+            response = self.app.get('/results', headers={'Accept': accept})
+            self.assertTrue(is_binary(response.mimetype))
+            self.assertEqual({'results': [{'value': PNG, 'error': None},
+                                          {'value': None, 'error': 'Could not read molecule'}]},
+                             msgpack.unpackb(response.data, raw=False))
+        response = self.app.get('/gz', headers={'Accept': 'application/msgpack'})
+        self.assertEqual({'results': [{'value': GZ, 'error': None}]}, msgpack.unpackb(response.data, raw=False))
+        body = msgpack.packb({'molecules': [{'value': b'CCO', 'format': 'smiles'}]}, use_bin_type=True)
+        self.assertEqual({'molecules': [{'value': b'CCO', 'format': 'smiles'}]},
+                         decode_body(body, 'application/msgpack'))
+
+    @skipIf(transport.cbor2 is None, "cbor2 is not installed")
+    def test_cbor(self):
+        """
+        Test that CBOR is sent when asked for, with raw bytes values
+        """
+        cbor2 = transport.cbor2
+        response = self.app.get('/molecule', headers={'Accept': 'application/cbor'})
+        self.assertEqual('application/cbor', response.mimetype)
+        self.assertEqual({'molecule': {'value': b'c1ccccc1', 'format': 'smiles'}}, cbor2.loads(response.data))
+        self.assertEqual({'value': b'\x1f\x8b'}, decode_body(cbor2.dumps({'value': b'\x1f\x8b'}), 'application/cbor'))
+
+    def test_not_installed(self):
+        """
+        Test that binary bodies fail clearly without their codec, and that the codec is not offered to clients
+        """
+        msgpack, transport.msgpack = transport.msgpack, None
+        try:
+            with self.assertRaises(Exception):
+                decode_body(b'\x80', 'application/msgpack')
+            response = self.app.get('/results', headers={'Accept': 'application/msgpack'})
+            self.assertEqual('application/json', response.mimetype)
+        finally:
+            transport.msgpack = msgpack
@@ -0,0 +1,59 @@
+# Apache License 2.0
+#
+# Copyright (c) 2015 Scott Arne Johnson
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the LICENSE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from unittest import TestCase
+import subprocess
+import sys
+
+from oemicroservices.common.warmup import WARM_UP_LIGAND, WARM_UP_POCKET, read_data, warm_up
+
+
+class TestWarmUp(TestCase):
+    def test_canned_complex(self):
+        """
+        Test that the canned complex is shipped with the package and is much smaller than a whole receptor
+        """
+        ligand = read_data(WARM_UP_LIGAND)
+        pocket = read_data(WARM_UP_POCKET).splitlines()
+        self.assertTrue(any(line.startswith('HETATM') and line[17:20] == 'SUV' for line in ligand.splitlines()))
+        self.assertEqual('END', pocket[-1])
+        self.assertGreater(len([line for line in pocket if line.startswith(('ATOM  ', 'HETATM'))]), 100)
+        self.assertLess(len(pocket), 1000)
+
+    def test_warm_up(self):
+        """
+        Test that every warm-up step succeeds
+        """
+        timings, errors = warm_up()
+        self.assertEqual({}, dict(errors))
+        self.assertEqual(['import', 'depict_png', 'depict_svg', 'error_image', 'interaction', 'convert'], list(timings))
+
+    def test_lazy_toolkits(self):
+        """
+        Test that the resources do not load the toolkits until they are used
+        """
+        code = ('import sys; '
+                'import oemicroservices.resources.depict.interaction; '
+                'import oemicroservices.resources.depict.molecule; '
+                'import oemicroservices.resources.convert.convert; '
+                'print(any(m.startswith("openeye") for m in sys.modules))')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(b'False', output.strip())
@@ -25,12 +25,15 @@ setup(
     name='OEMicroservices',
     version='1.2',
     packages=['oemicroservices', 'oemicroservices.test', 'oemicroservices.common', 'oemicroservices.resources',
-              'oemicroservices.resources.depict', 'oemicroservices.resources.convert'],
+              'oemicroservices.resources.depict', 'oemicroservices.resources.convert',
+              'oemicroservices.resources.jobs', 'oemicroservices.resources.compounds'],
     url='https://github.com/OpenEye-Contrib/OEMicroservices',
     license='MIT',
     author='Scott Arne Johnson',
     author_email='scott.johnson6@merck.com',
     description='Collection of useful microservices using the OpenEye toolkits',
+    package_data={'oemicroservices': ['data/*.pdb'], 'oemicroservices.test': ['assets/*.pdb']},
     test_suite='oemicroservices.test',
+    entry_points={'console_scripts': ['oemicroservices-batch = oemicroservices.batch:main']},
     install_requires=['flask', 'flask-restful']
 )